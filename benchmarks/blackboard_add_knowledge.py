@@ -0,0 +1,52 @@
+"""Benchmark adding one-hop query results to a blackboard.
+
+Compares ``Blackboard.add_knowledge`` in bulk mode with adding the nodes and
+edges of a result one by one (``bulk=False``). The results connect many
+genes to a shared set of conditions, as ClinVar acquisitions do, so every
+item of a result touches a node that already has many edges.
+
+Usage: python benchmarks/blackboard_add_knowledge.py [num_genes] [rows_per_gene] [num_conditions]
+"""
+import sys
+
+from reasoner.Blackboard import Blackboard
+from common import compare, timed
+
+
+class OneHopAction():
+    effect_entities = ['Gene', 'Condition']
+    effect_connections = list()
+
+
+def make_results(num_genes, rows_per_gene, num_conditions):
+    results = list()
+    for i in range(num_genes):
+        rows = [{'node':{'name':'Condition_%d' % ((7 * i + j) % num_conditions), 'source':'ClinVar'},
+                 'edge':{'source':'ClinVar'}} for j in range(rows_per_gene)]
+        results.append(({'Gene':'Gene_%d' % i}, [{'Condition':rows}]))
+    return results
+
+
+def run(results, bulk):
+    blackboard = Blackboard()
+    action = OneHopAction()
+    seconds = 0
+    for query, result in results:
+        blackboard.add_node_from_attributes({'name':query['Gene']}, 'Gene')
+        seconds += timed(blackboard.add_knowledge, query, result, action, bulk=bulk)[1]
+    return blackboard, seconds
+
+
+if __name__ == '__main__':
+    num_genes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows_per_gene = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    num_conditions = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+
+    results = make_results(num_genes, rows_per_gene, num_conditions)
+    (single, single_seconds) = run(results, bulk=False)
+    (bulk, bulk_seconds) = run(results, bulk=True)
+    assert list(single.nodes(data=True)) == list(bulk.nodes(data=True))
+    assert list(single.edges(data=True)) == list(bulk.edges(data=True))
+
+    print('added %d nodes and %d edges' % (bulk.number_of_nodes(), bulk.number_of_edges()))
+    compare('add_knowledge', 'one by one', single_seconds, 'bulk', bulk_seconds)
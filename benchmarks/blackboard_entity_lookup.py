@@ -0,0 +1,59 @@
+"""Benchmark entity lookups on large blackboards.
+
+Compares the indexed ``Blackboard.get_entity_nodes``/``get_entity_edges``
+with a full scan over all nodes and edges, which is what every planning
+step cost before the blackboard kept entity indexes.
+
+Usage: python benchmarks/blackboard_entity_lookup.py [num_nodes]
+"""
+import sys
+
+from common import compare, make_random_blackboard, timed
+
+ENTITIES = ['Drug', 'Target', 'Pathway', 'Cell', 'Symptom', 'Disease', 'Variant', 'Gene', 'Condition']
+# ClinVar/PubMed-heavy acquisitions: most nodes are variants and conditions
+WEIGHTS = [1, 1, 1, 1, 1, 1, 40, 10, 40]
+
+
+def scan_entity_nodes(blackboard, entities):
+    node_dict = {entity:list() for entity in entities}
+    for n, d in blackboard.nodes(data=True):
+        if d['entity'] in entities and (not 'unbound' in d or d['unbound'] == False):
+            node_dict[d['entity']].append(n)
+    return node_dict
+
+
+def scan_entity_edges(blackboard, entity_pairs):
+    edge_dict = {entity_pair:list() for entity_pair in entity_pairs}
+    for u, v in blackboard.edges():
+        u_bound = (not 'unbound' in blackboard.nodes[u]) or blackboard.nodes[u]['unbound'] == False
+        v_bound = (not 'unbound' in blackboard.nodes[v]) or blackboard.nodes[v]['unbound'] == False
+        if u_bound and v_bound:
+            etup = (blackboard.nodes[u]['entity'], blackboard.nodes[v]['entity'])
+            rev = tuple(reversed(etup))
+            if etup in entity_pairs:
+                edge_dict[etup].append((u, v))
+            elif rev in entity_pairs:
+                edge_dict[rev].append((v, u))
+    return edge_dict
+
+
+if __name__ == '__main__':
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = 20
+
+    (blackboard, seconds) = timed(make_random_blackboard, num_nodes, ENTITIES, WEIGHTS, placeholders=num_nodes // 100)
+    print('built blackboard with %d nodes and %d edges in %.1f s' % (blackboard.number_of_nodes(), blackboard.number_of_edges(), seconds))
+
+    entities = ['Drug', 'Disease']
+    entity_pairs = [('Drug', 'Target'), ('Target', 'Pathway')]
+    (scanned, scan_seconds) = timed(scan_entity_nodes, blackboard, entities, repeats=repeats)
+    (indexed, index_seconds) = timed(blackboard.get_entity_nodes, entities, repeats=repeats)
+    assert {k:sorted(v) for k, v in scanned.items()} == {k:sorted(v) for k, v in indexed.items()}
+    compare('get_entity_nodes', 'scan', scan_seconds, 'index', index_seconds)
+
+    (scanned, scan_seconds) = timed(scan_entity_edges, blackboard, entity_pairs, repeats=repeats)
+    (indexed, index_seconds) = timed(blackboard.get_entity_edges, entity_pairs, repeats=repeats)
+    assert {k:sorted(map(frozenset, v), key=sorted) for k, v in scanned.items()} == \
+           {k:sorted(map(frozenset, v), key=sorted) for k, v in indexed.items()}
+    compare('get_entity_edges', 'scan', scan_seconds, 'index', index_seconds)
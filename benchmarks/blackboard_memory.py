@@ -0,0 +1,59 @@
+"""Benchmark the memory used by Blackboard and CompactBlackboard.
+
+Adds the same ClinVar-like one-hop results (genes with many variants, and
+variants with conditions) to a ``Blackboard`` and a ``CompactBlackboard``
+and reports the memory allocated for each, as traced by ``tracemalloc``.
+
+Usage: python benchmarks/blackboard_memory.py [num_genes] [variants_per_gene]
+"""
+import gc
+import sys
+import tracemalloc
+
+from reasoner.Blackboard import Blackboard
+from reasoner.CompactBlackboard import CompactBlackboard
+from common import report, timed
+
+
+class GeneToVariant():
+    effect_entities = ['Gene', 'Variant']
+    effect_connections = list()
+
+
+class VariantToCondition():
+    effect_entities = ['Variant', 'Condition']
+    effect_connections = list()
+
+
+def acquire(blackboard, num_genes, variants_per_gene):
+    for i in range(num_genes):
+        gene = 'GENE%d' % i
+        blackboard.add_node(gene, entity='Gene', name=gene)
+        variants = [{'node':{'name':'NM_%d.%d(%s):c.%dA>G' % (i, j, gene, j), 'clinical_significance':'Pathogenic'},
+                     'edge':{'source':'ClinVar'}} for j in range(variants_per_gene)]
+        blackboard.add_knowledge({'Gene':gene}, [{'Variant':variants}], GeneToVariant())
+        for variant in variants:
+            conditions = [{'node':{'name':'Condition_%d' % ((i + j) % 500)}, 'edge':{'source':'ClinVar'}} for j in range(2)]
+            blackboard.add_knowledge({'Variant':variant['node']['name']}, [{'Condition':conditions}], VariantToCondition())
+
+
+def measure(blackboard_class, num_genes, variants_per_gene):
+    gc.collect()
+    tracemalloc.start()
+    blackboard = blackboard_class()
+    (_, seconds) = timed(acquire, blackboard, num_genes, variants_per_gene)
+    gc.collect()
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return blackboard, current, seconds
+
+
+if __name__ == '__main__':
+    num_genes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    variants_per_gene = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+
+    for blackboard_class in (Blackboard, CompactBlackboard):
+        (blackboard, memory, seconds) = measure(blackboard_class, num_genes, variants_per_gene)
+        report(blackboard_class.__name__, seconds, '%8d nodes %8d edges %10.1f MB' % (blackboard.number_of_nodes(),
+                                                                                   blackboard.number_of_edges(), memory / 2**20))
+        del blackboard
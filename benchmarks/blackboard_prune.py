@@ -0,0 +1,54 @@
+"""Benchmark leaf trimming on long-chain and star graphs.
+
+Compares ``Blackboard.prune(trim_leaves=True)`` with the previous approach,
+which recomputed the degree of every node after each wave of leaf removals.
+A chain of n nodes takes n/2 waves, so the previous approach is quadratic.
+
+Usage: python benchmarks/blackboard_prune.py [num_nodes]
+"""
+import sys
+
+from reasoner.Blackboard import Blackboard
+from common import compare, timed
+
+
+def make_chain(num_nodes):
+    blackboard = Blackboard()
+    for i in range(num_nodes):
+        blackboard.add_node('Gene_%d' % i, entity='Gene')
+    for i in range(num_nodes - 1):
+        blackboard.add_edge('Gene_%d' % i, 'Gene_%d' % (i + 1), entities=('Gene', 'Gene'))
+    return blackboard
+
+
+def make_star(num_nodes):
+    blackboard = Blackboard()
+    blackboard.add_node('Gene_0', entity='Gene')
+    for i in range(1, num_nodes):
+        blackboard.add_node('Variant_%d' % i, entity='Variant')
+        blackboard.add_edge('Gene_0', 'Variant_%d' % i, entities=('Gene', 'Variant'))
+    return blackboard
+
+
+def trim_leaves_by_waves(blackboard):
+    degrees = dict(blackboard.degree())
+    while 1 in degrees.values():
+        for key, value in degrees.items():
+            if value == 1:
+                blackboard.remove_node(key)
+        degrees = dict(blackboard.degree())
+    degrees = dict(blackboard.degree())
+    for key, value in degrees.items():
+        if value == 0:
+            blackboard.remove_node(key)
+
+
+if __name__ == '__main__':
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    for make_graph in (make_chain, make_star):
+        (waves, queue) = (make_graph(num_nodes), make_graph(num_nodes))
+        (_, waves_seconds) = timed(trim_leaves_by_waves, waves)
+        (_, queue_seconds) = timed(queue.prune, trim_leaves=True)
+        assert list(waves) == list(queue)
+        compare('%s, %d nodes' % (make_graph.__name__[5:], num_nodes), 'waves', waves_seconds, 'prune', queue_seconds)
@@ -0,0 +1,43 @@
+"""Benchmark writing and reading blackboard snapshots.
+
+Compares writing GraphML through ``Blackboard.write_safe`` and
+``networkx.write_graphml`` with the streaming writers of
+``reasoner.BlackboardIO``, and reports the time to read each file back.
+
+Usage: python benchmarks/blackboard_serialization.py [nodes_per_entity] [directory]
+"""
+import os
+import sys
+import tempfile
+
+import networkx
+
+from reasoner.BlackboardIO import read_blackboard, write_blackboard
+from common import make_outcome_blackboard, report, timed
+
+
+def write_safe_graphml(blackboard, path):
+    networkx.write_graphml(blackboard.write_safe(), path)
+
+
+if __name__ == '__main__':
+    nodes_per_entity = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    directory = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp()
+
+    blackboard = make_outcome_blackboard(nodes_per_entity)
+    print('blackboard with %d nodes and %d edges' % (blackboard.number_of_nodes(), blackboard.number_of_edges()))
+
+    path = os.path.join(directory, 'write_safe.graphml')
+    (_, seconds) = timed(write_safe_graphml, blackboard, path)
+    report('write_safe + write_graphml', seconds, '%10.1f MB' % (os.path.getsize(path) / 2**20))
+
+    for name in ('blackboard.graphml', 'blackboard.jsonl', 'blackboard.jsonl.gz', 'blackboard.parquet'):
+        path = os.path.join(directory, name)
+        try:
+            (_, write_seconds) = timed(write_blackboard, blackboard, path)
+        except ImportError as e:
+            print('%-44s skipped (%s)' % (name, e))
+            continue
+        (loaded, read_seconds) = timed(read_blackboard, path)
+        assert loaded.number_of_edges() == blackboard.number_of_edges()
+        report('write_blackboard ' + name, write_seconds, '%10.1f MB (read %.3f s)' % (os.path.getsize(path) / 2**20, read_seconds))
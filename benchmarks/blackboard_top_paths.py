@@ -0,0 +1,30 @@
+"""Benchmark top-k path ranking on large blackboards.
+
+Builds an outcome-path blackboard (Drug - Target - Pathway - Cell - Symptom -
+Disease) with random extra edges between unrelated entities, and compares
+``Blackboard.get_top_paths`` restricted by the goal connections and a maximum
+path length with running Yen's algorithm on the full blackboard.
+
+Usage: python benchmarks/blackboard_top_paths.py [nodes_per_entity] [k]
+"""
+import sys
+
+from common import OUTCOME_CONNECTIONS, OUTCOME_ENTITIES, compare, make_outcome_blackboard, timed
+
+
+if __name__ == '__main__':
+    nodes_per_entity = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    blackboard = make_outcome_blackboard(nodes_per_entity)
+    print('blackboard with %d nodes and %d edges' % (blackboard.number_of_nodes(), blackboard.number_of_edges()))
+    source = 'Drug_0'
+    # follow the goal connections to pick a target with several outcome paths
+    target = source
+    for entity in OUTCOME_ENTITIES[1:]:
+        target = next(n for n in blackboard[target] if blackboard.nodes[n]['entity'] == entity)
+
+    (goal_paths, goal_seconds) = timed(blackboard.get_top_paths, source, target, k, max_length=5, entity_pairs=OUTCOME_CONNECTIONS)
+    (paths, seconds) = timed(blackboard.get_top_paths, source, target, k)
+    print('%d goal paths, %d unrestricted paths' % (len(goal_paths), len(paths)))
+    compare('get_top_paths', 'unrestricted', seconds, 'goal, max_length=5', goal_seconds)
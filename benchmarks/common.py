@@ -0,0 +1,72 @@
+"""Fixtures and timing helpers shared by the benchmark scripts.
+
+The scripts import this module as ``common``, which works when they are run
+as ``python benchmarks/<script>.py`` from the repository root.
+"""
+import random
+import timeit
+
+from reasoner.Blackboard import Blackboard
+
+OUTCOME_ENTITIES = ['Drug', 'Target', 'Pathway', 'Cell', 'Symptom', 'Disease']
+OUTCOME_CONNECTIONS = list(zip(OUTCOME_ENTITIES[:-1], OUTCOME_ENTITIES[1:]))
+
+
+def make_outcome_blackboard(nodes_per_entity, edges_per_node=10, seed=0):
+    """An outcome-path blackboard (Drug - Target - Pathway - Cell - Symptom -
+    Disease) with random extra edges between unrelated entities, and a cost
+    on every edge."""
+    rng = random.Random(seed)
+    blackboard = Blackboard()
+    names = {entity:['%s_%d' % (entity, i) for i in range(nodes_per_entity)] for entity in OUTCOME_ENTITIES}
+    for entity in OUTCOME_ENTITIES:
+        for name in names[entity]:
+            blackboard.add_node_from_attributes({'name':name}, entity)
+    all_names = [name for entity in OUTCOME_ENTITIES for name in names[entity]]
+    for (e0, e1) in OUTCOME_CONNECTIONS:
+        for u in names[e0]:
+            for v in rng.sample(names[e1], edges_per_node):
+                blackboard.add_edge(u, v, entities=(e0, e1), cost=1 + rng.random())
+    for i in range(len(all_names) * edges_per_node):
+        u, v = rng.sample(all_names, 2)
+        if not blackboard.has_edge(u, v):
+            blackboard.add_edge(u, v, entities=(blackboard.nodes[u]['entity'], blackboard.nodes[v]['entity']), cost=1 + rng.random())
+    return blackboard
+
+
+def make_random_blackboard(num_nodes, entities, weights=None, edges_per_node=2, placeholders=0, seed=0):
+    """A blackboard with nodes of randomly chosen entities, placeholders, and
+    random edges between the nodes."""
+    rng = random.Random(seed)
+    blackboard = Blackboard()
+    names = list()
+    for i in range(num_nodes):
+        entity = rng.choices(entities, weights)[0]
+        names.append(blackboard.add_node_from_attributes({'name':'%s_%d' % (entity, i)}, entity))
+    for i in range(placeholders):
+        blackboard.add_placeholder(rng.choice(entities))
+    for i in range(num_nodes * edges_per_node):
+        u, v = rng.sample(names, 2)
+        blackboard.add_edge(u, v, entities=(blackboard.nodes[u]['entity'], blackboard.nodes[v]['entity']))
+    return blackboard
+
+
+def timed(function, *args, repeats=1, **kwargs):
+    """Call a function repeats times and return its last result and the mean
+    time of a call in seconds."""
+    result = None
+    start = timeit.default_timer()
+    for _ in range(repeats):
+        result = function(*args, **kwargs)
+    return result, (timeit.default_timer() - start) / repeats
+
+
+def report(label, seconds, details=''):
+    print('%-44s %12.3f ms %s' % (label, 1000 * seconds, details))
+
+
+def compare(label, old_label, old_seconds, new_label, new_seconds):
+    """Report the times of the previous and the new approach and the speedup."""
+    report('%s (%s)' % (label, old_label), old_seconds)
+    report('%s (%s)' % (label, new_label), new_seconds)
+    print('%-44s %12.1fx' % ('%s speedup' % label, old_seconds / new_seconds if new_seconds > 0 else float('inf')))
@@ -0,0 +1,58 @@
+"""Benchmark the path queries of KGAgent on high-degree nodes.
+
+Runs the queries of the drug2target and diseaseToSymptom templates, which
+collect the nodes and relationships of the pattern variables, against the
+previous form that unwinds nodes(path) and relationships(path) of every
+path, for the drugs and diseases with the most relationships in the Neo4j
+graph of the reasoner config. Both forms must give the same graph.
+
+Usage: python benchmarks/path_queries.py [nodes] [repeats]
+"""
+import sys
+
+from reasoner.KGAgent import KGAgent
+from common import timed
+
+UNWIND_QUERIES = {
+    'drug2target': """
+        MATCH path = (dr:Drug {chembl_id:$id})--(ta:Target)
+        UNWIND nodes(path) as n
+        UNWIND relationships(path) as r
+        RETURN collect(distinct n) as nodes, collect(distinct r) as edges""",
+    'diseaseToSymptom': """
+        MATCH path = (di:Disease {cui:$id})<-[:ASSOCIATED_WITH]-(sy:Symptom)
+        UNWIND nodes(path) as n
+        UNWIND relationships(path) as r
+        RETURN collect(distinct n) as nodes, collect(distinct r) as edges"""
+}
+
+HUB_QUERIES = {
+    'drug2target': """
+        MATCH (n:Drug)--(:Target)
+        RETURN n.chembl_id as id, count(*) as degree ORDER BY degree DESC LIMIT $limit""",
+    'diseaseToSymptom': """
+        MATCH (n:Disease)<-[:ASSOCIATED_WITH]-(:Symptom)
+        RETURN n.cui as id, count(*) as degree ORDER BY degree DESC LIMIT $limit"""
+}
+
+
+def run(kg, cypher, id):
+    return kg.get_graph(kg.query(cypher, id=id))
+
+
+if __name__ == '__main__':
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    agent = KGAgent()
+    kg = agent.kg
+    print('%-18s %-20s %8s %12s %12s' % ('template', 'id', 'degree', 'unwind (ms)', 'collect (ms)'))
+    for name, hub_query in HUB_QUERIES.items():
+        for record in list(kg.query(hub_query, limit=nodes)):
+            (unwind_graph, unwind_time) = timed(run, kg, UNWIND_QUERIES[name], record['id'], repeats=repeats)
+            (collect_graph, collect_time) = timed(run, kg, agent.templates[name].query(), record['id'], repeats=repeats)
+            assert set(unwind_graph.nodes) == set(collect_graph.nodes)
+            assert sorted(d['id'] for _, _, d in unwind_graph.edges(data=True)) == \
+                sorted(d['id'] for _, _, d in collect_graph.edges(data=True))
+            print('%-18s %-20s %8d %12.1f %12.1f' % (name, record['id'], record['degree'],
+                                                     1000 * unwind_time, 1000 * collect_time))
@@ -3,6 +3,12 @@
 user=$1
 password=$2
 
+# metrics and slow-query log of the queries of the loaders, see reasoner/knowledge_graph/QueryMetrics.py
+export REASONER_SLOW_QUERY_SECONDS=${REASONER_SLOW_QUERY_SECONDS:-10}
+export REASONER_SLOW_QUERY_LOG=${REASONER_SLOW_QUERY_LOG:-slow_queries.log}
+mkdir -p ${REASONER_QUERY_METRICS_DIR:=metrics}
+export REASONER_QUERY_METRICS_DIR
+
 cypher-shell -u $user -p $password < create_indexes.cypher
 mysql semmeddb < prepare_data/prepare_semmeddb.sql
 
@@ -25,3 +31,7 @@ python load_gene_ontology.py
 python load_disease_finding_sites.py
 python load_human_phenotype_ontology.py
 python load_symptom_ontology.py
+python load_disease_similarity.py
+
+# stamp the graph, so that servers drop responses cached for the previous graph
+echo "MERGE (v:GraphVersion) SET v.version = toString(timestamp());" | cypher-shell -u $user -p $password
@@ -0,0 +1,80 @@
+"""Precompute the symptom similarity of diseases.
+
+Diseases are compared by the Jaccard similarity of their sets of symptoms
+with an ASSOCIATED_WITH relationship of more than min_count SemMedDB
+mentions, as in KGAgent.conditionSymptomSimilarity. The intersections of
+all pairs of symptom sets are computed with one sparse matrix product per
+chunk of diseases, and the k most similar diseases of each disease are
+stored as SIMILAR_TO relationships with the properties jaccard, shared
+(the number of shared symptoms) and rank (from 1), which
+KGAgent.similarConditions reads.
+
+Usage: python load_disease_similarity.py [k] [min_count]
+"""
+import sys
+
+import numpy as np
+import scipy.sparse
+
+from reasoner.knowledge_graph.KnowledgeGraph import KnowledgeGraph
+
+
+def top_jaccard(diseases, symptoms, k, chunk_size=1000):
+    """
+    Return the k most similar diseases of each disease as arrays (source,
+    target, jaccard, shared, rank), given the disease and symptom of each
+    disease-symptom pair.
+
+    Ties are broken by the target, so that the result does not depend on
+    the order of the pairs.
+    """
+    disease_ids, rows = np.unique(np.asarray(diseases), return_inverse=True)
+    symptom_ids, columns = np.unique(np.asarray(symptoms), return_inverse=True)
+    matrix = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)),
+                                     shape=(len(disease_ids), len(symptom_ids)))
+    # duplicate pairs are summed; a symptom counts once per disease
+    matrix.data[:] = 1
+    sizes = np.asarray(matrix.sum(axis=1)).ravel()
+    transposed = matrix.T.tocsc()
+
+    chunks = []
+    for start in range(0, matrix.shape[0], chunk_size):
+        shared = (matrix[start:start + chunk_size] @ transposed).tocsr()
+        source = np.repeat(np.arange(start, start + shared.shape[0]), np.diff(shared.indptr))
+        target = shared.indices
+        intersection = shared.data
+        keep = source != target
+        source, target, intersection = source[keep], target[keep], intersection[keep]
+        jaccard = intersection / (sizes[source] + sizes[target] - intersection)
+
+        order = np.lexsort((target, -jaccard, source))
+        source, target, jaccard, intersection = source[order], target[order], jaccard[order], intersection[order]
+        # rank of each pair among the pairs of its source
+        first = np.searchsorted(source, source, side='left')
+        rank = np.arange(len(source)) - first + 1
+        keep = rank <= k
+        chunks.append((source[keep], target[keep], jaccard[keep], intersection[keep], rank[keep]))
+
+    if len(chunks) == 0:
+        chunks = [(np.zeros(0, dtype=int),) * 5]
+    source, target, jaccard, intersection, rank = (np.concatenate(arrays) for arrays in zip(*chunks))
+    return (disease_ids[source], disease_ids[target], jaccard, intersection, rank)
+
+
+if __name__ == '__main__':
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    min_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    kg = KnowledgeGraph()
+    pairs = [(record['disease'], record['symptom']) for record in kg.get_disease_symptoms(min_count)]
+    diseases, symptoms = zip(*pairs) if pairs else ((), ())
+    source, target, jaccard, shared, rank = top_jaccard(diseases, symptoms, k)
+
+    kg.delete_similar_diseases()
+    batch_size = 10000
+    for start in range(0, len(source), batch_size):
+        kg.add_similar_diseases([{'source': int(s), 'target': int(t), 'jaccard': float(j), 'shared': int(c), 'rank': int(r)}
+                                 for s, t, j, c, r in zip(source[start:start + batch_size], target[start:start + batch_size],
+                                                          jaccard[start:start + batch_size], shared[start:start + batch_size],
+                                                          rank[start:start + batch_size])])
+    print('%d SIMILAR_TO relationships between %d diseases' % (len(source), len(set(diseases))))
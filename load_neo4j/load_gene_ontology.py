@@ -21,9 +21,10 @@ kg = KnowledgeGraph()
 uq = UmlsQuery()
 
 # add terms
+umls_results = uq.go2cui_batch([current_class.name.replace('_', ':') for current_class in ontology_classes])
 for current_class in ontology_classes:
     current_id = current_class.name.replace('_', ':')
-    umls_result = uq.go2cui(current_id)
+    umls_result = umls_results[current_id]
     if umls_result:
         name = umls_result[0]['name']
         cui = 'UMLS:' + umls_result[0]['cui']
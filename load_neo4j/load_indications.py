@@ -7,9 +7,10 @@ uq = UmlsQuery()
 ct = ChemblTools()
 
 chembl_ids = kg.get_drug_chembl_ids()
+indications = {chembl_id:ct.get_indication(chembl_id.replace('CHEMBL:', '')) for chembl_id in chembl_ids}
+umls_results = uq.mesh2cui_batch({row['mesh_id'] for rows in indications.values() for row in rows if row['mesh_id']})
 for chembl_id in chembl_ids:
-    indications = ct.get_indication(chembl_id.replace('CHEMBL:', ''))
-    for row in indications:
-        result = uq.mesh2cui(row['mesh_id'])
+    for row in indications[chembl_id]:
+        result = umls_results.get(row['mesh_id'])
         if result:
             kg.add_indication_relation(chembl_id, 'UMLS:' + result[0]['cui'])
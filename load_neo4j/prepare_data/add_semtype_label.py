@@ -5,7 +5,7 @@ kg = KnowledgeGraph()
 uq = UmlsQuery()
 
 cuis = kg.get_cuis()
+semtypes = uq.get_semtype_batch(cuis)
 for cui in cuis:
-    semtypes = uq.get_semtype(cui)
-    for record in semtypes:
+    for record in semtypes[cui]:
         kg.set_semtype(cui, record['type_name'].decode())
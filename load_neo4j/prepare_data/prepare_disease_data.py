@@ -15,13 +15,25 @@ ct = ChemblTools()
 
 added = set()
 disease_data = pd.DataFrame(columns=["cui", "name", "hpo_id", "mesh_id"])
+term_results = uq.meshterm2cui_batch(unique_diseases)
+
+chembl_ids = kg.get_drug_chembl_ids()
+indication_mesh_ids = list(dict.fromkeys(row['mesh_id'] for chembl_id in chembl_ids
+                                         for row in ct.get_indication(chembl_id.replace('CHEMBL:', ''))
+                                         if row['mesh_id']))
+mesh_results = uq.mesh2cui_batch(indication_mesh_ids)
+
+cuis = {result[0]['cui'] for result in list(term_results.values()) + list(mesh_results.values()) if result}
+names = uq.cui2bestname_batch(cuis)
+hpo_results = uq.cui2hpo_batch(cuis)
+
 for term in unique_diseases:
-    result = uq.meshterm2cui(term)
+    result = term_results[term]
     if result and result[0]['mesh_id'] not in added:
         cui = result[0]['cui']
         mesh_id = result[0]['mesh_id']
-        name = uq.cui2bestname(cui)[0]['name']
-        hpo_result = uq.cui2hpo(cui)
+        name = names[cui][0]['name']
+        hpo_result = hpo_results[cui]
         if hpo_result:
             hpo_id = hpo_result[0]['hpo_id']
         else:
@@ -33,27 +45,23 @@ for term in unique_diseases:
                                             'mesh_id': 'MESH:' + mesh_id},
                                            ignore_index=True)
 
-chembl_ids = kg.get_drug_chembl_ids()
-for chembl_id in chembl_ids:
-    indications = ct.get_indication(chembl_id.replace('CHEMBL:', ''))
-    for row in indications:
-        mesh_id = row['mesh_id']
-        if mesh_id not in added:
-            result = uq.mesh2cui(mesh_id)
-            if result:
-                cui = result[0]['cui']
-                name = uq.cui2bestname(cui)[0]['name']
-                hpo_result = uq.cui2hpo(cui)
-                if hpo_result:
-                    hpo_id = hpo_result[0]['hpo_id']
-                else:
-                    hpo_id = ''
-                addded.add(mesh_id)
-                disease_data = disease_data.append({'cui': 'UMLS:' + cui,
-                                                    'name': name,
-                                                    'hpo_id': hpo_id,
-                                                    'mesh_id': 'MESH:' + mesh_id},
-                                                   ignore_index=True)
+for mesh_id in indication_mesh_ids:
+    if mesh_id not in added:
+        result = mesh_results[mesh_id]
+        if result:
+            cui = result[0]['cui']
+            name = names[cui][0]['name']
+            hpo_result = hpo_results[cui]
+            if hpo_result:
+                hpo_id = hpo_result[0]['hpo_id']
+            else:
+                hpo_id = ''
+            added.add(mesh_id)
+            disease_data = disease_data.append({'cui': 'UMLS:' + cui,
+                                                'name': name,
+                                                'hpo_id': hpo_id,
+                                                'mesh_id': 'MESH:' + mesh_id},
+                                               ignore_index=True)
 
 #disease_data.drop_duplicates()
 
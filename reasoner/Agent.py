@@ -7,6 +7,7 @@ import re
 from .ActionPlanner import ActionPlanner, Noop, Success
 from .KnowledgeMap import KnowledgeMap
 from .Blackboard import Blackboard, QueryBuilder
+from .CompactBlackboard import CompactBlackboard
 from .QueryParser import QueryParser
 from .ConnectionPGM import ConnectionPGM
 from .actions.eutils import PubmedEdgeStats
@@ -30,11 +31,30 @@ class Agent:
     discount : float
        Discount value used by the MDP value iteration algorithm to find
        a knowledge acquisiton plan. Must be in range [0,1].
+       
+    parser : QueryParser, optional
+       A parser to reuse, e.g. when answering several questions in one session.
+       If None, a new ``QueryParser`` is created.
+       
+    query_budget : int or dict, optional
+       The maximum number of queries to run per action in each planning step
+       (see ``QueryBuilder``).
+       
+    query_priority : callable, optional
+       A function that scores a node. Queries whose nodes score highest run
+       first (see ``QueryBuilder``).
+       
+    blackboard : Blackboard or CompactBlackboard, optional
+       An empty blackboard to use, e.g. a ``CompactBlackboard`` for questions
+       that acquire a lot of knowledge. If None, a new ``Blackboard`` is created.
 
     """
-    def __init__(self, question, discount = 0.4):
-        self.parser = QueryParser()
-        self.blackboard = Blackboard()
+    def __init__(self, question, discount = 0.4, parser = None, query_budget = None, query_priority = None, blackboard = None):
+        self.parser = parser if parser is not None else QueryParser()
+        self.blackboard = blackboard if blackboard is not None else Blackboard()
+        self.query_builder = QueryBuilder(self.blackboard, query_budget, query_priority)
+        self.edge_stats = dict()
+        self.edge_probabilities = dict()
         self.discount = discount
         self.query = self.parser.parse(question)
         if len(self.query) == 0:
@@ -68,8 +88,11 @@ class Agent:
             height of plot (default: 2)
         
         """
+        graph = self.blackboard
+        if isinstance(graph, CompactBlackboard):
+            graph = graph.to_networkx()
         plt.figure(figsize=(width, height))
-        networkx.draw(self.blackboard, with_labels=True)
+        networkx.draw(graph, with_labels=True)
     
     def get_state(self, graph):
         entities = set(d['entity'] for n,d in graph.nodes(data=True) if not 'unbound' in d)
@@ -127,8 +150,7 @@ class Agent:
                 print("No connections found.")
                 return False
             
-            queries = QueryBuilder(self.blackboard).get_queries(next_action)
-            for query in queries:
+            for query in self.query_builder.iter_queries(next_action):
                 result = next_action.execute(query)
                 self.blackboard.add_knowledge(query, result, next_action)
             self.planner.set_action_used(next_action)
@@ -154,8 +176,9 @@ class Agent:
         variant_pattern = re.compile("\((.*)\):")
         stats = dict()
         ph = set(self.blackboard.placeholders)
-        for (u, v) in path_graph.edges():
-            if len({u,v} & ph) == 0:
+        for (u, v, d) in path_graph.edges(data=True):
+            # edges keep their stats, so only new edges are looked up
+            if len({u,v} & ph) == 0 and 'article_count' not in d:
                 start = u
                 end = v
                 
@@ -174,35 +197,39 @@ class Agent:
                     else:
                         print(v)
                     
-                stats[(u,v)] = pubmed.get_edge_stats(start,end)  
+                if (start, end) not in self.edge_stats:
+                    self.edge_stats[(start, end)] = pubmed.get_edge_stats(start,end)
+                stats[(u,v)] = self.edge_stats[(start, end)]
         
         # use path graph to iterate but apply updates to blackboard
-        networkx.set_edge_attributes(self.blackboard, stats)
+        self.blackboard.set_edge_attributes(stats)
 
     def calculate_edge_probabilities(self):
-        pgm = ConnectionPGM()
-        variables = ['is_connection']
+        """Calculate the connection probability and cost of new or changed edges.
         
-        evidence_types = ('pubmed',)
+        Edges are scored once after they were added to the blackboard or their
+        stats were set, and edges with the same evidence share one PGM evaluation.
         
-        # calculate default probabilities
-        default_probabilities = dict()
-        for evidence_type in evidence_types:
-            samples = pgm.evaluate(evidence_type, {}, variables)
-            default_probabilities[evidence_type] = pgm.get_mean(samples, 'is_connection')
+        """
+        pgm = ConnectionPGM()
+        variables = ['is_connection']
         
         current_year = int(datetime.datetime.now().year)
         attributes = dict()
-        for (u, v, d) in self.blackboard.edges(data=True):
-            if 'article_count' not in d or d['article_count'] == 0:
-                sample_mean = default_probabilities['pubmed']
-            else:
-                evidence = {'num_articles':d['article_count']}
+        for (u, v) in self.blackboard.pop_dirty_edges():
+            d = self.blackboard.edges[u, v]
+            evidence = dict()
+            if 'article_count' in d and d['article_count'] != 0:
+                evidence['num_articles'] = d['article_count']
                 if 'year_first_article' in d:
                     y = current_year - d['year_first_article']
                     evidence['years_since_first_article'] = y
+            
+            key = tuple(sorted(evidence.items()))
+            if key not in self.edge_probabilities:
                 samples = pgm.evaluate('pubmed', evidence, variables)
-                sample_mean = pgm.get_mean(samples, 'is_connection')
+                self.edge_probabilities[key] = pgm.get_mean(samples, 'is_connection')
+            sample_mean = self.edge_probabilities[key]
                 
             # add 1 to cost because the default cost in networx is 1
             attributes[(u,v)] = {'p':sample_mean,'cost':1+(1-sample_mean)}
@@ -221,7 +248,7 @@ class Agent:
         diff = set(self.planner.goal_state) - set(current_state)
         return len(diff) == 0
     
-    def analyze(self, source, target):
+    def analyze(self, source, target, max_length = None):
         """Analyze the knowledge on the blackboard and return the best path between source and target.
         
         Parameters
@@ -232,6 +259,9 @@ class Agent:
         target : str
             Name of the target node.
         
+        max_length : int, optional
+            Only score edges on paths with at most this many edges. [default: None]
+        
         Returns
         -------
         path : dict
@@ -243,20 +273,67 @@ class Agent:
         
         """
         # create a subgraph that consists of all nodes on a path between source and target
-        path_graph = self.blackboard.get_path_subgraph([source], [target])
+        path_graph = self.blackboard.get_path_subgraph([source], [target], max_length)
         self.set_edge_stats(path_graph)
         self.calculate_edge_probabilities()
         try:
             path_nodes = networkx.shortest_path(self.blackboard, source, target, 'cost')
-            path = {'nodes':[], 'edges':[]}
-            for i in range(len(path_nodes)):
-                attributes = self.blackboard.nodes[path_nodes[i]].copy()
-                if 'unbound' in attributes and attributes['unbound'] == True:
-                    attributes['name'] = re.sub(r'_[0-9]+?$', '', attributes['name'])
-                path['nodes'].append(attributes)
-                if i < (len(path_nodes)-1):
-                    path['edges'].append(self.blackboard.edges[path_nodes[i], path_nodes[i+1]])
-            return path
+            return self.get_path_dict(path_nodes)
         except networkx.NetworkXNoPath:
             print("No path exists.")
             return {}
+
+    def analyze_paths(self, source, target, k = 5, max_length = None, goal_connections = True):
+        """Analyze the knowledge on the blackboard and return the ``k`` best paths between source and target.
+        
+        Parameters
+        ----------
+        source : str
+            Name of the source node.
+            
+        target : str
+            Name of the target node.
+        
+        k : int, optional
+            The maximum number of paths. [default: 5]
+        
+        max_length : int, optional
+            Only return paths with at most this many edges. [default: None]
+        
+        goal_connections : bool, optional
+            Should paths only use edges between entities that are connected in
+            the goal state of the plan, e.g. Drug-Target and Target-Pathway for
+            outcome paths? [default: True]
+        
+        Returns
+        -------
+        paths : list
+            Up to ``k`` paths, ranked by cost, each in the format returned by ``analyze``.
+        
+        """
+        path_graph = self.blackboard.get_path_subgraph([source], [target], max_length)
+        self.set_edge_stats(path_graph)
+        self.calculate_edge_probabilities()
+        entity_pairs = self.get_goal_connections() if goal_connections == True else None
+        top_paths = self.blackboard.get_top_paths(source, target, k, 'cost', max_length, entity_pairs)
+        if len(top_paths) == 0:
+            print("No path exists.")
+        return [self.get_path_dict(path_nodes) for path_nodes in top_paths]
+
+    def get_goal_connections(self):
+        connections = list()
+        for variable in self.planner.goal_state:
+            if 'connected(' in variable:
+                connections.append(tuple(x.strip() for x in variable[10:-1].split(',')))
+        return connections if len(connections) > 0 else None
+
+    def get_path_dict(self, path_nodes):
+        path = {'nodes':[], 'edges':[]}
+        for i in range(len(path_nodes)):
+            attributes = self.blackboard.nodes[path_nodes[i]].copy()
+            if 'unbound' in attributes and attributes['unbound'] == True:
+                attributes['name'] = re.sub(r'_[0-9]+?$', '', attributes['name'])
+            path['nodes'].append(attributes)
+            if i < (len(path_nodes)-1):
+                path['edges'].append(dict(self.blackboard.edges[path_nodes[i], path_nodes[i+1]]))
+        return path
@@ -1,3 +1,6 @@
+from collections import deque
+import heapq
+import itertools
 import networkx
 import numpy
 
@@ -11,12 +14,179 @@ class Blackboard(networkx.Graph):
     """
     
     def __init__(self):
+        # secondary indexes, kept up to date by the graph mutation methods below
+        self.node_entities = dict()
+        self.entity_nodes = dict()
+        self.unbound_nodes = set()
+        self.entity_edges = dict()
+        # edges added or changed since the last pop_dirty_edges call
+        self.dirty_edges = dict()
         super().__init__()
         self.placeholders = list()
 
+    def index_node(self, node):
+        attributes = self._node[node]
+        entity = attributes.get('entity')
+        if 'unbound' in attributes and attributes['unbound'] != False:
+            self.unbound_nodes.add(node)
+        else:
+            self.unbound_nodes.discard(node)
+
+        if node in self.node_entities:
+            old_entity = self.node_entities[node]
+            if old_entity == entity:
+                return
+            del self.entity_nodes[old_entity][node]
+            self.node_entities[node] = entity
+            self.entity_nodes.setdefault(entity, dict())[node] = None
+            for neighbor in self[node]:
+                neighbor_entity = old_entity if neighbor == node else self.node_entities[neighbor]
+                edge = self.pop_indexed_edge(frozenset((old_entity, neighbor_entity)), node, neighbor)
+                self.entity_edges.setdefault(frozenset((entity, self.node_entities[neighbor])), dict())[edge] = None
+        else:
+            self.node_entities[node] = entity
+            self.entity_nodes.setdefault(entity, dict())[node] = None
+
+    def unindex_node(self, node):
+        for neighbor in self[node]:
+            # in remove_nodes_from, edges to neighbors removed before are already unindexed
+            if neighbor in self.node_entities:
+                self.unindex_edge(node, neighbor)
+        del self.entity_nodes[self.node_entities.pop(node)][node]
+        self.unbound_nodes.discard(node)
+
+    def index_edge(self, u, v):
+        for n in (u, v):
+            if n not in self.node_entities:
+                self.index_node(n)
+        edges = self.entity_edges.setdefault(frozenset((self.node_entities[u], self.node_entities[v])), dict())
+        if (v, u) not in edges:
+            edges[(u, v)] = None
+
+    def pop_indexed_edge(self, key, u, v):
+        edges = self.entity_edges.get(key, {})
+        for edge in ((u, v), (v, u)):
+            if edge in edges:
+                del edges[edge]
+                return edge
+        return (u, v)
+
+    def unindex_edge(self, u, v):
+        self.dirty_edges.pop(frozenset((u, v)), None)
+        self.pop_indexed_edge(frozenset((self.node_entities[u], self.node_entities[v])), u, v)
+
+    def entity_index(self):
+        # graph views (e.g. from ``subgraph``) share the data of their parent
+        # but not its indexes, so an index is built for them on demand
+        if networkx.is_frozen(self):
+            index = Blackboard()
+            index.add_nodes_from(self.nodes(data=True))
+            index.add_edges_from(self.edges())
+            return index
+        return self
+
+    def add_node(self, node_for_adding, **attr):
+        super().add_node(node_for_adding, **attr)
+        self.index_node(node_for_adding)
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        nodes_for_adding = list(nodes_for_adding)
+        super().add_nodes_from(nodes_for_adding, **attr)
+        added = dict()
+        for n in nodes_for_adding:
+            # as in networkx, items are either nodes or (node, attribute dict) tuples
+            try:
+                hash(n)
+            except TypeError:
+                n = n[0]
+            added[n] = None
+        for n in added:
+            self.index_node(n)
+
+    def remove_node(self, n):
+        if n in self.node_entities:
+            self.unindex_node(n)
+        super().remove_node(n)
+
+    def remove_nodes_from(self, nodes):
+        nodes = list(nodes)
+        for n in nodes:
+            if n in self.node_entities:
+                self.unindex_node(n)
+        super().remove_nodes_from(nodes)
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        super().add_edge(u_of_edge, v_of_edge, **attr)
+        self.index_edge(u_of_edge, v_of_edge)
+        self.dirty_edges[frozenset((u_of_edge, v_of_edge))] = (u_of_edge, v_of_edge)
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        ebunch_to_add = list(ebunch_to_add)
+        super().add_edges_from(ebunch_to_add, **attr)
+        for e in ebunch_to_add:
+            self.index_edge(e[0], e[1])
+            self.dirty_edges[frozenset((e[0], e[1]))] = (e[0], e[1])
+
+    def remove_edge(self, u, v):
+        if self.has_edge(u, v):
+            self.unindex_edge(u, v)
+        super().remove_edge(u, v)
+
+    def remove_edges_from(self, ebunch):
+        ebunch = list(ebunch)
+        for e in ebunch:
+            if self.has_edge(e[0], e[1]):
+                self.unindex_edge(e[0], e[1])
+        super().remove_edges_from(ebunch)
+
+    def clear(self):
+        super().clear()
+        self.node_entities = dict()
+        self.entity_nodes = dict()
+        self.unbound_nodes = set()
+        self.entity_edges = dict()
+        self.dirty_edges = dict()
+
+    def clear_edges(self):
+        super().clear_edges()
+        self.entity_edges = dict()
+        self.dirty_edges = dict()
+
+    def set_edge_attributes(self, values):
+        """Update the attributes of existing edges and mark them as changed.
+        
+        Parameters
+        ----------
+        values : dict
+            A dictionary of attribute dictionaries, indexed by edge tuples.
+        
+        """
+        for (u, v), d in values.items():
+            if self.has_edge(u, v):
+                self._adj[u][v].update(d)
+                self.dirty_edges[frozenset((u, v))] = (u, v)
+
+    def pop_dirty_edges(self):
+        """Return the edges added or changed since the last call.
+        
+        Edges count as changed when they are added again or updated with
+        ``set_edge_attributes``, but not when their attributes are changed
+        directly, e.g. with ``networkx.set_edge_attributes``.
+        
+        Returns
+        -------
+        list
+            A list of edge tuples.
+        
+        """
+        edges = list(self.dirty_edges.values())
+        self.dirty_edges = dict()
+        return edges
+
     def add_node_from_attributes(self, attributes, entity):
-        self.add_node(attributes['name'], entity = entity)
+        super().add_node(attributes['name'], entity = entity)
         networkx.set_node_attributes(self, {attributes['name']:attributes})
+        self.index_node(attributes['name'])
         return attributes['name']
     
     def add_placeholder(self, entity):
@@ -31,8 +201,24 @@ class Blackboard(networkx.Graph):
             if u == v:
                 remove_edges.append((u,v))
         self.remove_edges_from(remove_edges)
+
+    def align_edge_entities_from(self, nodes):
+        """Align the edge entities of several nodes and remove their self-loops.
+        
+        Same as calling ``align_edge_entities`` for each node in ``nodes`` in turn,
+        but in a single pass over their adjacencies.
+        
+        """
+        remove_edges = list()
+        for node in nodes:
+            entity = self._node[node]['entity']
+            for nbr,d in self._adj[node].items():
+                d['entities'] = (entity, self._node[nbr]['entity'])
+                if nbr == node:
+                    remove_edges.append((node,node))
+        self.remove_edges_from(remove_edges)
     
-    def add_knowledge(self, query, query_result, action):
+    def add_knowledge(self, query, query_result, action, bulk=True):
         """Add knowledge to the Blackboard.
         
         Parameters
@@ -47,67 +233,126 @@ class Blackboard(networkx.Graph):
         action : Action
             The action used to get ``query_results``.
         
+        bulk : bool, optional
+            Should all nodes and edges of ``query_result`` be collected first and
+            added in one pass, aligning edge entities once at the end? This gives
+            the same graph as adding them one by one, but is much faster for
+            large results. [default: True]
+        
         """
+        target = KnowledgeBatch(self) if bulk else self
+        
         if len(action.effect_entities) == 2:
+            (query_entity, n0) = next(iter(query.items()))
             for item in query_result:
                 for entity,instance_list in item.items():
                     for attributes in instance_list:
-                        n0 = list(query.values())[0]
-                        n1 = self.add_node_from_attributes(attributes['node'], entity = entity)
-                        self.add_edge(n0, n1, entities = (next(iter(query)), entity))
-                        networkx.set_edge_attributes(self, {(n0, n1):attributes['edge']})
-                        self.align_edge_entities(n1)
+                        n1 = target.add_node_from_attributes(attributes['node'], entity = entity)
+                        target.add_edge(n0, n1, **{'entities':(query_entity, entity), **attributes['edge']})
+                        target.align_edge_entities(n1)
         elif len(action.effect_entities) == 1:
             for item in query_result:
                 for entity,instance_list in item.items():
                     for attributes in instance_list:
-                        n0 = self.add_node_from_attributes(attributes['node'], entity = entity)
-                        self.align_edge_entities(n0)
+                        n0 = target.add_node_from_attributes(attributes['node'], entity = entity)
+                        target.align_edge_entities(n0)
         else:
             for path in query_result:
                 for edge in action.effect_connections:
                     if edge[0] in path:
-                        n0 = {self.add_node_from_attributes(attributes['node'], edge[0]):attributes['edge'] for attributes in path[edge[0]]}
+                        n0 = {target.add_node_from_attributes(attributes['node'], edge[0]):attributes['edge'] for attributes in path[edge[0]]}
                         if edge[1] in path:
-                            n1 = {self.add_node_from_attributes(attributes['node'], edge[1]):attributes['edge'] for attributes in path[edge[1]]}
+                            n1 = {target.add_node_from_attributes(attributes['node'], edge[1]):attributes['edge'] for attributes in path[edge[1]]}
                         elif edge[1] in query:
                             n1 = {query[edge[1]]:{}}
                         else:
-                            n1 = {self.add_placeholder(edge[1]):{}}
+                            n1 = {target.add_placeholder(edge[1]):{}}
                             path[edge[1]] = [{'node':{'name':node},'edge':{}} for node in n1]
 
                     elif edge[1] in path:
-                        n1 = {self.add_node_from_attributes(attributes['node'], edge[1]):attributes['edge'] for attributes in path[edge[1]]}
+                        n1 = {target.add_node_from_attributes(attributes['node'], edge[1]):attributes['edge'] for attributes in path[edge[1]]}
                         if edge[0] in path:
-                            n0 = {self.add_node_from_attributes(attributes['node'], edge[0]):attributes['edge'] for attributes in path[edge[0]]}
+                            n0 = {target.add_node_from_attributes(attributes['node'], edge[0]):attributes['edge'] for attributes in path[edge[0]]}
                         elif edge[0] in query:
                             n0 = {query[edge[0]]:{}}
                         else:
-                            n0 = {self.add_placeholder(edge[0]):{}}
+                            n0 = {target.add_placeholder(edge[0]):{}}
                             path[edge[0]] = [{'node':{'name':node},'edge':{}} for node in n0]
                     elif edge[0] in query:
                         n0 = {query[edge[0]]:{}}
-                        n1 = {self.add_placeholder(edge[1]):{}}
+                        n1 = {target.add_placeholder(edge[1]):{}}
                         path[edge[1]] = [{'node':{'name':node},'edge':{}} for node in n1]
                     elif edge[1] in query:
-                        n0 = {self.add_placeholder(edge[0]):{}}
+                        n0 = {target.add_placeholder(edge[0]):{}}
                         path[edge[0]] = [{'node':{'name':node},'edge':{}} for node in n0]
                         n1 = {query[edge[1]]:{}}
                     else:
-                        n0 = {self.add_placeholder(edge[0]):{}}
-                        n1 = {self.add_placeholder(edge[1]):{}}
+                        n0 = {target.add_placeholder(edge[0]):{}}
+                        n1 = {target.add_placeholder(edge[1]):{}}
                         path[edge[0]] = [{'node':{'name':node},'edge':{}} for node in n0]
                         path[edge[1]] = [{'node':{'name':node},'edge':{}} for node in n1]
 
-                    edge_attributes = dict()
                     for start,start_eattr in n0.items():
                         for end,end_eattr in n1.items():
-                            self.add_edge(start, end, entities = (edge[0], edge[1]))
-                            edge_attributes[(start,end)] = end_eattr
-
-                    networkx.set_edge_attributes(self, edge_attributes)
+                            target.add_edge(start, end, **{'entities':(edge[0], edge[1]), **end_eattr})
+        
+        if bulk:
+            target.apply()
   
-    def get_path_subgraph(self, sources, targets):
+    def get_path_nodes(self, sources, targets, max_length = None):
+        """Find all nodes on shortest paths between two sets of nodes.
+        
+        These are the nodes with a positive ``networkx.betweenness_centrality_subset``
+        plus ``sources`` and ``targets``, but found with one breadth-first search per
+        source and a walk back along the shortest-path DAG from the reached targets.
+        
+        Parameters
+        ----------
+        sources : list
+            A list of node names to be used as path sources.
+            
+        targets : list
+            A list of node names to be used as path targets.
+        
+        max_length : int, optional
+            Only consider paths with at most this many edges. [default: None]
+        
+        Returns
+        -------
+        set
+            The names of all nodes on the paths, including ``sources`` and ``targets``.
+        
+        """
+        sources = [n for n in sources if n in self]
+        targets = [n for n in targets if n in self]
+        path_nodes = set(sources) | set(targets)
+        for source in sources:
+            remaining = set(targets) - {source}
+            distance = {source:0}
+            layer = [source]
+            while len(layer) > 0 and len(remaining) > 0 and (max_length is None or distance[layer[0]] < max_length):
+                next_layer = list()
+                for u in layer:
+                    for v in self._adj[u]:
+                        if v not in distance:
+                            distance[v] = distance[u] + 1
+                            next_layer.append(v)
+                            remaining.discard(v)
+                layer = next_layer
+            
+            # walk back from the targets along edges that shorten the distance to the source
+            stack = [t for t in targets if t in distance and t != source]
+            marked = set(stack)
+            while len(stack) > 0:
+                w = stack.pop()
+                for u in self._adj[w]:
+                    if u not in marked and distance.get(u) == distance[w] - 1:
+                        marked.add(u)
+                        stack.append(u)
+            path_nodes.update(marked)
+        return path_nodes
+
+    def get_path_subgraph(self, sources, targets, max_length = None):
         """Return an induced subgraph of all paths connecting two sets of nodes.
         
         Parameters
@@ -118,17 +363,104 @@ class Blackboard(networkx.Graph):
         targets : list
             A list of node names to be used as path targets.
         
+        max_length : int, optional
+            Only include paths with at most this many edges. [default: None]
+        
         Returns
         -------
         networkx.Graph
             An induced subgraph that contains all nodes and edges between ``sources`` and ``targets``.
         
         """
-        bc = networkx.betweenness_centrality_subset(self, sources = sources, targets = targets)
-        path_nodes = [key for key,value in bc.items() if value > 0 or key in sources or key in targets]
-        return(self.subgraph(path_nodes))
+        return(self.subgraph(self.get_path_nodes(sources, targets, max_length)))
+
+    def get_distances(self, source, neighbors, cutoff = None):
+        distance = {source:0}
+        layer = [source]
+        while len(layer) > 0 and (cutoff is None or distance[layer[0]] < cutoff):
+            next_layer = list()
+            for u in layer:
+                for v in neighbors(u):
+                    if v not in distance:
+                        distance[v] = distance[u] + 1
+                        next_layer.append(v)
+            layer = next_layer
+        return distance
 
-    def prune(self, remove_singletons=True, trim_leaves=False, remove_placeholders=False, sources=None, targets=None):
+    def get_top_paths(self, source, target, k = 5, weight = 'cost', max_length = None, entity_pairs = None):
+        """Return the ``k`` best loopless paths between two nodes.
+        
+        Paths are found with Yen's algorithm (``networkx.shortest_simple_paths``),
+        which is stopped after ``k`` paths. The search is restricted to edges that
+        connect allowed entities and, if ``max_length`` is given, to nodes that are
+        on some path with at most ``max_length`` edges.
+        
+        Parameters
+        ----------
+        source : str
+            Name of the source node.
+            
+        target : str
+            Name of the target node.
+        
+        k : int, optional
+            The number of paths. [default: 5]
+        
+        weight : str, optional
+            The edge attribute to use as edge cost. Edges without it cost 1. [default: 'cost']
+        
+        max_length : int, optional
+            Only return paths with at most this many edges. [default: None]
+        
+        entity_pairs : list, optional
+            A list of entity name tuples (size 2). If given, paths only use edges
+            between instances of these entities, in either direction. [default: None]
+        
+        Returns
+        -------
+        list
+            Up to ``k`` paths as lists of node names, in order of increasing cost.
+        
+        """
+        if source not in self or target not in self:
+            return []
+        
+        graph = self
+        if entity_pairs is not None or max_length is not None:
+            # copy the candidate part of the blackboard into a small weighted graph
+            if entity_pairs is not None:
+                allowed = dict()
+                for (e0, e1) in entity_pairs:
+                    allowed.setdefault(e0, set()).add(e1)
+                    allowed.setdefault(e1, set()).add(e0)
+                node_entities = self.entity_index().node_entities
+                neighbors = lambda u: [v for v in self._adj[u] if node_entities[v] in allowed.get(node_entities[u], ())]
+            else:
+                neighbors = lambda u: self._adj[u]
+            source_distance = self.get_distances(source, neighbors, max_length)
+            if target not in source_distance:
+                return []
+            if max_length is not None:
+                target_distance = self.get_distances(target, neighbors, max_length)
+                candidates = {n for n,d in source_distance.items() if n in target_distance and d + target_distance[n] <= max_length}
+            else:
+                candidates = set(source_distance)
+            graph = networkx.Graph()
+            graph.add_nodes_from(candidates)
+            graph.add_weighted_edges_from(((u, v, self._adj[u][v].get(weight, 1)) for u in candidates for v in neighbors(u) if v in candidates), weight)
+        
+        paths = list()
+        try:
+            for path in networkx.shortest_simple_paths(graph, source, target, weight):
+                if max_length is None or len(path) - 1 <= max_length:
+                    paths.append(path)
+                    if len(paths) == k:
+                        break
+        except networkx.NetworkXNoPath:
+            pass
+        return paths
+
+    def prune(self, remove_singletons=True, trim_leaves=False, remove_placeholders=False, sources=None, targets=None, max_length=None, protected=None):
         """Remove specific parts of the graph.
         
         Parameters
@@ -147,30 +479,66 @@ class Blackboard(networkx.Graph):
             Lists of node names. If provided, nodes that are not on any path
             between ``sources`` and ``targets`` will be removed. [default: None]
         
+        max_length : int, optional
+            Maximum number of edges of the paths between ``sources`` and
+            ``targets``. [default: None]
+        
+        protected : list, optional
+            Nodes that are never removed as leaves or singletons, e.g. the
+            sources and targets of a query or the placeholders. [default: None]
+        
+        Returns
+        -------
+        dict
+            The removed nodes, indexed by 'placeholders', 'paths', 'leaves', and
+            'singletons'.
+        
         """
+        protected = set(protected) if protected is not None else set()
+        removed = {'placeholders':[], 'paths':[], 'leaves':[], 'singletons':[]}
+        
         if remove_placeholders == True:
-            self.remove_nodes_from(self.placeholders)
+            removed['placeholders'] = [n for n in self.placeholders if n in self]
+            self.remove_nodes_from(removed['placeholders'])
 
         if sources is not None and targets is not None:
-            bc = networkx.betweenness_centrality_subset(self, sources = sources, targets = targets)
-            remove_bc = [key for key,value in bc.items() if value == 0 and not key in sources and not key in targets]
-            self.remove_nodes_from(remove_bc)
+            path_nodes = self.get_path_nodes(sources, targets, max_length)
+            removed['paths'] = [n for n in self if n not in path_nodes]
+            self.remove_nodes_from(removed['paths'])
 
         if trim_leaves:
-            degrees = dict(self.degree())
-            while 1 in degrees.values():
-                for key,value in degrees.items():
-                    if(value == 1):
-                        self.remove_node(key)
-                degrees = dict(self.degree())
+            # one pass over a queue of leaves with a degree count per node: a
+            # node is queued when the leaves of the previous wave leave it with
+            # one neighbor, and dropped again if another leaf of that wave
+            # takes its last neighbor, so each node is handled once and the
+            # same nodes are removed as by removing all leaves wave by wave
+            degree = dict(self.degree())
+            wave = {n:0 for n,d in degree.items() if d == 1 and n not in protected}
+            queue = deque(wave)
+            trimmed = set()
+            while len(queue) > 0:
+                u = queue.popleft()
+                if u not in wave:
+                    continue
+                removed['leaves'].append(u)
+                trimmed.add(u)
+                for v in self._adj[u]:
+                    if v == u or v in trimmed:
+                        continue
+                    degree[v] -= 1
+                    if v in wave:
+                        if degree[v] == 0 and wave[v] > wave[u]:
+                            del wave[v]
+                    elif degree[v] == 1 and v not in protected:
+                        wave[v] = wave[u] + 1
+                        queue.append(v)
+            self.remove_nodes_from(removed['leaves'])
 
         if remove_singletons:
-            degrees = dict(self.degree())
-            for key,value in degrees.items():
-                if(value == 0):
-                    self.remove_node(key)
-    
-    
+            removed['singletons'] = [n for n,nbrs in self._adj.items() if len(nbrs) == 0 and n not in protected]
+            self.remove_nodes_from(removed['singletons'])
+        
+        return removed
   
     def get_entity_nodes(self,entities, include_unbound = False):
         """Get all nodes that are instances of specific entities.
@@ -189,18 +557,14 @@ class Blackboard(networkx.Graph):
             A dictionary of nodes, indexed by entity names.
         
         """
+        index = self.entity_index()
         node_dict = dict()
         for entity in entities:
-            node_dict[entity] = list()
-        
-        if include_unbound == True:
-            for n,d in self.nodes(data=True):
-                if d['entity'] in entities:
-                    node_dict[d['entity']].append(n)
-        else:
-            for n,d in self.nodes(data=True):
-                if d['entity'] in entities and (not 'unbound' in d or d['unbound'] == False):
-                    node_dict[d['entity']].append(n)
+            nodes = index.entity_nodes.get(entity, {})
+            if include_unbound == True:
+                node_dict[entity] = list(nodes)
+            else:
+                node_dict[entity] = [n for n in nodes if n not in index.unbound_nodes]
         return node_dict
     
     
@@ -221,34 +585,28 @@ class Blackboard(networkx.Graph):
             A dictionary of edges, indexed by entity tuples.
         
         """
+        index = self.entity_index()
         edge_dict = dict()
         for entity_pair in entity_pairs:
             edge_dict[entity_pair] = list()
         
-        if include_unbound == True:
-            for u,v in self.edges():
-                etup = (self.nodes[u]['entity'], self.nodes[v]['entity'])
-                rev = tuple(reversed(etup))
-                if etup in entity_pairs:
+        for key in {frozenset(entity_pair) for entity_pair in edge_dict}:
+            for (u, v) in index.entity_edges.get(key, {}):
+                if include_unbound == False and (u in index.unbound_nodes or v in index.unbound_nodes):
+                    continue
+                etup = (index.node_entities[u], index.node_entities[v])
+                if etup in edge_dict:
                     edge_dict[etup].append((u,v))
-                elif rev in entity_pairs:
-                    edge_dict[rev].append((v,u))
-        else:
-            for u,v in self.edges():
-                u_bound = (not 'unbound' in self.nodes[u]) or self.nodes[u]['unbound'] == False
-                v_bound = (not 'unbound' in self.nodes[v]) or self.nodes[v]['unbound'] == False
-                if u_bound and v_bound:
-                    etup = (self.nodes[u]['entity'], self.nodes[v]['entity'])
-                    rev = tuple(reversed(etup))
-                    if etup in entity_pairs:
-                        edge_dict[etup].append((u,v))
-                    elif rev in entity_pairs:
-                        edge_dict[rev].append((v,u))
+                else:
+                    edge_dict[tuple(reversed(etup))].append((v,u))
         return edge_dict
 
     def write_safe(self):
         """Return a copy of the blackboard graph that is safe to write to GraphML.
         
+        To write large blackboards without copying them, use
+        ``reasoner.BlackboardIO.write_blackboard``.
+        
         Returns
         -------
         graph : ~reasoner.Blackboard.Blackboard
@@ -260,42 +618,179 @@ class Blackboard(networkx.Graph):
             d['entity_source'] = d['entities'][0]
             d['entity_target'] = d['entities'][1]
             del d['entities']
-            if 'p' in d and type(d['p']).__module__ == numpy.__name__:
-                d['p'] = numpy.asscalar(d['p'])
-            if 'cost' in d and type(d['cost']).__module__ == numpy.__name__:
-                d['cost'] = numpy.asscalar(d['cost'])
+            for key, value in d.items():
+                if isinstance(value, numpy.generic):
+                    d[key] = value.item()
         return graph
     
     
+class KnowledgeBatch():
+    """Collect nodes and edges and add them to a blackboard in one pass.
+    
+    ``KnowledgeBatch`` offers the methods of ``Blackboard`` that ``add_knowledge``
+    uses, but only records the changes. ``apply`` adds all recorded nodes and
+    edges with ``add_nodes_from`` and ``add_edges_from`` and then aligns the edge
+    entities of every recorded node once, in the order in which they were last
+    requested, which gives the same graph as applying the changes one by one.
+    
+    Parameters
+    ----------
+    blackboard : Blackboard
+        The blackboard to add knowledge to.
+    
+    """
+    def __init__(self, blackboard):
+        self.blackboard = blackboard
+        self.nodes = list()
+        self.edges = list()
+        self.align_nodes = dict()
+
+    def add_node_from_attributes(self, attributes, entity):
+        self.nodes.append((attributes['name'], {'entity':entity, **attributes}))
+        return attributes['name']
+
+    def add_placeholder(self, entity):
+        placeholders = self.blackboard.placeholders
+        placeholders.append('unknown_' + entity.lower() + '_' + str(len(placeholders)))
+        self.nodes.append((placeholders[-1], {'entity':entity, 'unbound':True}))
+        return placeholders[-1]
+
+    def add_edge(self, u, v, **attr):
+        self.edges.append((u, v, attr))
+
+    def align_edge_entities(self, node):
+        self.align_nodes.pop(node, None)
+        self.align_nodes[node] = None
+
+    def apply(self):
+        self.blackboard.add_nodes_from(self.nodes)
+        self.blackboard.add_edges_from(self.edges)
+        self.blackboard.align_edge_entities_from(self.align_nodes)
+
+
 class QueryBuilder():
     """Construct all possible queries from a dictionary of entities (keys) to nodes (values).
     
+    Queries are generated lazily, one binding at a time. A ``QueryBuilder``
+    remembers the bindings it has handed out for each action, so reusing the
+    same builder across planning steps only yields bindings that were not
+    executed before.
+    
     Parameters
     ----------
     blackboard : Blackboard
         The blackboard to use for the query.
     
+    budget : int or dict, optional
+        The maximum number of queries per action that one call of
+        ``iter_queries`` or ``get_queries`` yields, i.e. per planning step,
+        either for all actions or as a dictionary indexed by action class
+        names. [default: no limit]
+    
+    priority : callable, optional
+        A function that scores a node, e.g. ``blackboard.degree``. If given,
+        bindings are yielded in descending order of the summed scores of their
+        nodes, so the most promising queries run first. [default: None]
+    
     """
-    def __init__(self, blackboard):
-        self.query_list = list()
+    def __init__(self, blackboard, budget = None, priority = None):
         self.blackboard = blackboard
+        self.budget = budget
+        self.priority = priority
+        self.executed = dict()
 
-    def get_all_queries(self, index, n, query):
-        #recursively move through the given entities and bind them with all given instances
-        if index == n:
-            self.query_list.append(query)
-        else:
-            if isinstance(self.keys[index], tuple):
-                for instance in self.instances[self.keys[index]]:
-                    q = {**query, **{self.keys[index][0]:instance[0], self.keys[index][1]:instance[1]}}
-                    self.get_all_queries(index+1, n, q)
-            else:
-                for instance in self.instances[self.keys[index]]:
-                    q = {**query, **{self.keys[index]:instance}}
-                    self.get_all_queries(index+1, n, q)
+    def get_instances(self, action):
+        unconnected_entities = list()
+        for bound in action.precondition_bindings:
+            is_connected = False
+            for connection in action.precondition_connections:
+                if bound in connection:
+                    is_connected = True
+                    break
+            if is_connected == False:
+                unconnected_entities.append(bound)
+        
+        instances = self.blackboard.get_entity_edges(action.precondition_connections)
+        instances.update(self.blackboard.get_entity_nodes(unconnected_entities))
+        return instances
+
+    def get_budget(self, action):
+        if isinstance(self.budget, dict):
+            return self.budget.get(type(action).__name__)
+        return self.budget
+
+    def score(self, instance):
+        if isinstance(instance, tuple):
+            return sum(self.priority(node) for node in instance)
+        return self.priority(instance)
+
+    def iter_bindings(self, instance_lists):
+        if self.priority is None:
+            yield from itertools.product(*instance_lists)
+            return
+        
+        # best-first enumeration of the cartesian product: each list is ranked by
+        # score and the heap holds the frontier of index tuples by summed score
+        ranked = list()
+        scores = list()
+        for instances in instance_lists:
+            scored = sorted(((self.score(i), i) for i in instances), key = lambda x: x[0], reverse = True)
+            ranked.append([i for (_, i) in scored])
+            scores.append([score for (score, _) in scored])
+        if any(len(instances) == 0 for instances in ranked):
+            return
+        start = (0,) * len(ranked)
+        heap = [(-sum(s[0] for s in scores), start)]
+        seen = {start}
+        while len(heap) > 0:
+            (neg_score, index) = heapq.heappop(heap)
+            yield tuple(instances[i] for instances, i in zip(ranked, index))
+            for j in range(len(index)):
+                if index[j] + 1 < len(ranked[j]):
+                    successor = index[:j] + (index[j] + 1,) + index[j+1:]
+                    if successor not in seen:
+                        seen.add(successor)
+                        heapq.heappush(heap, (neg_score + scores[j][index[j]] - scores[j][index[j] + 1], successor))
+
+    def iter_queries(self, action):
+        """Yield the binding combinations for ``action`` that were not executed yet.
+        
+        Parameters
+        ----------
+        action : Action
+            The action for which to generate queries.
+        
+        Yields
+        ------
+        dict
+            A query, with entity names as keys and node names as values.
+        
+        """
+        instances = self.get_instances(action)
+        keys = list(instances.keys())
+        executed = self.executed.setdefault(type(action).__name__, set())
+        budget = self.get_budget(action)
+        count = 0
+        
+        for binding in self.iter_bindings([instances[key] for key in keys]):
+            if budget is not None and count >= budget:
+                return
+            query = dict()
+            for key, instance in zip(keys, binding):
+                if isinstance(key, tuple):
+                    query[key[0]] = instance[0]
+                    query[key[1]] = instance[1]
+                else:
+                    query[key] = instance
+            binding_key = frozenset(query.items())
+            if binding_key in executed:
+                continue
+            executed.add(binding_key)
+            count += 1
+            yield query
     
     def get_queries(self, action):
-        """Find all possible binding combinations for ``instances``.
+        """Find all possible binding combinations for ``action``.
         
         Parameters
         ----------
@@ -308,19 +803,4 @@ class QueryBuilder():
             A list queries.
         
         """
-        unconnected_entities = list()
-        for bound in action.precondition_bindings:
-            is_connected = False
-            for connection in action.precondition_connections:
-                if bound in connection:
-                    is_connected = True
-                    break
-            if is_connected == False:
-                unconnected_entities.append(bound)
-        
-        self.instances = self.blackboard.get_entity_edges(action.precondition_connections)
-        self.instances.update(self.blackboard.get_entity_nodes(unconnected_entities))
-        
-        self.keys = list(self.instances.keys())
-        self.get_all_queries(0, len(self.keys), dict())
-        return self.query_list
\ No newline at end of file
+        return list(self.iter_queries(action))
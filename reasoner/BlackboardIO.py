@@ -0,0 +1,337 @@
+import gzip
+import json
+import xml.etree.ElementTree as etree
+from xml.sax.saxutils import escape, quoteattr
+import networkx
+import numpy
+
+from .Blackboard import Blackboard
+
+FORMATS = {'.graphml':'graphml', '.jsonl':'jsonl', '.parquet':'parquet'}
+GRAPHML_TYPES = {bool:'boolean', int:'long', float:'double', str:'string'}
+GRAPHML_NAMESPACE = 'http://graphml.graphdrawing.org/xmlns'
+CHUNK_SIZE = 10000
+
+
+def get_format(path, format = None):
+    if format is not None:
+        return format
+    name = str(path)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    for extension, format in FORMATS.items():
+        if name.endswith(extension):
+            return format
+    raise ValueError('Cannot infer the blackboard format of %s, use one of %s.' % (path, ', '.join(FORMATS.values())))
+
+
+def open_text(path, mode):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding = 'utf-8')
+    return open(path, mode, encoding = 'utf-8')
+
+
+def to_python(value):
+    """Convert NumPy scalars and arrays to the equivalent Python values."""
+    if isinstance(value, numpy.generic):
+        return value.item()
+    if isinstance(value, numpy.ndarray):
+        return value.tolist()
+    return value
+
+
+def iter_node_data(blackboard):
+    for n, d in blackboard.nodes(data=True):
+        yield (n, {key:to_python(value) for key, value in d.items()})
+
+
+def iter_edge_data(blackboard):
+    # the entities tuple is split into two scalar attributes, as in write_safe
+    for u, v, d in blackboard.edges(data=True):
+        data = dict()
+        for key, value in d.items():
+            if key == 'entities':
+                data['entity_source'] = value[0]
+                data['entity_target'] = value[1]
+            else:
+                data[key] = to_python(value)
+        yield (u, v, data)
+
+
+def join_edge_entities(data):
+    if 'entity_source' in data and 'entity_target' in data:
+        data['entities'] = (data.pop('entity_source'), data.pop('entity_target'))
+    return data
+
+
+def get_attribute_types(records):
+    """Find the GraphML type of every attribute of the given attribute dicts.
+
+    Attributes with integer and float values are stored as double, and
+    attributes with values of otherwise different types as string.
+
+    """
+    types = dict()
+    for data in records:
+        for key, value in data.items():
+            if value is not None:
+                types.setdefault(key, set()).add(type(value))
+    attribute_types = dict()
+    for key, value_types in types.items():
+        unsupported = value_types - set(GRAPHML_TYPES)
+        if len(unsupported) > 0:
+            raise networkx.NetworkXError('Attribute %s has values of type %s, only %s are supported.'
+                                         % (key, ', '.join(t.__name__ for t in unsupported), ', '.join(t.__name__ for t in GRAPHML_TYPES)))
+        if len(value_types) == 1:
+            attribute_types[key] = GRAPHML_TYPES[value_types.pop()]
+        elif value_types == {int, float}:
+            attribute_types[key] = 'double'
+        else:
+            attribute_types[key] = 'string'
+    return attribute_types
+
+
+def format_value(value, attribute_type):
+    if attribute_type == 'boolean':
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def parse_value(text, attribute_type):
+    if attribute_type == 'boolean':
+        return text.strip().lower() in ('true', '1')
+    if attribute_type in ('int', 'long'):
+        return int(text)
+    if attribute_type in ('float', 'double'):
+        return float(text)
+    return text
+
+
+def write_blackboard(blackboard, path, format = None):
+    """Write a blackboard to GraphML, JSON lines, or Parquet.
+
+    Nodes and edges are streamed from the blackboard as they are written, so
+    the blackboard is not copied. Edge entities are written as the attributes
+    ``entity_source`` and ``entity_target``, and NumPy values as Python values.
+    GraphML and Parquet only support string, boolean, and numeric attributes;
+    JSON lines support any JSON-serializable attributes.
+
+    Parameters
+    ----------
+    blackboard : ~reasoner.Blackboard.Blackboard or ~reasoner.CompactBlackboard.CompactBlackboard
+        The blackboard to write.
+    path : str
+        The file to write to. GraphML and JSON lines files are compressed if the
+        name ends with '.gz'.
+    format : str, optional
+        One of 'graphml', 'jsonl', or 'parquet'. If None, the format is inferred
+        from the file extension. [default: None]
+
+    """
+    format = get_format(path, format)
+    if format == 'graphml':
+        write_graphml(blackboard, path)
+    elif format == 'jsonl':
+        write_jsonl(blackboard, path)
+    elif format == 'parquet':
+        write_parquet(blackboard, path)
+    else:
+        raise ValueError('Unknown blackboard format %s.' % format)
+
+
+def read_blackboard(path, format = None, blackboard_class = Blackboard):
+    """Read a blackboard written by ``write_blackboard``.
+
+    Parameters
+    ----------
+    path : str
+        The file to read.
+    format : str, optional
+        One of 'graphml', 'jsonl', or 'parquet'. If None, the format is inferred
+        from the file extension. [default: None]
+    blackboard_class : type, optional
+        The blackboard class to create, e.g. ``CompactBlackboard``. [default: Blackboard]
+
+    Returns
+    -------
+    blackboard : ~reasoner.Blackboard.Blackboard or ~reasoner.CompactBlackboard.CompactBlackboard
+        The blackboard.
+
+    """
+    format = get_format(path, format)
+    blackboard = blackboard_class()
+    if format == 'graphml':
+        records = iter_graphml(path, blackboard)
+    elif format == 'jsonl':
+        records = iter_jsonl(path, blackboard)
+    elif format == 'parquet':
+        records = iter_parquet(path, blackboard)
+    else:
+        raise ValueError('Unknown blackboard format %s.' % format)
+
+    # nodes come before edges in all formats, and are added in chunks
+    nodes = list()
+    edges = list()
+    for record in records:
+        if len(record) == 2:
+            nodes.append(record)
+            if len(nodes) == CHUNK_SIZE:
+                blackboard.add_nodes_from(nodes)
+                nodes = list()
+        else:
+            edges.append(record)
+            if len(edges) == CHUNK_SIZE:
+                blackboard.add_nodes_from(nodes)
+                blackboard.add_edges_from(edges)
+                nodes = list()
+                edges = list()
+    blackboard.add_nodes_from(nodes)
+    blackboard.add_edges_from(edges)
+    return blackboard
+
+
+def write_graphml(blackboard, path):
+    node_types = get_attribute_types(d for n, d in iter_node_data(blackboard))
+    edge_types = get_attribute_types(d for u, v, d in iter_edge_data(blackboard))
+    keys = {'node':dict(), 'edge':dict()}
+    with open_text(path, 'w') as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write('<graphml xmlns=%s>\n' % quoteattr(GRAPHML_NAMESPACE))
+        f.write('<key id="g0" for="graph" attr.name="placeholders" attr.type="string" />\n')
+        for domain, types in (('node', node_types), ('edge', edge_types)):
+            for name, attribute_type in types.items():
+                keys[domain][name] = ('%s%d' % (domain[0], len(keys[domain])), attribute_type)
+                f.write('<key id="%s" for="%s" attr.name=%s attr.type="%s" />\n'
+                        % (keys[domain][name][0], domain, quoteattr(name), attribute_type))
+        f.write('<graph edgedefault="undirected">\n')
+        f.write('<data key="g0">%s</data>\n' % escape(json.dumps(blackboard.placeholders)))
+
+        lines = list()
+        for n, d in iter_node_data(blackboard):
+            lines.append('<node id=%s>%s</node>\n' % (quoteattr(str(n)), format_data(d, keys['node'])))
+            if len(lines) == CHUNK_SIZE:
+                f.write(''.join(lines))
+                lines = list()
+        for u, v, d in iter_edge_data(blackboard):
+            lines.append('<edge source=%s target=%s>%s</edge>\n' % (quoteattr(str(u)), quoteattr(str(v)), format_data(d, keys['edge'])))
+            if len(lines) == CHUNK_SIZE:
+                f.write(''.join(lines))
+                lines = list()
+        f.write(''.join(lines))
+        f.write('</graph>\n</graphml>\n')
+
+
+def format_data(data, keys):
+    return ''.join('<data key="%s">%s</data>' % (keys[key][0], escape(format_value(value, keys[key][1])))
+                   for key, value in data.items() if value is not None)
+
+
+def iter_graphml(path, blackboard):
+    keys = dict()
+    graph = None
+    tag = lambda name: '{%s}%s' % (GRAPHML_NAMESPACE, name)
+    with open_text(path, 'r') as f:
+        for event, element in etree.iterparse(f, events = ('start', 'end')):
+            if event == 'start':
+                if element.tag == tag('graph'):
+                    graph = element
+            elif element.tag == tag('key'):
+                keys[element.get('id')] = (element.get('attr.name'), element.get('attr.type', 'string'))
+            elif element.tag == tag('node') or element.tag == tag('edge'):
+                data = dict()
+                for child in element.iter(tag('data')):
+                    (name, attribute_type) = keys[child.get('key')]
+                    data[name] = parse_value(child.text or '', attribute_type)
+                if element.tag == tag('node'):
+                    yield (element.get('id'), data)
+                else:
+                    yield (element.get('source'), element.get('target'), join_edge_entities(data))
+                # drop parsed elements so that memory does not grow with the file
+                graph.clear()
+            elif element.tag == tag('data') and element.get('key') == 'g0':
+                blackboard.placeholders = json.loads(element.text)
+
+
+def write_jsonl(blackboard, path):
+    with open_text(path, 'w') as f:
+        f.write(json.dumps({'placeholders':blackboard.placeholders}) + '\n')
+        lines = list()
+        for n, d in iter_node_data(blackboard):
+            lines.append(json.dumps({'node':n, 'data':d}, default = to_python) + '\n')
+            if len(lines) == CHUNK_SIZE:
+                f.write(''.join(lines))
+                lines = list()
+        for u, v, d in iter_edge_data(blackboard):
+            lines.append(json.dumps({'source':u, 'target':v, 'data':d}, default = to_python) + '\n')
+            if len(lines) == CHUNK_SIZE:
+                f.write(''.join(lines))
+                lines = list()
+        f.write(''.join(lines))
+
+
+def iter_jsonl(path, blackboard):
+    with open_text(path, 'r') as f:
+        blackboard.placeholders = json.loads(f.readline())['placeholders']
+        for line in f:
+            record = json.loads(line)
+            if 'node' in record:
+                yield (record['node'], record['data'])
+            else:
+                yield (record['source'], record['target'], join_edge_entities(record['data']))
+
+
+def write_parquet(blackboard, path):
+    # one row per node and edge; attribute columns are prefixed with 'node:' or 'edge:'
+    import pyarrow
+    import pyarrow.parquet
+
+    arrow_types = {'boolean':pyarrow.bool_(), 'long':pyarrow.int64(), 'double':pyarrow.float64(), 'string':pyarrow.string()}
+    columns = {'kind':pyarrow.string(), 'source':pyarrow.string(), 'target':pyarrow.string()}
+    for domain, records in (('node', (d for n, d in iter_node_data(blackboard))), ('edge', (d for u, v, d in iter_edge_data(blackboard)))):
+        for name, attribute_type in get_attribute_types(records).items():
+            columns['%s:%s' % (domain, name)] = arrow_types[attribute_type]
+    schema = pyarrow.schema(list(columns.items()), metadata = {'placeholders':json.dumps(blackboard.placeholders)})
+
+    def rows():
+        for n, d in iter_node_data(blackboard):
+            yield ('node', n, None, d)
+        for u, v, d in iter_edge_data(blackboard):
+            yield ('edge', u, v, d)
+
+    def write_rows(writer, chunk):
+        data = {name:[None] * len(chunk) for name in columns}
+        for i, (kind, source, target, d) in enumerate(chunk):
+            data['kind'][i] = kind
+            data['source'][i] = str(source)
+            data['target'][i] = None if target is None else str(target)
+            for key, value in d.items():
+                name = '%s:%s' % (kind, key)
+                data[name][i] = str(value) if columns[name] == pyarrow.string() and value is not None else value
+        writer.write_table(pyarrow.Table.from_pydict(data, schema = schema))
+
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        chunk = list()
+        for row in rows():
+            chunk.append(row)
+            if len(chunk) == CHUNK_SIZE:
+                write_rows(writer, chunk)
+                chunk = list()
+        if len(chunk) > 0:
+            write_rows(writer, chunk)
+
+
+def iter_parquet(path, blackboard):
+    import pyarrow.parquet
+
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    metadata = parquet_file.schema_arrow.metadata or dict()
+    blackboard.placeholders = json.loads(metadata.get(b'placeholders', b'[]'))
+    for batch in parquet_file.iter_batches(batch_size = CHUNK_SIZE):
+        columns = batch.to_pydict()
+        attributes = [(name, name.split(':', 1)) for name in columns if ':' in name]
+        for i, kind in enumerate(columns['kind']):
+            data = {key:columns[name][i] for name, (domain, key) in attributes if domain == kind and columns[name][i] is not None}
+            if kind == 'node':
+                yield (columns['source'][i], data)
+            else:
+                yield (columns['source'][i], columns['target'][i], join_edge_entities(data))
@@ -0,0 +1,736 @@
+from collections.abc import Mapping, MutableMapping
+import networkx
+import numpy
+
+from .Blackboard import Blackboard
+
+
+class Missing():
+    def __repr__(self):
+        return 'MISSING'
+
+MISSING = Missing()
+
+
+def get_value(columns, key, index):
+    column = columns.get(key)
+    if column is None or index >= len(column):
+        return MISSING
+    return column[index]
+
+
+def set_value(columns, key, index, value):
+    column = columns.setdefault(key, list())
+    if index >= len(column):
+        column.extend([MISSING] * (index + 1 - len(column)))
+    column[index] = value
+
+
+class GrowableArray():
+    """A NumPy array that grows in amortized constant time when appending."""
+    def __init__(self, dtype, fill = 0):
+        self.fill = fill
+        self.data = numpy.full(16, fill, dtype = dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.data):
+            data = numpy.full(2 * len(self.data), self.fill, dtype = self.data.dtype)
+            data[:self.size] = self.data
+            self.data = data
+        self.data[self.size] = value
+        self.size += 1
+
+    def values(self):
+        return self.data[:self.size]
+
+    def clear(self):
+        self.data = numpy.full(16, self.fill, dtype = self.data.dtype)
+        self.size = 0
+
+
+class CompactBlackboard():
+    """
+    A memory-efficient blackboard for large knowledge acquisitions.
+
+    ``CompactBlackboard`` holds the same knowledge as ``Blackboard``, but
+    interns node names to integer ids and stores entities as integer codes,
+    edges as NumPy arrays of node ids, and all other attributes as columns
+    indexed by node or edge id. It offers the part of the ``Blackboard`` and
+    networkx API used by ``Agent`` and ``QueryBuilder``: node and edge views
+    with attribute mappings, the adjacency (so networkx path algorithms work
+    on it), and the ``Blackboard`` methods for adding knowledge, entity lookups,
+    paths, and pruning. Use ``to_networkx`` for anything else, e.g. plotting.
+
+    """
+    def __init__(self):
+        self.node_ids = dict()
+        self.node_names = list()
+        # ids of removed nodes, reused for new nodes
+        self.free_node_ids = list()
+        self.node_entity = GrowableArray(numpy.int16, -1)
+        self.node_columns = dict()
+        self.unbound_nodes = set()
+        self.entity_codes = dict()
+        self.entity_names = list()
+
+        self.edge_ids = dict()
+        self.edge_u = GrowableArray(numpy.int32)
+        self.edge_v = GrowableArray(numpy.int32)
+        self.edge_alive = GrowableArray(numpy.bool_, False)
+        self.edge_entities = (GrowableArray(numpy.int16, -1), GrowableArray(numpy.int16, -1))
+        self.edge_columns = dict()
+
+        self.placeholders = list()
+        self.dirty_edges = dict()
+        self.adjacency = None
+        self.pending_adjacency = dict()
+        self.pending_count = 0
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Create a ``CompactBlackboard`` from a ``Blackboard`` or networkx graph."""
+        blackboard = cls()
+        blackboard.add_nodes_from(graph.nodes(data=True))
+        blackboard.add_edges_from(graph.edges(data=True))
+        blackboard.placeholders = list(getattr(graph, 'placeholders', []))
+        blackboard.dirty_edges = dict()
+        return blackboard
+
+    def to_networkx(self, nodes = None):
+        """Return the knowledge as ``Blackboard``.
+
+        Parameters
+        ----------
+        nodes : iterable, optional
+            If given, return the subgraph induced by these nodes. [default: None]
+
+        Returns
+        -------
+        ~reasoner.Blackboard.Blackboard
+            A copy of the (sub)graph.
+
+        """
+        graph = Blackboard()
+        graph.placeholders = list(self.placeholders)
+        if nodes is None:
+            graph.add_nodes_from((n, dict(self.nodes[n])) for n in self.node_ids)
+            graph.add_edges_from(self.edges(data = True))
+        else:
+            ids = [self.node_ids[n] for n in nodes if n in self.node_ids]
+            selected = numpy.zeros(len(self.node_names), dtype = numpy.bool_)
+            selected[ids] = True
+            graph.add_nodes_from((n, dict(NodeAttributes(self, i))) for n, i in self.node_ids.items() if selected[i])
+            edges = numpy.flatnonzero(self.edge_alive.values() & selected[self.edge_u.values()] & selected[self.edge_v.values()])
+            graph.add_edges_from(self.edge_tuple(e, True) for e in edges.tolist())
+        graph.dirty_edges = dict()
+        return graph
+
+    # node and entity storage
+
+    def entity_code(self, entity):
+        if entity not in self.entity_codes:
+            self.entity_codes[entity] = len(self.entity_names)
+            self.entity_names.append(entity)
+        return self.entity_codes[entity]
+
+    def get_node_id(self, node):
+        if node not in self.node_ids:
+            if len(self.free_node_ids) > 0:
+                self.node_ids[node] = self.free_node_ids.pop()
+                self.node_names[self.node_ids[node]] = node
+            else:
+                self.node_ids[node] = len(self.node_names)
+                self.node_names.append(node)
+                self.node_entity.append(-1)
+        return self.node_ids[node]
+
+    def clear_node_id(self, index):
+        # the edges of the node must be removed before
+        self.node_names[index] = None
+        self.node_entity.data[index] = -1
+        for column in self.node_columns.values():
+            if index < len(column):
+                column[index] = MISSING
+        self.unbound_nodes.discard(index)
+        self.pending_adjacency.pop(index, None)
+        self.free_node_ids.append(index)
+
+    def set_node_value(self, index, key, value):
+        if key == 'entity':
+            self.node_entity.data[index] = self.entity_code(value)
+        else:
+            set_value(self.node_columns, key, index, value)
+            if key == 'unbound':
+                if value != False:
+                    self.unbound_nodes.add(index)
+                else:
+                    self.unbound_nodes.discard(index)
+
+    def edge_key(self, i, j):
+        return (i << 32) | j if i < j else (j << 32) | i
+
+    def set_edge_value(self, index, key, value):
+        if key == 'entities':
+            self.edge_entities[0].data[index] = self.entity_code(value[0])
+            self.edge_entities[1].data[index] = self.entity_code(value[1])
+        else:
+            set_value(self.edge_columns, key, index, value)
+
+    def edge_tuple(self, index, data = False):
+        u = self.node_names[self.edge_u.data[index]]
+        v = self.node_names[self.edge_v.data[index]]
+        if data == True:
+            return (u, v, dict(EdgeAttributes(self, index)))
+        return (u, v)
+
+    def get_adjacency(self):
+        # compressed sparse rows of all edges; edges added later are kept in
+        # per-node lists until there are enough of them to rebuild it, and
+        # removed edges stay in it and are skipped when reading
+        if self.adjacency is None:
+            self.pending_adjacency = dict()
+            self.pending_count = 0
+            edges = numpy.flatnonzero(self.edge_alive.values())
+            u = self.edge_u.values()[edges]
+            v = self.edge_v.values()[edges]
+            loops = u == v
+            source = numpy.concatenate([u, v[~loops]])
+            order = numpy.argsort(source, kind = 'stable')
+            indptr = numpy.zeros(len(self.node_names) + 1, dtype = numpy.int64)
+            numpy.cumsum(numpy.bincount(source, minlength = len(self.node_names)), out = indptr[1:])
+            self.adjacency = (indptr, numpy.concatenate([v, u[~loops]])[order], numpy.concatenate([edges, edges[~loops]])[order])
+        return self.adjacency
+
+    def get_neighbors(self, index):
+        (indptr, neighbors, edges) = self.get_adjacency()
+        if index + 1 < len(indptr):
+            neighbors = neighbors[indptr[index]:indptr[index + 1]]
+            edges = edges[indptr[index]:indptr[index + 1]]
+        else:
+            neighbors = neighbors[:0]
+            edges = edges[:0]
+        if index in self.pending_adjacency:
+            pending = numpy.array(self.pending_adjacency[index])
+            u = self.edge_u.data[pending]
+            neighbors = numpy.concatenate([neighbors, numpy.where(u == index, self.edge_v.data[pending], u)])
+            edges = numpy.concatenate([edges, pending])
+        alive = self.edge_alive.data[edges]
+        return (neighbors[alive], edges[alive])
+
+    # networkx graph API
+
+    def __contains__(self, n):
+        try:
+            return n in self.node_ids
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self.node_ids)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __getitem__(self, n):
+        return self.adj[n]
+
+    def is_directed(self):
+        return False
+
+    def is_multigraph(self):
+        return False
+
+    def has_node(self, n):
+        return n in self
+
+    def has_edge(self, u, v):
+        if u not in self.node_ids or v not in self.node_ids:
+            return False
+        return self.edge_key(self.node_ids[u], self.node_ids[v]) in self.edge_ids
+
+    def neighbors(self, n):
+        if n not in self.node_ids:
+            raise networkx.NetworkXError("The node %s is not in the graph." % (n,))
+        return iter(self.adj[n])
+
+    def get_edge_data(self, u, v, default = None):
+        if not self.has_edge(u, v):
+            return default
+        return self.edges[u, v]
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        return len(self.edge_ids)
+
+    @property
+    def nodes(self):
+        return NodeView(self)
+
+    @property
+    def edges(self):
+        return EdgeView(self)
+
+    @property
+    def adj(self):
+        return AdjacencyView(self)
+
+    @property
+    def _adj(self):
+        return AdjacencyView(self)
+
+    def degree(self, nbunch = None):
+        if nbunch in self:
+            (neighbors, _) = self.get_neighbors(self.node_ids[nbunch])
+            return len(neighbors) + int(numpy.count_nonzero(neighbors == self.node_ids[nbunch]))
+        edges = self.edge_alive.values()
+        counts = numpy.bincount(self.edge_u.values()[edges], minlength = len(self.node_names)) + \
+                 numpy.bincount(self.edge_v.values()[edges], minlength = len(self.node_names))
+        nodes = self.node_ids if nbunch is None else [n for n in nbunch if n in self.node_ids]
+        return [(n, int(counts[self.node_ids[n]])) for n in nodes]
+
+    def subgraph(self, nodes):
+        return self.to_networkx(nodes)
+
+    def add_node(self, node_for_adding, **attr):
+        index = self.get_node_id(node_for_adding)
+        for key, value in attr.items():
+            self.set_node_value(index, key, value)
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        for n in nodes_for_adding:
+            # as in networkx, items are either nodes or (node, attribute dict) tuples
+            try:
+                index = self.get_node_id(n)
+                node_attr = attr
+            except TypeError:
+                index = self.get_node_id(n[0])
+                node_attr = {**attr, **n[1]}
+            for key, value in node_attr.items():
+                self.set_node_value(index, key, value)
+
+    def remove_node(self, n):
+        if n not in self.node_ids:
+            raise networkx.NetworkXError("The node %s is not in the graph." % (n,))
+        self.remove_nodes_from([n])
+
+    def remove_nodes_from(self, nodes):
+        for n in nodes:
+            if n in self.node_ids:
+                index = self.node_ids.pop(n)
+                (_, edges) = self.get_neighbors(index)
+                for e in edges.tolist():
+                    self.remove_edge_id(e)
+                self.clear_node_id(index)
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        i = self.get_node_id(u_of_edge)
+        j = self.get_node_id(v_of_edge)
+        key = self.edge_key(i, j)
+        if key not in self.edge_ids:
+            self.edge_ids[key] = self.edge_u.size
+            self.edge_u.append(i)
+            self.edge_v.append(j)
+            self.edge_alive.append(True)
+            self.edge_entities[0].append(-1)
+            self.edge_entities[1].append(-1)
+            if self.adjacency is not None:
+                self.pending_adjacency.setdefault(i, list()).append(self.edge_ids[key])
+                if i != j:
+                    self.pending_adjacency.setdefault(j, list()).append(self.edge_ids[key])
+                self.pending_count += 1
+                if self.pending_count > max(1024, self.edge_u.size // 4):
+                    self.adjacency = None
+        index = self.edge_ids[key]
+        for k, value in attr.items():
+            self.set_edge_value(index, k, value)
+        self.dirty_edges[index] = None
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        for e in ebunch_to_add:
+            if len(e) == 3:
+                self.add_edge(e[0], e[1], **{**attr, **e[2]})
+            else:
+                self.add_edge(e[0], e[1], **attr)
+
+    def remove_edge_id(self, index):
+        del self.edge_ids[self.edge_key(int(self.edge_u.data[index]), int(self.edge_v.data[index]))]
+        self.edge_alive.data[index] = False
+        self.edge_entities[0].data[index] = -1
+        self.edge_entities[1].data[index] = -1
+        for column in self.edge_columns.values():
+            if index < len(column):
+                column[index] = MISSING
+        self.dirty_edges.pop(index, None)
+
+    def remove_edge(self, u, v):
+        if not self.has_edge(u, v):
+            raise networkx.NetworkXError("The edge %s-%s is not in the graph" % (u, v))
+        self.remove_edge_id(self.edge_ids[self.edge_key(self.node_ids[u], self.node_ids[v])])
+
+    def remove_edges_from(self, ebunch):
+        for e in ebunch:
+            if self.has_edge(e[0], e[1]):
+                self.remove_edge(e[0], e[1])
+
+    def clear(self):
+        self.__init__()
+
+    def clear_edges(self):
+        for index in list(self.edge_ids.values()):
+            self.remove_edge_id(index)
+
+    # Blackboard API
+
+    def add_node_from_attributes(self, attributes, entity):
+        self.add_node(attributes['name'], **{'entity':entity, **attributes})
+        return attributes['name']
+
+    def add_placeholder(self, entity):
+        self.placeholders.append('unknown_' + entity.lower() + '_' + str(len(self.placeholders)))
+        self.add_node(self.placeholders[-1], entity=entity, unbound=True)
+        return self.placeholders[-1]
+
+    def add_knowledge(self, query, query_result, action):
+        """Add knowledge to the blackboard, see ``Blackboard.add_knowledge``."""
+        Blackboard.add_knowledge(self, query, query_result, action, bulk=True)
+
+    def align_edge_entities(self, node):
+        self.align_edge_entities_from([node])
+
+    def align_edge_entities_from(self, nodes):
+        # the last node in ``nodes`` that an edge touches sets its orientation
+        ids = numpy.array([self.node_ids[n] for n in nodes], dtype = numpy.int64)
+        if len(ids) == 0:
+            return
+        edges = numpy.unique(numpy.concatenate([self.get_neighbors(i)[1] for i in ids.tolist()]))
+        order = numpy.argsort(ids, kind = 'stable')
+        sorted_ids = ids[order]
+        ranks = list()
+        for endpoint in (self.edge_u.data[edges], self.edge_v.data[edges]):
+            position = numpy.minimum(numpy.searchsorted(sorted_ids, endpoint), len(ids) - 1)
+            ranks.append(numpy.where(sorted_ids[position] == endpoint, order[position], -1))
+        u = self.edge_u.data[edges]
+        v = self.edge_v.data[edges]
+        u_first = ranks[0] >= ranks[1]
+        codes = self.node_entity.data
+        self.edge_entities[0].data[edges] = numpy.where(u_first, codes[u], codes[v])
+        self.edge_entities[1].data[edges] = numpy.where(u_first, codes[v], codes[u])
+        for e in edges[u == v].tolist():
+            self.remove_edge_id(e)
+
+    def set_edge_attributes(self, values):
+        """Update the attributes of existing edges and mark them as changed, see ``Blackboard.set_edge_attributes``."""
+        for (u, v), d in values.items():
+            if self.has_edge(u, v):
+                index = self.edge_ids[self.edge_key(self.node_ids[u], self.node_ids[v])]
+                for key, value in d.items():
+                    self.set_edge_value(index, key, value)
+                self.dirty_edges[index] = None
+
+    def pop_dirty_edges(self):
+        edges = [self.edge_tuple(e) for e in self.dirty_edges]
+        self.dirty_edges = dict()
+        return edges
+
+    def entity_index(self):
+        return self
+
+    @property
+    def node_entities(self):
+        return NodeEntityView(self)
+
+    def get_bound_mask(self):
+        bound = numpy.zeros(len(self.node_names), dtype = numpy.bool_)
+        bound[list(self.node_ids.values())] = True
+        bound[list(self.unbound_nodes)] = False
+        return bound
+
+    def get_entity_nodes(self, entities, include_unbound = False):
+        """Get all nodes that are instances of specific entities, see ``Blackboard.get_entity_nodes``."""
+        mask = self.get_bound_mask()
+        if include_unbound == True:
+            mask[list(self.unbound_nodes)] = True
+        codes = self.node_entity.values()
+        node_dict = dict()
+        for entity in entities:
+            if entity in self.entity_codes:
+                ids = numpy.flatnonzero(mask & (codes == self.entity_codes[entity]))
+                node_dict[entity] = [self.node_names[i] for i in ids.tolist()]
+            else:
+                node_dict[entity] = list()
+        return node_dict
+
+    def get_entity_edges(self, entity_pairs, include_unbound = False):
+        """Get all edges that connect instances of specific entities, see ``Blackboard.get_entity_edges``."""
+        u = self.edge_u.values()
+        v = self.edge_v.values()
+        alive = self.edge_alive.values()
+        if include_unbound == False:
+            bound = self.get_bound_mask()
+            alive = alive & bound[u] & bound[v]
+        codes = self.node_entity.values()
+        eu = codes[u]
+        ev = codes[v]
+
+        edge_dict = dict()
+        for entity_pair in entity_pairs:
+            edge_dict[entity_pair] = list()
+            if entity_pair[0] not in self.entity_codes or entity_pair[1] not in self.entity_codes:
+                continue
+            a = self.entity_codes[entity_pair[0]]
+            b = self.entity_codes[entity_pair[1]]
+            forward = alive & (eu == a) & (ev == b)
+            if tuple(reversed(entity_pair)) in entity_pairs:
+                backward = numpy.zeros_like(forward)
+            else:
+                backward = alive & (eu == b) & (ev == a) & ~forward
+            for e in numpy.flatnonzero(forward | backward).tolist():
+                (n0, n1) = self.edge_tuple(e)
+                edge_dict[entity_pair].append((n0, n1) if forward[e] else (n1, n0))
+        return edge_dict
+
+    def get_path_nodes(self, sources, targets, max_length = None):
+        return Blackboard.get_path_nodes(self, sources, targets, max_length)
+
+    def get_path_subgraph(self, sources, targets, max_length = None):
+        """Return all paths connecting two sets of nodes, see ``Blackboard.get_path_subgraph``."""
+        return self.subgraph(self.get_path_nodes(sources, targets, max_length))
+
+    def get_distances(self, source, neighbors, cutoff = None):
+        return Blackboard.get_distances(self, source, neighbors, cutoff)
+
+    def get_top_paths(self, source, target, k = 5, weight = 'cost', max_length = None, entity_pairs = None):
+        """Return the ``k`` best loopless paths between two nodes, see ``Blackboard.get_top_paths``."""
+        return Blackboard.get_top_paths(self, source, target, k, weight, max_length, entity_pairs)
+
+    def prune(self, remove_singletons=True, trim_leaves=False, remove_placeholders=False, sources=None, targets=None, max_length=None, protected=None):
+        """Remove specific parts of the graph, see ``Blackboard.prune``."""
+        return Blackboard.prune(self, remove_singletons, trim_leaves, remove_placeholders, sources, targets, max_length, protected)
+
+    def write_safe(self):
+        """Return a networkx copy of the blackboard that is safe to write to GraphML, see ``Blackboard.write_safe``."""
+        return self.to_networkx().write_safe()
+
+
+class NodeAttributes(MutableMapping):
+    """The attribute dictionary of one node of a ``CompactBlackboard``."""
+    def __init__(self, blackboard, index):
+        self.blackboard = blackboard
+        self.index = index
+
+    def __getitem__(self, key):
+        if key == 'entity':
+            code = self.blackboard.node_entity.data[self.index]
+            if code < 0:
+                raise KeyError(key)
+            return self.blackboard.entity_names[code]
+        value = get_value(self.blackboard.node_columns, key, self.index)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.blackboard.set_node_value(self.index, key, value)
+
+    def __delitem__(self, key):
+        self[key]
+        if key == 'entity':
+            self.blackboard.node_entity.data[self.index] = -1
+        else:
+            set_value(self.blackboard.node_columns, key, self.index, MISSING)
+            if key == 'unbound':
+                self.blackboard.unbound_nodes.discard(self.index)
+
+    def __iter__(self):
+        if self.blackboard.node_entity.data[self.index] >= 0:
+            yield 'entity'
+        for key, column in self.blackboard.node_columns.items():
+            if self.index < len(column) and column[self.index] is not MISSING:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class EdgeAttributes(MutableMapping):
+    """The attribute dictionary of one edge of a ``CompactBlackboard``."""
+    def __init__(self, blackboard, index):
+        self.blackboard = blackboard
+        self.index = index
+
+    def __getitem__(self, key):
+        if key == 'entities':
+            (a, b) = (self.blackboard.edge_entities[0].data[self.index], self.blackboard.edge_entities[1].data[self.index])
+            if a < 0:
+                raise KeyError(key)
+            return (self.blackboard.entity_names[a], self.blackboard.entity_names[b])
+        value = get_value(self.blackboard.edge_columns, key, self.index)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.blackboard.set_edge_value(self.index, key, value)
+
+    def __delitem__(self, key):
+        self[key]
+        if key == 'entities':
+            self.blackboard.edge_entities[0].data[self.index] = -1
+            self.blackboard.edge_entities[1].data[self.index] = -1
+        else:
+            set_value(self.blackboard.edge_columns, key, self.index, MISSING)
+
+    def __iter__(self):
+        if self.blackboard.edge_entities[0].data[self.index] >= 0:
+            yield 'entities'
+        for key, column in self.blackboard.edge_columns.items():
+            if self.index < len(column) and column[self.index] is not MISSING:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class NodeView(Mapping):
+    """Nodes of a ``CompactBlackboard``, like ``networkx.Graph.nodes``."""
+    def __init__(self, blackboard):
+        self.blackboard = blackboard
+
+    def __getitem__(self, n):
+        return NodeAttributes(self.blackboard, self.blackboard.node_ids[n])
+
+    def __iter__(self):
+        return iter(self.blackboard.node_ids)
+
+    def __len__(self):
+        return len(self.blackboard.node_ids)
+
+    def __contains__(self, n):
+        return n in self.blackboard
+
+    def __call__(self, data = False, default = None):
+        if data == False:
+            return iter(self.blackboard.node_ids)
+        if data == True:
+            return ((n, NodeAttributes(self.blackboard, i)) for n, i in self.blackboard.node_ids.items())
+        return ((n, NodeAttributes(self.blackboard, i).get(data, default)) for n, i in self.blackboard.node_ids.items())
+
+
+class EdgeView():
+    """Edges of a ``CompactBlackboard``, like ``networkx.Graph.edges``."""
+    def __init__(self, blackboard):
+        self.blackboard = blackboard
+
+    def __getitem__(self, e):
+        (u, v) = e
+        blackboard = self.blackboard
+        if not blackboard.has_edge(u, v):
+            raise KeyError("The edge %s-%s is not in the graph." % (u, v))
+        return EdgeAttributes(blackboard, blackboard.edge_ids[blackboard.edge_key(blackboard.node_ids[u], blackboard.node_ids[v])])
+
+    def __iter__(self):
+        return self()
+
+    def __len__(self):
+        return self.blackboard.number_of_edges()
+
+    def __contains__(self, e):
+        return self.blackboard.has_edge(e[0], e[1])
+
+    def __call__(self, nbunch = None, data = False, default = None):
+        blackboard = self.blackboard
+        if nbunch is None:
+            edges = numpy.flatnonzero(blackboard.edge_alive.values()).tolist()
+        else:
+            nodes = [nbunch] if nbunch in blackboard else [n for n in nbunch if n in blackboard]
+            edges = dict()
+            for n in nodes:
+                for e in blackboard.get_neighbors(blackboard.node_ids[n])[1].tolist():
+                    edges.setdefault(e, n)
+        for e in edges:
+            (u, v) = blackboard.edge_tuple(e)
+            if nbunch is not None and edges[e] != u:
+                (u, v) = (v, u)
+            if data == False:
+                yield (u, v)
+            elif data == True:
+                yield (u, v, EdgeAttributes(blackboard, e))
+            else:
+                yield (u, v, EdgeAttributes(blackboard, e).get(data, default))
+
+
+class AdjacencyView(Mapping):
+    """Adjacency of a ``CompactBlackboard``, like ``networkx.Graph.adj``."""
+    def __init__(self, blackboard):
+        self.blackboard = blackboard
+
+    def __getitem__(self, n):
+        return NeighborView(self.blackboard, self.blackboard.node_ids[n])
+
+    def __iter__(self):
+        return iter(self.blackboard.node_ids)
+
+    def __len__(self):
+        return len(self.blackboard.node_ids)
+
+    def __contains__(self, n):
+        return n in self.blackboard
+
+
+class NeighborView(Mapping):
+    """Neighbors of one node of a ``CompactBlackboard``, mapped to edge attributes."""
+    def __init__(self, blackboard, index):
+        self.blackboard = blackboard
+        self.index = index
+
+    def __getitem__(self, n):
+        blackboard = self.blackboard
+        key = blackboard.edge_key(self.index, blackboard.node_ids[n])
+        return EdgeAttributes(blackboard, blackboard.edge_ids[key])
+
+    def __iter__(self):
+        names = self.blackboard.node_names
+        return (names[j] for j in self.blackboard.get_neighbors(self.index)[0].tolist())
+
+    def __len__(self):
+        return len(self.blackboard.get_neighbors(self.index)[0])
+
+    def __contains__(self, n):
+        blackboard = self.blackboard
+        return n in blackboard and blackboard.edge_key(self.index, blackboard.node_ids[n]) in blackboard.edge_ids
+
+    def items(self):
+        (neighbors, edges) = self.blackboard.get_neighbors(self.index)
+        names = self.blackboard.node_names
+        return [(names[j], EdgeAttributes(self.blackboard, e)) for j, e in zip(neighbors.tolist(), edges.tolist())]
+
+
+class NodeEntityView(Mapping):
+    """Entity names of the nodes of a ``CompactBlackboard``, indexed by node name."""
+    def __init__(self, blackboard):
+        self.blackboard = blackboard
+
+    def __getitem__(self, n):
+        code = self.blackboard.node_entity.data[self.blackboard.node_ids[n]]
+        return self.blackboard.entity_names[code] if code >= 0 else None
+
+    def __iter__(self):
+        return iter(self.blackboard.node_ids)
+
+    def __len__(self):
+        return len(self.blackboard.node_ids)
@@ -1,8 +1,22 @@
 from .knowledge_graph.KnowledgeGraph import KnowledgeGraph
+from .knowledge_graph.QueryMetrics import query_name
+from .knowledge_graph.QueryTemplates import PathTemplate, page_clause, path_projection
 
 class KGAgent:
-    def __init__(self):
-        self.kg = KnowledgeGraph()
+    # path queries from a start node with a given key, run by run_template
+    # and, for a list of keys, by batch_query
+    templates = {
+        'drug2target': PathTemplate('Drug', 'chembl_id', [(None, '', 'Target')]),
+        'pathwayToGenes': PathTemplate('Pathway', 'go_id', [('PART_OF', '<', 'Target')]),
+        'geneToCompound': PathTemplate('Gene', 'hgnc_id', [('PRODUCT_OF', '<', 'Protein'), ('TARGETS', '<', 'Drug')]),
+        'compoundToIndication': PathTemplate('Drug', 'chembl_id', [('HAS_INDICATION', '>', 'Disease')]),
+        'compoundToPharmClass': PathTemplate('Drug', 'chembl_id', [('HAS_ROLE', '>', 'ChebiTerm')]),
+        'diseaseToSymptom': PathTemplate('Disease', 'cui', [('ASSOCIATED_WITH', '<', 'Symptom')]),
+        'symptomToDisease': PathTemplate('Symptom', 'cui', [('ASSOCIATED_WITH', '>', 'Disease')])
+    }
+
+    def __init__(self, timeout=None):
+        self.kg = KnowledgeGraph(timeout=timeout)
         self.result = None
 
     def get_result(self):
@@ -14,6 +28,49 @@ class KGAgent:
         else:
             return(None)
 
+    def get_columns(self):
+        """Return the result as GraphColumns, without building a graph."""
+        if self.result.peek() is not None:
+            return(self.kg.get_columns(self.result))
+        else:
+            return(None)
+
+    def get_graphs(self, columns=False):
+        """Return the graph, or GraphColumns if columns is True, of each input
+        id of the last batch_query, by id."""
+        return(self.kg.get_graphs(self.result, columns=columns))
+
+    def run_template(self, name, id, skip=0, limit=None):
+        """Run the query of a template for one key and return its result.
+        If limit is given, only the paths from skip to skip + limit are
+        returned. Its queries are recorded under the name of the template
+        in the query metrics."""
+        with query_name(name):
+            if limit is None:
+                return(self.kg.query(self.templates[name].query(), id=id))
+            return(self.kg.query(self.templates[name].query(paged=True), id=id, skip=skip, limit=limit))
+
+    def batch_query(self, name, ids, batch_size=1000, skip=0, limit=None):
+        """Run the query of a template for a list of ids.
+
+        The ids are sent in batches of batch_size, with one Cypher query per
+        batch. Each result record holds an input id and the nodes and edges
+        of its paths, from skip to skip + limit if limit is given; use
+        get_graphs to get one graph per id.
+        """
+        parameters = dict(skip=skip, limit=limit) if limit is not None else dict()
+        cypher = self.templates[name].batch_query(paged=limit is not None)
+        ids = list(dict.fromkeys(ids))
+        self.result = []
+        for start in range(0, len(ids), batch_size):
+            with query_name(name + '[batch]'):
+                self.result.extend(self.kg.query(cypher, ids=ids[start:start + batch_size], **parameters))
+
+    def match_query(self, cypher, **parameters):
+        """Run a compiled query graph; each result record holds the nodes
+        and edges of one match."""
+        self.result = list(self.kg.query(cypher, **parameters))
+
     def cop_query(self, drug_cui, disease_cui):
         print('\n', drug_cui, disease_cui)
         drug = self.get_drug(drug_cui)
@@ -41,8 +98,8 @@ class KGAgent:
         # print(len(list(result.records())))
 
 
-    def mvp_target_query(self, drug_chembl_id):
-        self.result = self.drug2target(drug_chembl_id)
+    def mvp_target_query(self, drug_chembl_id, skip=0, limit=None):
+        self.result = self.drug2target(drug_chembl_id, skip, limit)
 
 
 
@@ -56,11 +113,8 @@ class KGAgent:
 
     def cop_drug_category(self, drug_cui, disease_cui):
         result = self.kg.query("""
-                 MATCH path = (dr:Drug {cui:{drug_cui}})-[:HAS_ROLE]->(cat:ChebiTerm)-[:TREATS]->(di:Disease {cui:{disease_cui}})
-                 UNWIND nodes(path) as n
-                 UNWIND relationships(path) as r
-                 RETURN collect(distinct n) as nodes, collect(distinct r) as edges
-                 """,
+                 MATCH (dr:Drug {cui:$drug_cui})-[r1:HAS_ROLE]->(cat:ChebiTerm)-[r2:TREATS]->(di:Disease {cui:$disease_cui})
+                 RETURN """ + path_projection(['dr', 'cat', 'di'], ['r1', 'r2']),
                  drug_cui=drug_cui, disease_cui=disease_cui)
         return(result)
 
@@ -97,79 +151,51 @@ class KGAgent:
                  drug_cui=drug_cui, disease_cui=disease_cui)
         return(result)
 
-    def drug2target(self, drug_chembl_id):
-        result = self.kg.query("""
-                 MATCH path = (dr:Drug {chembl_id:{drug_chembl_id}})--(ta:Target)
-                 UNWIND nodes(path) as n
-                 UNWIND relationships(path) as r
-                 RETURN collect(distinct n) as nodes, collect(distinct r) as edges
-                 """,
-                 drug_chembl_id=drug_chembl_id)
-        return(result)
+    def drug2target(self, drug_chembl_id, skip=0, limit=None):
+        return(self.run_template('drug2target', drug_chembl_id, skip, limit))
 
-    def pathwayToGenes(self, pathway_go_id):
-        self.result = self.kg.query("""
-         MATCH path = (pa:Pathway {go_id:{pathway_go_id}})<-[:PART_OF]-(ta:Target)
-         UNWIND nodes(path) as n
-         UNWIND relationships(path) as r
-         RETURN collect(distinct n) as nodes, collect(distinct r) as edges
-         """,
-         pathway_go_id=pathway_go_id)
-
-    def geneToCompound(self, gene_hgnc_id):
-        self.result = self.kg.query("""
-         MATCH path = (ge:Gene {hgnc_id:{gene_hgnc_id}})<-[:PRODUCT_OF]-(pr:Protein)<-[:TARGETS]-(dr:Drug)
-         UNWIND nodes(path) as n
-         UNWIND relationships(path) as r
-         RETURN collect(distinct n) as nodes, collect(distinct r) as edges
-         """,
-         gene_hgnc_id=gene_hgnc_id)
-
-    def compoundToIndication(self, drug_chembl_id):
-        self.result = self.kg.query("""
-         MATCH path = (dr:Drug {chembl_id:{drug_chembl_id}})-[:HAS_INDICATION]->(di:Disease)
-         UNWIND nodes(path) as n
-         UNWIND relationships(path) as r
-         RETURN collect(distinct n) as nodes, collect(distinct r) as edges
-         """,
-         drug_chembl_id=drug_chembl_id)
-
-    def compoundToPharmClass(self, drug_chembl_id):
-        self.result = self.kg.query("""
-         MATCH path = (dr:Drug {chembl_id:{drug_chembl_id}})-[:HAS_ROLE]->(ct:ChebiTerm)
-         UNWIND nodes(path) as n
-         UNWIND relationships(path) as r
-         RETURN collect(distinct n) as nodes, collect(distinct r) as edges
-         """,
-         drug_chembl_id=drug_chembl_id)
-
-    def diseaseToSymptom(self, disease_umls_id):
-        cypher = """
-            MATCH path = (di:Disease {cui:{umls_id}})<-[:ASSOCIATED_WITH]-(sy:Symptom)
-            UNWIND nodes(path) as n
-            UNWIND relationships(path) as r
-            RETURN collect(distinct n) as nodes, collect(distinct r) as edges"""
-        self.result = self.kg.query(cypher, umls_id=disease_umls_id)
+    def pathwayToGenes(self, pathway_go_id, skip=0, limit=None):
+        self.result = self.run_template('pathwayToGenes', pathway_go_id, skip, limit)
 
-    def symptomToDisease(self, symptom_umls_id):
-        cypher = """
-            MATCH path = (sy:Symptom {cui:{umls_id}})-[:ASSOCIATED_WITH]->(di:Disease)
-            UNWIND nodes(path) as n
-            UNWIND relationships(path) as r
-            RETURN collect(distinct n) as nodes, collect(distinct r) as edges"""
-        self.result = self.kg.query(cypher, umls_id=symptom_umls_id)
+    def geneToCompound(self, gene_hgnc_id, skip=0, limit=None):
+        self.result = self.run_template('geneToCompound', gene_hgnc_id, skip, limit)
+
+    def compoundToIndication(self, drug_chembl_id, skip=0, limit=None):
+        self.result = self.run_template('compoundToIndication', drug_chembl_id, skip, limit)
 
-    def conditionSymptomSimilarity(self, disease_umls_id):
+    def compoundToPharmClass(self, drug_chembl_id, skip=0, limit=None):
+        self.result = self.run_template('compoundToPharmClass', drug_chembl_id, skip, limit)
+
+    def diseaseToSymptom(self, disease_umls_id, skip=0, limit=None):
+        self.result = self.run_template('diseaseToSymptom', disease_umls_id, skip, limit)
+
+    def symptomToDisease(self, symptom_umls_id, skip=0, limit=None):
+        self.result = self.run_template('symptomToDisease', symptom_umls_id, skip, limit)
+
+    def similarConditions(self, disease_umls_id, skip=0, limit=None):
+        """The diseases most similar to a disease by their symptoms, from the
+        SIMILAR_TO relationships of load_neo4j/load_disease_similarity.py, in
+        order of their rank."""
+        cypher = """
+            MATCH (di:Disease {cui:$umls_id})-[r:SIMILAR_TO]->(si:Disease)
+            """
+        if limit is not None:
+            cypher += 'WITH di, r, si ORDER BY r.rank SKIP $skip LIMIT $limit\n'
+        cypher += 'RETURN ' + path_projection(['di', 'si'], ['r'])
+        self.result = self.kg.query(cypher, umls_id=disease_umls_id, skip=skip, limit=limit)
+
+    def conditionSymptomSimilarity(self, disease_umls_id, skip=0, limit=None):
         cypher = """
-            MATCH (di:Disease {cui:{umls_id}})<-[r:ASSOCIATED_WITH]-(sy:Symptom)
+            MATCH (di:Disease {cui:$umls_id})<-[r:ASSOCIATED_WITH]-(sy:Symptom)
             WHERE r.count > 50
             WITH collect(di) as query_disease, collect(r) as query_relations, collect(sy) as symptoms
             CALL apoc.when(size(symptoms) < 1, 'RETURN null as result', 'MATCH (s)--(dii:Disease) WHERE ALL(s in symptoms WHERE (s)-[:ASSOCIATED_WITH]->(dii)) RETURN collect(dii) as result_disease, symptoms as symptoms, query_relations as query_relations', {symptoms:symptoms, query_relations:query_relations}) YIELD value
             WITH value.result_disease as diseases, value.symptoms as symptoms
-            MATCH path = (s)-[:ASSOCIATED_WITH]->(d)
+            MATCH (s)-[r:ASSOCIATED_WITH]->(d)
             WHERE d in diseases
             AND s in symptoms
-            UNWIND nodes(path) as n
-            UNWIND relationships(path) as r
-            RETURN collect(distinct n) as nodes, collect(distinct r) as edges"""
-        self.result = self.kg.query(cypher, umls_id=disease_umls_id)
\ No newline at end of file
+            """
+        if limit is not None:
+            cypher += page_clause(['s', 'r', 'd'], ['r']) + '\n'
+        cypher += 'RETURN ' + path_projection(['s', 'd'], ['r'])
+        self.result = self.kg.query(cypher, umls_id=disease_umls_id, skip=skip, limit=limit)
\ No newline at end of file
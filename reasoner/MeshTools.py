@@ -4,6 +4,8 @@ import json
 import xmltodict
 import xml.etree.ElementTree as etree
 import sqlite3
+import math
+import re
 import pandas as pd
 
 class Eutilities():
@@ -50,14 +52,31 @@ class Eutilities():
         return res
 
 
+# (entity, tree number prefixes, excluded prefixes, tree numbers of unbound root terms),
+# in order of precedence
+ENTITY_RULES = [
+    ('Drug', ('D02',), (), ('D02',)),
+    ('Target', ('D12.776', 'D08.811'), (), ('D12.776', 'D08.811')),
+    ('Pathway', ('G03.493', 'G04.835'), (), ('G03.493', 'G04.835')),
+    ('Cell', ('A11',), ('A11.284',), ('A11', 'A11.251', 'A11.251.210')),
+    ('Symptom', ('C23',), (), ('C23', 'C23.550.288.500')),
+    ('GeneticCondition', ('C16.320',), (), ('C16.320',)),
+    ('Disease', ('C',), ('C23',), ('C',))
+]
+
+
 class MeshTools(Eutilities):
     
     def __init__(self):
         super().__init__()
         self.sparql = SPARQLWrapper("http://id.nlm.nih.gov/mesh/sparql")
         self.source_file = '../reasoner/data/MeSH_hierarchy.txt'
+        self.descriptor_file = '../reasoner/data/desc.xml'
+        self.supplementary_file = '../reasoner/data/supp.xml'
         self.db = './data/reasoner_data.sqlite'
         self.db_conn = sqlite3.connect(self.db)
+        self.has_term_index = self.db_conn.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'mesh_entry_term'").fetchone()[0] > 0
         
     def sparql_synonym_query(self, query):
         query = """
@@ -118,26 +137,55 @@ class MeshTools(Eutilities):
             return (None, False)
         return result
     
-    def get_terms(self, query):
-        search_results = self.esearch(query + '[MeSH Term]', 'mesh')
-        if len(search_results['esearchresult']['idlist']) == 0:
-            search_results = self.esearch(query, 'mesh')
+    def id2entities(self, mesh_ids):
+        """Look up the entities of several MeSH descriptors with a single query.
         
-        if len(search_results['esearchresult']['idlist']) == 0:
-            return []
+        Parameters
+        ----------
+        mesh_ids : list
+            A list of MeSH unique identifiers.
         
-        uid = ','.join(search_results['esearchresult']['idlist'])
-        summary = self.esummary(uid, 'mesh')
+        Returns
+        -------
+        dict
+            A dictionary of (entity, bound) tuples, indexed by MeSH identifier.
+            Identifiers that are not in the database map to (None, False).
         
-        terms = list()
+        """
+        mesh_ids = list(set(mesh_ids))
+        entities = {mesh_id:(None, False) for mesh_id in mesh_ids}
+        if len(mesh_ids) == 0:
+            return entities
+        c = self.db_conn.cursor()
+        query = 'SELECT mesh_ui, entity, bound FROM mesh WHERE mesh_ui IN (%s)' % ','.join('?' * len(mesh_ids))
+        for (mesh_id, entity, bound) in c.execute(query, mesh_ids).fetchall():
+            entities[mesh_id] = (entity, bound)
+        return entities
+    
+    def search_uids(self, query, retmax=20):
+        search_results = self.esearch(query + '[MeSH Term]', 'mesh', retmax)
+        if len(search_results['esearchresult']['idlist']) == 0:
+            search_results = self.esearch(query, 'mesh', retmax)
+        return search_results['esearchresult']['idlist']
+    
+    def summarize_uids(self, uids):
+        summary = self.esummary(','.join(uids), 'mesh')
+        
+        terms = dict()
         for uid in summary['result']['uids']:
             entry = summary['result'][uid]
             treenums = [x['treenum'] for x in entry['ds_idxlinks']]
             term = entry['ds_meshterms'][0]
             mesh_id = entry['ds_meshui']
-            terms.append({'term':term, 'treenums':treenums, 'mesh_id':mesh_id})
+            terms[uid] = {'term':term, 'treenums':treenums, 'mesh_id':mesh_id}
         return(terms)
     
+    def get_terms(self, query):
+        uids = self.search_uids(query)
+        if len(uids) == 0:
+            return []
+        return(list(self.summarize_uids(uids).values()))
+    
     def get_best_term(self, query):
         terms = self.get_terms(query)
         return(next(iter(terms), []))
@@ -151,69 +199,266 @@ class MeshTools(Eutilities):
         return(terms)                   
     
     def get_best_term_entity(self, query):
+        term = self.lookup_term(query)
+        if term is not None:
+            return(term)
         term = self.get_best_term(query)
         if len(term) ==0:
             return {'entity':None, 'bound':False}
         (term['entity'], term['bound']) = self.id2entity(term['mesh_id'])
         return(term)
     
-    def treenums2entity(self, treenums):
-            bound = True
-
-            if any([treenum.startswith('D02') for treenum in treenums]):
-                if any([treenum in ['D02'] for treenum in treenums]):
-                    bound = False
-                return ('Drug', bound)
-
-            elif any([treenum.startswith('D12.776') for treenum in treenums]) or any([treenum.startswith('D08.811') for treenum in treenums]):
-                if any([treenum in ['D12.776', 'D08.811'] for treenum in treenums]):
-                    bound = False
-                return ('Target', bound)
-
-            elif any([treenum.startswith('G03.493') for treenum in treenums]) or any([treenum.startswith('G04.835') for treenum in treenums]):
-                if any([treenum in ['G03.493', 'G04.835'] for treenum in treenums]):
-                    bound = False
-                return ('Pathway', bound)
-
-            elif any([treenum.startswith('A11') for treenum in treenums]) and not any([treenum.startswith('A11.284') for treenum in treenums]):
-                if any([treenum in ['A11', 'A11.251', 'A11.251.210'] for treenum in treenums]):
-                    bound = False
-                return ('Cell', bound)
-
-            elif any([treenum.startswith('C23') for treenum in treenums]):
-                if any([treenum in ['C23', 'C23.550.288.500'] for treenum in treenums]):
-                    bound = False
-                return ('Symptom', bound)
-
-            elif any([treenum.startswith('C16.320') for treenum in treenums]):
-                if any([treenum in ['C16.320'] for treenum in treenums]):
-                    bound = False
-                return ('GeneticCondition', bound)
-
-            elif any([treenum.startswith('C') for treenum in treenums]) and not any([treenum.startswith('C23') for treenum in treenums]):
-                if any([treenum in ['C'] for treenum in treenums]):
-                    bound = False
-                return ('Disease', bound)
-
+    def get_best_term_entities(self, queries):
+        """Find the best MeSH term and its entity for several queries at once.
+        
+        Queries are first resolved with the local term index (see
+        ``lookup_term``). Every remaining query needs its own search, but the summaries of all best
+        hits are fetched with one ``esummary`` call and their entities are
+        looked up with one database query.
+        
+        Parameters
+        ----------
+        queries : list
+            A list of query strings.
+        
+        Returns
+        -------
+        dict
+            A dictionary of term dictionaries (see ``get_best_term_entity``),
+            indexed by query string.
+        
+        """
+        results = dict()
+        for query in set(queries):
+            term = self.lookup_term(query)
+            if term is not None:
+                results[query] = term
+        
+        best_uids = {query:next(iter(self.search_uids(query, retmax=1)), None) for query in set(queries) if query not in results}
+        uids = sorted(set(uid for uid in best_uids.values() if uid is not None))
+        terms = self.summarize_uids(uids) if len(uids) > 0 else dict()
+        entities = self.id2entities([term['mesh_id'] for term in terms.values()])
+        
+        for query, uid in best_uids.items():
+            if uid is None or uid not in terms:
+                results[query] = {'entity':None, 'bound':False}
             else:
-                return (None, False)
-            
-            
+                term = dict(terms[uid])
+                (term['entity'], term['bound']) = entities[term['mesh_id']]
+                results[query] = term
+        return(results)
+    
+    def normalize_term(self, term):
+        return ' '.join(re.sub(r'[^0-9a-z]+', ' ', term.lower()).split())
+    
+    def term_variants(self, term):
+        # MeSH lists many entry terms in inverted form ("Carcinoma, Hepatocellular")
+        variants = {self.normalize_term(term)}
+        parts = term.split(', ')
+        if len(parts) == 2:
+            variants.add(self.normalize_term(parts[1] + ' ' + parts[0]))
+        variants.discard('')
+        return variants
+    
+    def trigrams(self, term_norm):
+        padded = ' ' + term_norm + ' '
+        return {padded[i:i+3] for i in range(len(padded) - 2)}
+    
+    def lookup_term(self, query, fuzzy=True, min_similarity=0.6):
+        """Find the best MeSH term for a query in the local term index.
+        
+        Parameters
+        ----------
+        query : str
+            A query string.
+        
+        fuzzy : bool, optional
+            If no entry term matches exactly, should the most similar entry term
+            (by trigram similarity) be used? [default: True]
+        
+        min_similarity : float, optional
+            The minimum trigram (Jaccard) similarity of a fuzzy match. [default: 0.6]
+        
+        Returns
+        -------
+        dict
+            A dictionary with entries 'term', 'treenums', 'mesh_id', 'entity' and 'bound',
+            or None if the index has not been built or no term matches.
+        
+        """
+        if not self.has_term_index:
+            return None
+        c = self.db_conn.cursor()
+        query_norm = self.normalize_term(query)
+        row = c.execute("""SELECT mesh_ui FROM mesh_entry_term
+                           WHERE term_norm = ?
+                           ORDER BY preferred DESC, mesh_ui LIKE 'D%' DESC
+                           LIMIT 1""", (query_norm,)).fetchone()
+        if row is None and fuzzy:
+            query_trigrams = self.trigrams(query_norm)
+            min_shared = math.ceil(min_similarity * len(query_trigrams))
+            rows = c.execute("""SELECT e.mesh_ui, e.preferred, e.trigram_count, count(*) AS shared
+                                FROM mesh_trigram t
+                                INNER JOIN mesh_entry_term e ON e.rowid = t.term_id
+                                WHERE t.trigram IN (%s)
+                                GROUP BY t.term_id
+                                HAVING shared >= ?""" % ','.join('?' * len(query_trigrams)),
+                             list(query_trigrams) + [min_shared]).fetchall()
+            scored = [(shared / (len(query_trigrams) + count - shared), preferred, mesh_ui)
+                      for (mesh_ui, preferred, count, shared) in rows]
+            scored = [x for x in scored if x[0] >= min_similarity]
+            if len(scored) > 0:
+                row = (max(scored)[2],)
+        if row is None:
+            return None
+        
+        (mesh_id, term, treenums, entity, bound) = c.execute(
+            'SELECT mesh_ui, term, treenums, entity, bound FROM mesh_index WHERE mesh_ui = ?', (row[0],)).fetchone()
+        treenums = treenums.split('|') if treenums else []
+        return {'term':term, 'treenums':treenums, 'mesh_id':mesh_id, 'entity':entity, 'bound':bound}
+    
+    def parse_records(self, xml_file, record_tag, ui_tag, name_tag):
+        for event, elem in etree.iterparse(xml_file):
+            if elem.tag != record_tag:
+                continue
+            record = {'mesh_ui':elem.findtext(ui_tag),
+                      'term':elem.findtext(name_tag + '/String'),
+                      'treenums':[x.text for x in elem.findall('TreeNumberList/TreeNumber')],
+                      'mapped_to':[x.text.lstrip('*') for x in elem.findall('HeadingMappedToList/HeadingMappedTo/DescriptorReferredTo/DescriptorUI')],
+                      'entry_terms':{x.text for x in elem.findall('ConceptList/Concept/TermList/Term/String')}}
+            elem.clear()
+            yield record
+    
+    def create_term_index(self, descriptor_file=None, supplementary_file=None):
+        """Build a local index of all MeSH entry terms.
+        
+        The index maps normalized entry terms and synonyms of descriptors and
+        supplementary concepts to their MeSH identifiers, tree numbers and entities,
+        so ``lookup_term`` can resolve query terms without E-utilities requests.
+        
+        Parameters
+        ----------
+        descriptor_file : str, optional
+            Path to the MeSH descriptor XML file (e.g. desc2018.xml).
+            [default: ``self.descriptor_file``]
+        
+        supplementary_file : str, optional
+            Path to the MeSH supplementary concept XML file (e.g. supp2018.xml).
+            Supplementary concepts inherit the tree numbers of the descriptors
+            they are mapped to. [default: ``self.supplementary_file``]
+        
+        """
+        if descriptor_file is None:
+            descriptor_file = self.descriptor_file
+        if supplementary_file is None:
+            supplementary_file = self.supplementary_file
+        
+        records = list(self.parse_records(descriptor_file, 'DescriptorRecord', 'DescriptorUI', 'DescriptorName'))
+        descriptor_treenums = {record['mesh_ui']:record['treenums'] for record in records}
+        if supplementary_file:
+            for record in self.parse_records(supplementary_file, 'SupplementalRecord', 'SupplementalRecordUI', 'SupplementalRecordName'):
+                record['treenums'] = [treenum for mesh_ui in record['mapped_to'] for treenum in descriptor_treenums.get(mesh_ui, [])]
+                records.append(record)
+        
+        index_rows = list()
+        term_rows = list()
+        for record in records:
+            (entity, bound) = self.treenums2entity(record['treenums'])
+            index_rows.append((record['mesh_ui'], record['term'], '|'.join(record['treenums']), entity, int(bound)))
+            preferred = self.term_variants(record['term'])
+            term_norms = set(preferred)
+            for entry_term in record['entry_terms']:
+                term_norms.update(self.term_variants(entry_term))
+            for term_norm in term_norms:
+                term_rows.append((term_norm, record['mesh_ui'], int(term_norm in preferred), len(self.trigrams(term_norm))))
+        
+        c = self.db_conn.cursor()
+        c.execute('DROP TABLE IF EXISTS mesh_index')
+        c.execute('DROP TABLE IF EXISTS mesh_entry_term')
+        c.execute('DROP TABLE IF EXISTS mesh_trigram')
+        c.execute("""CREATE TABLE mesh_index (
+                        mesh_ui VARCHAR(10) PRIMARY KEY,
+                        term VARCHAR(255),
+                        treenums TEXT,
+                        entity VARCHAR(20),
+                        bound INTEGER)
+                  """)
+        c.execute("""CREATE TABLE mesh_entry_term (
+                        term_norm VARCHAR(255),
+                        mesh_ui VARCHAR(10),
+                        preferred INTEGER,
+                        trigram_count INTEGER)
+                  """)
+        c.execute('CREATE TABLE mesh_trigram (trigram CHAR(3), term_id INTEGER)')
+        c.executemany('INSERT INTO mesh_index (mesh_ui, term, treenums, entity, bound) VALUES (?, ?, ?, ?, ?)', index_rows)
+        c.executemany('INSERT INTO mesh_entry_term (term_norm, mesh_ui, preferred, trigram_count) VALUES (?, ?, ?, ?)', term_rows)
+        c.executemany('INSERT INTO mesh_trigram (trigram, term_id) VALUES (?, ?)',
+                      ((trigram, term_id) for (term_id, term_norm) in c.execute('SELECT rowid, term_norm FROM mesh_entry_term').fetchall()
+                                          for trigram in self.trigrams(term_norm)))
+        c.execute('CREATE INDEX mesh_entry_term_norm ON mesh_entry_term (term_norm)')
+        c.execute('CREATE INDEX mesh_trigram_trigram ON mesh_trigram (trigram, term_id)')
+        self.db_conn.commit()
+        self.has_term_index = True
+    
+    def treenums2entity(self, treenums):
+        for (entity, prefixes, excluded_prefixes, root_treenums) in ENTITY_RULES:
+            if any(treenum.startswith(prefixes) for treenum in treenums) and not any(treenum.startswith(excluded_prefixes) for treenum in treenums):
+                bound = not any(treenum in root_treenums for treenum in treenums)
+                return (entity, bound)
+        return (None, False)
+    
+    def classify_treenums(self, ids, treenums):
+        """Classify MeSH terms into entities from a long table of tree numbers.
+        
+        This is a vectorized version of ``treenums2entity``: each rule in
+        ``ENTITY_RULES`` is evaluated once for all tree numbers and then
+        aggregated per term.
+        
+        Parameters
+        ----------
+        ids : pandas.Series
+            MeSH identifiers, one per tree number.
+        
+        treenums : pandas.Series
+            Tree numbers, aligned with ``ids``.
+        
+        Returns
+        -------
+        pandas.DataFrame
+            A data frame with columns 'entity' and 'bound', indexed by MeSH identifier.
+        
+        """
+        def any_per_id(matches):
+            return matches.groupby(ids).any()
+        
+        def starts_with(prefixes):
+            return treenums.str.match('|'.join(re.escape(prefix) for prefix in prefixes))
+        
+        unassigned = any_per_id(pd.Series(True, index=treenums.index))
+        result = pd.DataFrame({'entity':None, 'bound':False}, index=unassigned.index)
+        for (entity, prefixes, excluded_prefixes, root_treenums) in ENTITY_RULES:
+            matched = any_per_id(starts_with(prefixes))
+            if len(excluded_prefixes) > 0:
+                matched = matched & ~any_per_id(starts_with(excluded_prefixes))
+            matched = matched & unassigned
+            result.loc[matched, 'entity'] = entity
+            result.loc[matched, 'bound'] = ~any_per_id(treenums.isin(root_treenums))[matched]
+            unassigned = unassigned & ~matched
+        return result
+    
     def create_database(self):
-        mesh = pd.read_table(self.source_file)
-
-        term_dict = dict()
-        for index, row in mesh.iterrows():
-            if row['id'] in term_dict:
-                term_dict[row['id']]['treenums'].append(row['node'])
-            else:
-                term_dict[row['id']] = {'term':row['MeSH_term'], 'treenums':[row['node']]}
+        mesh = pd.read_table(self.source_file, usecols=['id', 'node', 'MeSH_term'], dtype=str)
+        mesh['node'] = mesh['node'].fillna('')
+        
+        terms = mesh.groupby('id')['MeSH_term'].first()
+        entities = self.classify_treenums(mesh['id'], mesh['node'])
+        rows = zip(terms.index, terms.values, entities['entity'], entities['bound'])
                 
         # connect to database
         conn = sqlite3.connect(self.db)
         c = conn.cursor()
 
-        # create mesh table
+        # create mesh table, inserting rows in key order in one transaction
         try:
             c.execute('DROP TABLE IF EXISTS mesh')
             c.execute("""CREATE TABLE mesh (
@@ -222,14 +467,10 @@ class MeshTools(Eutilities):
                             entity VARCHAR(20),
                             bound INTEGER)
                       """)
-
-
-            for k,v in term_dict.items():
-                (entity, bound) = self.treenums2entity(v['treenums'])
-                query = 'INSERT INTO mesh (mesh_ui, term, entity, bound) VALUES (?, ?, ?, ?)'
-                c.execute(query, (k, v['term'], entity, int(bound)))
+            query = 'INSERT INTO mesh (mesh_ui, term, entity, bound) VALUES (?, ?, ?, ?)'
+            c.executemany(query, ((k, term, entity, int(bound)) for (k, term, entity, bound) in rows))
         except Exception as inst:
             print(inst)
 
         conn.commit()
-        conn.close()
\ No newline at end of file
+        conn.close()
@@ -1,8 +1,90 @@
+from collections import OrderedDict
 from lango.parser import StanfordServerParser
 from lango.matcher import match_rules
+from nltk.tree import Tree
 from SPARQLWrapper import SPARQLWrapper, JSON
 from .MeshTools import MeshTools
 import sqlite3
+import json
+
+
+# one CoreNLP client per server port, shared by all QueryParser instances
+_server_parsers = dict()
+
+def get_server_parser(port):
+    if port not in _server_parsers:
+        _server_parsers[port] = StanfordServerParser(port=port)
+    return _server_parsers[port]
+
+
+class ParseCache:
+    """An LRU cache for parse trees and parsed terms.
+    
+    Entries are indexed by normalized question text. If ``db`` is given,
+    entries are also written to an SQLite file so they survive across sessions.
+    
+    Parameters
+    ----------
+    
+    maxsize : int, optional
+       The number of questions kept in memory. [default: 256]
+       
+    db : str, optional
+       Path to an SQLite file used to persist the cache. If None, the cache
+       is kept in memory only. [default: None]
+
+    """
+    def __init__(self, maxsize=256, db=None):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.db_conn = None
+        if db is not None:
+            self.db_conn = sqlite3.connect(db)
+            self.db_conn.execute("""CREATE TABLE IF NOT EXISTS parse_cache (
+                                        question TEXT PRIMARY KEY,
+                                        tree TEXT,
+                                        terms TEXT)
+                                 """)
+            self.db_conn.commit()
+    
+    def remember(self, question, entry):
+        self.entries[question] = entry
+        self.entries.move_to_end(question)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+    
+    def get(self, question):
+        """Return the cache entry for a normalized question.
+        
+        Returns
+        -------
+        dict
+            A dictionary with entries 'tree' and 'terms' (either may be None),
+            or None if the question is not cached.
+        
+        """
+        if question in self.entries:
+            self.entries.move_to_end(question)
+            return self.entries[question]
+        if self.db_conn is not None:
+            row = self.db_conn.execute('SELECT tree, terms FROM parse_cache WHERE question = ?', (question,)).fetchone()
+            if row is not None:
+                entry = {'tree':row[0], 'terms':row[1]}
+                self.remember(question, entry)
+                return entry
+        return None
+    
+    def set(self, question, tree=None, terms=None):
+        entry = dict(self.get(question) or {'tree':None, 'terms':None})
+        if tree is not None:
+            entry['tree'] = tree
+        if terms is not None:
+            entry['terms'] = terms
+        self.remember(question, entry)
+        if self.db_conn is not None:
+            self.db_conn.execute('INSERT OR REPLACE INTO parse_cache (question, tree, terms) VALUES (?, ?, ?)',
+                                 (question, entry['tree'], entry['terms']))
+            self.db_conn.commit()
 
 
 class QueryParser:
@@ -16,11 +98,20 @@ class QueryParser:
     
     port : int, optional
        The port on which the Stanford CoreNLP Server listens. [default: 9501]
+       
+    cache_size : int, optional
+       The number of parsed questions kept in memory. [default: 256]
+       
+    cache_db : str, optional
+       Path to an SQLite file used to persist parse results. If None, parse
+       results are only cached in memory. [default: 'data/parse_cache.sqlite']
 
     """
-    def __init__(self, port=9501):
-        self.parser = StanfordServerParser(port=port)
+    def __init__(self, port=9501, cache_size=256, cache_db='data/parse_cache.sqlite'):
+        self.parser = get_server_parser(port)
         self.rules = self.get_rules()
+        self.cache = ParseCache(cache_size, cache_db)
+        self.mesh = MeshTools()
         
     def get_rules(self):
         rules_outcome = {
@@ -136,9 +227,24 @@ class QueryParser:
             (to_object, from_object) = compound_object.split(' and ')
         return({'from':{'term':from_object}, 'to':{'term':to_object}, 'relation':{'term':relation}})
         
+    def normalize(self, question):
+        return ' '.join(question.lower().split())
+    
+    def parse_tree(self, question, key):
+        entry = self.cache.get(key)
+        if entry is not None and entry['tree'] is not None:
+            return Tree.fromstring(entry['tree'])
+        tree = self.parser.parse(question)
+        self.cache.set(key, tree=str(tree))
+        return tree
+    
     def parse(self, question):
         """Parse a natural-language question.
         
+        Results are cached by normalized question text, so repeated
+        questions are neither sent to the CoreNLP server nor looked up again.
+        Terms whose entity could not be resolved are not cached.
+        
         Parameters
         ----------
         question : str
@@ -150,14 +256,28 @@ class QueryParser:
             A dictionary of parsed terms.
         
         """
-        tree = self.parser.parse(question)
+        key = self.normalize(question)
+        entry = self.cache.get(key)
+        if entry is not None and entry['terms'] is not None:
+            return json.loads(entry['terms'])
+        
+        tree = self.parse_tree(question, key)
         terms = match_rules(tree, self.rules, self.process_matches)
         if terms is None:
-            return {}
+            terms = {}
+        else:
+            self.resolve_entities(terms)
+            if terms['from']['entity'] is None or terms['to']['entity'] is None:
+                # the lookup of an entity failed; look it up again next time
+                return terms
         
-        mesh = MeshTools()
-        terms['from'].update({k:v for k,v in mesh.get_best_term_entity(terms['from']['term']).items() if k in ('entity', 'bound')})
-        terms['to'].update({k:v for k,v in mesh.get_best_term_entity(terms['to']['term']).items() if k in ('entity', 'bound')})
+        self.cache.set(key, terms=json.dumps(terms))
+        return terms
+    
+    def resolve_entities(self, terms):
+        term_entities = self.mesh.get_best_term_entities([terms['from']['term'], terms['to']['term']])
+        terms['from'].update({k:v for k,v in term_entities[terms['from']['term']].items() if k in ('entity', 'bound')})
+        terms['to'].update({k:v for k,v in term_entities[terms['to']['term']].items() if k in ('entity', 'bound')})
         
         # if terms['from']['entity'] is None:
             # tm = NCITTermMapper()
@@ -175,27 +295,17 @@ class QueryParser:
         
         ## cheat for proof-of-concept
         ## if automatic entity parsing fails, get the entities from the original definitions in the question files
-        if terms['from']['entity'] is None:
-            db = 'data/reasoner_data.sqlite'
-            conn = sqlite3.connect(db)
-            c = conn.cursor()
-
-            query = 'SELECT entity FROM ncats_entity_map WHERE term = "%s"' % terms['from']['term']
-            result = next(iter(c.execute(query).fetchall()), [])
-            if len(result) > 0:
-                terms['from']['entity'] = result[0]
-                terms['from']['bound'] = True
-                
-        if terms['to']['entity'] is None:
-            db = 'data/reasoner_data.sqlite'
-            conn = sqlite3.connect(db)
-            c = conn.cursor()
-
-            query = 'SELECT entity FROM ncats_entity_map WHERE term = "%s"' % terms['to']['term']
-            result = next(iter(c.execute(query).fetchall()), [])
-            if len(result) > 0:
-                terms['to']['entity'] = result[0]
-                terms['to']['bound'] = True
+        unresolved = [terms[k]['term'] for k in ('from', 'to') if terms[k]['entity'] is None]
+        if len(unresolved) > 0:
+            c = self.mesh.db_conn.cursor()
+            query = 'SELECT term, entity FROM ncats_entity_map WHERE term IN (%s)' % ','.join('?' * len(unresolved))
+            entity_map = dict()
+            for (term, entity) in c.execute(query, unresolved).fetchall():
+                entity_map.setdefault(term, entity)
+            for k in ('from', 'to'):
+                if terms[k]['entity'] is None and terms[k]['term'] in entity_map:
+                    terms[k]['entity'] = entity_map[terms[k]['term']]
+                    terms[k]['bound'] = True
         
         terms['from']['bound'] = bool(terms['from']['bound'])
         terms['to']['bound'] = bool(terms['to']['bound'])
@@ -1,44 +1,184 @@
+from collections import namedtuple
 import copy
+import time
 import networkx as nx
+import numpy as np
 from neo4j.v1 import GraphDatabase
 import neo4j.exceptions
 from .Config import Config
+from .QueryMetrics import query_metrics
+
+try:
+    # statements with a timeout need neo4j-driver 1.7 or later
+    from neo4j import Statement
+except ImportError:
+    Statement = None
+
+
+# one driver (and connection pool) per database, shared by all KnowledgeGraph instances
+_drivers = dict()
+
+def get_driver(host, user, password):
+    if (host, user) not in _drivers:
+        _drivers[(host, user)] = GraphDatabase.driver(host, auth=(user, password))
+    return _drivers[(host, user)]
+
+
+GraphColumns = namedtuple('GraphColumns', ['node_ids', 'node_data', 'edge_sources', 'edge_targets', 'edge_data'])
+GraphColumns.__doc__ = """
+The nodes and edges of query records as columns, in the order in which
+the graph of KnowledgeGraph.get_graph iterates them, with the same node
+and edge attribute dicts; node ids and edge endpoints are numpy arrays.
+"""
+
+
+class QueryTimeout(Exception):
+    """Raised when Neo4j terminates a query that ran longer than its timeout."""
 
 
 class KnowledgeGraph:
-    def __init__(self):
+    def __init__(self, timeout=None):
+        """
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds after which Neo4j terminates a query, which then raises
+            QueryTimeout. If None, queries run until they finish. [default: None]
+        """
         config = Config().config
-        self.driver = GraphDatabase.driver(config['neo4j']['host'],
-                                           auth=(config['neo4j']['user'],
-                                                 config['neo4j']['password']))
+        self.driver = get_driver(config['neo4j']['host'],
+                                 config['neo4j']['user'],
+                                 config['neo4j']['password'])
+        self.timeout = timeout
 
     def query(self, query, **kwargs):
-        with self.driver.session() as session:
-            result = session.run(query, **kwargs)
+        # with REASONER_QUERY_METRICS or REASONER_SLOW_QUERY_SECONDS set,
+        # queries are timed and logged by QueryMetrics
+        profiled = query_metrics is not None and query_metrics.sample_profile(query)
+        statement = 'PROFILE ' + query if profiled else query
+        if self.timeout is not None and Statement is not None:
+            statement = Statement(statement, timeout=self.timeout)
+        start = time.perf_counter()
+        try:
+            with self.driver.session() as session:
+                result = session.run(statement, **kwargs)
+        except neo4j.exceptions.CypherError as e:
+            if query_metrics is not None:
+                query_metrics.record_error(query, kwargs, time.perf_counter() - start, e)
+            if 'TransactionTimedOut' in str(getattr(e, 'code', '')):
+                raise QueryTimeout(str(e)) from e
+            raise
+        # closing the session fetched and buffered all records of the
+        # result, so the time includes consuming it
+        if query_metrics is not None:
+            query_metrics.record(query, kwargs, time.perf_counter() - start, result, profiled)
         return(result)
 
     # getters
+    @staticmethod
+    def get_elements(results):
+        """
+        Collect the nodes and edges of query records that hold `nodes` and
+        `edges` lists, or a `path`. Each node and relationship is converted
+        once, even if it is in several records.
+
+        Returns a dict of the attributes of each node by id, and a dict of
+        the attributes of each edge by (start, end, type), in the order in
+        which they first appear; relationships with the same start, end
+        and type are merged into one edge, as in a MultiDiGraph keyed by
+        type.
+        """
+        nodes = dict()
+        edges = dict()
+        edge_ids = set()
+        for record in results:
+            if 'path' in record.keys():
+                record_nodes, record_edges = record['path'].nodes, record['path'].relationships
+            else:
+                record_nodes, record_edges = record['nodes'], record['edges']
+            for node in record_nodes:
+                node_id = node.id
+                if node_id not in nodes:
+                    properties = dict(node.items())
+                    properties['labels'] = node.labels
+                    nodes[node_id] = properties
+            for edge in record_edges:
+                edge_id = edge.id
+                if edge_id in edge_ids:
+                    continue
+                edge_ids.add(edge_id)
+                properties = dict(edge.items())
+                properties['id'] = edge_id
+                properties['type'] = edge_type = edge.type
+                key = (edge.start, edge.end, edge_type)
+                if key in edges:
+                    edges[key].update(properties)
+                else:
+                    edges[key] = properties
+        return(nodes, edges)
+
     def get_graph(self, results):
+        """
+        Build a graph from query records that hold `nodes` and `edges`
+        lists, or a `path`. Nodes and relationships that are in several
+        records are added once.
+        """
+        nodes, edges = self.get_elements(results)
         graph = nx.MultiDiGraph()
+        graph.add_nodes_from(nodes.items())
+        # add_edges_from looks up each keyed edge again after adding it,
+        # which makes it slower than add_edge for MultiDiGraphs
+        for (start, end, edge_type), properties in edges.items():
+            graph.add_edge(start, end, key=edge_type, **properties)
+        return graph
 
+    def get_columns(self, results):
+        """
+        Return the nodes and edges of query records as GraphColumns, in the
+        order of the nodes and edges of get_graph(results), for callers that
+        do not need a networkx graph.
+        """
+        nodes, edges = self.get_elements(results)
+        # nodes that are only the end of an edge are added without attributes
+        for (start, end, _) in edges:
+            if start not in nodes:
+                nodes[start] = dict()
+            if end not in nodes:
+                nodes[end] = dict()
+        # a MultiDiGraph iterates edges by start node, then by end node and
+        # key in the order in which they were first added
+        adjacency = {node_id: dict() for node_id in nodes}
+        for (start, end, edge_type), properties in edges.items():
+            adjacency[start].setdefault(end, []).append(properties)
+        edge_sources = []
+        edge_targets = []
+        edge_data = []
+        for start, neighbors in adjacency.items():
+            for end, edge_list in neighbors.items():
+                edge_sources.extend([start] * len(edge_list))
+                edge_targets.extend([end] * len(edge_list))
+                edge_data.extend(edge_list)
+        return(GraphColumns(np.array(list(nodes)), list(nodes.values()),
+                            np.array(edge_sources), np.array(edge_targets), edge_data))
+
+    def get_graphs(self, results, key='id', columns=False):
+        """Group records by their key column and return a graph per key, in
+        the order in which the keys first appear, or GraphColumns if
+        columns is True."""
+        groups = dict()
         for record in results:
-            for node in record['nodes']:
-                properties = {key:value for (key,value) in node.items()}
-##                properties = {'labels': node.labels}
-##                properties = copy.deepcopy(node.properties)
-                properties['labels'] = node.labels
-                graph.add_node(node.id, **properties)
-            for edge in record['edges']:
-                properties = {key:value for (key,value) in edge.items()}
-##                properties = {'id':edge.id,'type':edge.type}
-##                properties = copy.deepcopy(edge.properties)
-                properties.update(
-                    id=edge.id,
-                    type=edge.type
-                )
-                graph.add_edge(edge.start, edge.end,
-                               key=edge.type, **properties)
-        return graph
+            groups.setdefault(record[key], []).append(record)
+        convert = self.get_columns if columns else self.get_graph
+        return({k: convert(records) for (k, records) in groups.items()})
+
+    def get_graph_version(self):
+        cypher = "MATCH (v:GraphVersion) RETURN v.version as version"
+        result = self.query(cypher)
+        return(next((record['version'] for record in result), None))
+
+    def set_graph_version(self):
+        cypher = "MERGE (v:GraphVersion) SET v.version = toString(timestamp())"
+        self.query(cypher)
 
     def get_num_nodes(self):
         cypher = "MATCH (n) return COUNT(*) as n"
@@ -105,6 +245,14 @@ class KnowledgeGraph:
         result = self.query(cypher)
         return([record['chembl_id'] for record in result])
 
+    def get_disease_symptoms(self, min_count=0):
+        cypher = """
+            MATCH (d:Disease)<-[r:ASSOCIATED_WITH]-(s:Symptom)
+            WHERE r.count > $min_count
+            RETURN ID(d) as disease, ID(s) as symptom
+            """
+        return(self.query(cypher, min_count=min_count))
+
     def set_semtype(self, cui, semtype):
         cypher = """
             MATCH (term:UmlsTerm {cui: {cui}})
@@ -341,3 +489,25 @@ class KnowledgeGraph:
             MERGE (start)-[:%s {source: {source}}]->(end);
             """ % (start_type, start_id_type, end_type, end_id_type, predicate)
         self.query(cypher, start_id=start_id, end_id=end_id, source=source)
+
+    def delete_similar_diseases(self, batch_size=10000):
+        cypher = """
+            MATCH (:Disease)-[r:SIMILAR_TO]->(:Disease)
+            WITH r LIMIT $batch_size
+            DELETE r
+            RETURN count(*) as deleted
+            """
+        while next(iter(self.query(cypher, batch_size=batch_size)))['deleted'] > 0:
+            pass
+
+    def add_similar_diseases(self, rows):
+        """Add SIMILAR_TO relationships between diseases, given by dicts with
+        the ids of their source and target nodes and their jaccard, shared
+        and rank properties."""
+        cypher = """
+            UNWIND $rows as row
+            MATCH (start:Disease) WHERE ID(start) = row.source
+            MATCH (end:Disease) WHERE ID(end) = row.target
+            CREATE (start)-[:SIMILAR_TO {jaccard: row.jaccard, shared: row.shared, rank: row.rank}]->(end)
+            """
+        self.query(cypher, rows=rows)
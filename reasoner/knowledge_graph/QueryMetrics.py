@@ -0,0 +1,260 @@
+"""
+Instrumentation of the Cypher queries of KnowledgeGraph.
+
+When enabled with environment variables, KnowledgeGraph.query records for
+every query its template (a hash of the query text) and, if it runs within
+a query_name block, e.g. for a template of KGAgent, the name of the
+template, a hash of its parameters, the time until all records of the
+result were fetched, the server-side result_available_after and
+result_consumed_after, the number of rows and, for a sample of queries run
+with PROFILE, the database hits. The totals per template are exported in
+the Prometheus text format, and queries that take longer than a threshold
+are written to the slow-query log.
+
+Environment variables:
+
+- REASONER_QUERY_METRICS: record metrics if set to 1, true or yes
+- REASONER_SLOW_QUERY_SECONDS: log queries that take longer (enables metrics)
+- REASONER_SLOW_QUERY_LOG: file of the slow-query log (default: stderr)
+- REASONER_PROFILE_SAMPLE: fraction of queries run with PROFILE (default: 0)
+- REASONER_QUERY_METRICS_DIR: directory to write the metrics of a process
+  to at exit, e.g. of a loader, as <script>-<pid>.prom
+"""
+import atexit
+import bisect
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+
+slow_query_logger = logging.getLogger('reasoner.slow_queries')
+logger = logging.getLogger(__name__)
+
+# upper bounds of the buckets of the query time histogram, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# the name of the queries that run in each thread
+_query_names = threading.local()
+
+
+@contextmanager
+def query_name(name):
+    """Record the queries run in this thread within the block under a name,
+    e.g. of their template, in the metrics and the slow-query log."""
+    previous = getattr(_query_names, 'name', None)
+    _query_names.name = name
+    try:
+        yield
+    finally:
+        _query_names.name = previous
+
+
+def query_hash(query):
+    """The template of a query: a hash of its text with whitespace collapsed."""
+    text = ' '.join(query.split())
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def parameters_hash(parameters):
+    text = json.dumps(parameters, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def plan_db_hits(plan):
+    """The database hits of a profiled plan and its children."""
+    if plan is None:
+        return 0
+    return getattr(plan, 'db_hits', 0) + sum(plan_db_hits(child) for child in getattr(plan, 'children', []))
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class TemplateMetrics:
+    def __init__(self, text, name=None):
+        self.text = text
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.available_after = 0.0
+        self.consumed_after = 0.0
+        self.rows = 0
+        self.profiled = 0
+        self.db_hits = 0
+
+
+class QueryMetrics:
+    """
+    Thread-safe totals of the queries of a process, by template, and the
+    slow-query log.
+
+    Parameters
+    ----------
+    slow_query_seconds : float, optional
+        Log queries that take at least this long. [default: None, no log]
+    profile_sample : float, optional
+        Fraction of queries that are run with PROFILE to count their
+        database hits. [default: 0]
+    """
+
+    def __init__(self, slow_query_seconds=None, profile_sample=0.0):
+        self.slow_query_seconds = slow_query_seconds
+        self.profile_sample = profile_sample
+        self.lock = threading.Lock()
+        self.templates = dict()
+        self.rows_unavailable = False
+
+    @classmethod
+    def from_environment(cls, environ=os.environ):
+        """Return QueryMetrics configured by the environment variables, or
+        None if instrumentation is not enabled."""
+        enabled = environ.get('REASONER_QUERY_METRICS', '').lower() in ('1', 'true', 'yes')
+        slow_query_seconds = environ.get('REASONER_SLOW_QUERY_SECONDS')
+        if not enabled and not slow_query_seconds:
+            return None
+        metrics = cls(slow_query_seconds=float(slow_query_seconds) if slow_query_seconds else None,
+                      profile_sample=float(environ.get('REASONER_PROFILE_SAMPLE', 0)))
+        if environ.get('REASONER_SLOW_QUERY_LOG'):
+            handler = logging.FileHandler(environ['REASONER_SLOW_QUERY_LOG'])
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            slow_query_logger.addHandler(handler)
+            slow_query_logger.setLevel(logging.INFO)
+        if environ.get('REASONER_QUERY_METRICS_DIR'):
+            script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+            path = os.path.join(environ['REASONER_QUERY_METRICS_DIR'], '%s-%d.prom' % (script, os.getpid()))
+            atexit.register(metrics.write, path)
+        return metrics
+
+    def sample_profile(self, query):
+        """Whether to run this query with PROFILE."""
+        if self.profile_sample <= 0 or random.random() >= self.profile_sample:
+            return False
+        # PROFILE cannot precede these
+        return re.match(r'\s*(PROFILE|EXPLAIN|USING\s+PERIODIC\s+COMMIT|CREATE\s+(CONSTRAINT|INDEX)|DROP)\b',
+                        query, re.IGNORECASE) is None
+
+    def template(self, query):
+        key = query_hash(query)
+        if key not in self.templates:
+            self.templates[key] = TemplateMetrics(' '.join(query.split()))
+        metrics = self.templates[key]
+        name = getattr(_query_names, 'name', None)
+        if name is not None:
+            metrics.name = name
+        return key, metrics
+
+    def record(self, query, parameters, seconds, result, profiled=False):
+        """Record a query whose records were all fetched after seconds."""
+        available_after = consumed_after = None
+        rows = None
+        db_hits = None
+        try:
+            summary = result.summary()
+            if summary.result_available_after is not None:
+                available_after = summary.result_available_after / 1000
+            if summary.result_consumed_after is not None:
+                consumed_after = summary.result_consumed_after / 1000
+            if profiled:
+                db_hits = plan_db_hits(summary.profile)
+        except AttributeError:
+            pass
+        # neo4j-driver 1.x (pinned in setup.py) has no public count of the
+        # records of a result that does not consume them; they are buffered
+        # in result._records when the session closes
+        records = getattr(result, '_records', None)
+        if records is not None:
+            rows = len(records)
+        elif not self.rows_unavailable:
+            self.rows_unavailable = True
+            logger.warning('results of %s have no buffered records, rows are not counted',
+                           type(result).__name__)
+
+        with self.lock:
+            key, metrics = self.template(query)
+            metrics.count += 1
+            metrics.seconds += seconds
+            metrics.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            metrics.available_after += available_after or 0
+            metrics.consumed_after += consumed_after or 0
+            metrics.rows += rows or 0
+            if db_hits is not None:
+                metrics.profiled += 1
+                metrics.db_hits += db_hits
+
+        if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+            slow_query_logger.warning(json.dumps({
+                'template': key,
+                'name': metrics.name,
+                'parameters': parameters_hash(parameters),
+                'seconds': round(seconds, 6),
+                'result_available_after': available_after,
+                'result_consumed_after': consumed_after,
+                'rows': rows,
+                'db_hits': db_hits,
+                'query': metrics.text}))
+
+    def record_error(self, query, parameters, seconds, error):
+        with self.lock:
+            key, metrics = self.template(query)
+            metrics.errors += 1
+        if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+            slow_query_logger.warning(json.dumps({
+                'template': key,
+                'name': metrics.name,
+                'parameters': parameters_hash(parameters),
+                'seconds': round(seconds, 6),
+                'error': type(error).__name__,
+                'query': metrics.text}))
+
+    def prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        def family(name, kind, description):
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        with self.lock:
+            templates = sorted((key, 'template="%s",name="%s"' % (key, escape_label(metrics.name or '')), metrics)
+                               for key, metrics in self.templates.items())
+            family('reasoner_neo4j_query_info', 'gauge', 'Query text of each template.')
+            for key, labels, metrics in templates:
+                lines.append('reasoner_neo4j_query_info{%s,query="%s"} 1' % (labels, escape_label(metrics.text[:200])))
+            family('reasoner_neo4j_query_seconds', 'histogram', 'Time until all records of the result of a query were fetched.')
+            for key, labels, metrics in templates:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), metrics.buckets):
+                    cumulative += count
+                    lines.append('reasoner_neo4j_query_seconds_bucket{%s,le="%s"} %d' % (labels, bound, cumulative))
+                lines.append('reasoner_neo4j_query_seconds_sum{%s} %r' % (labels, metrics.seconds))
+                lines.append('reasoner_neo4j_query_seconds_count{%s} %d' % (labels, metrics.count))
+            for name, attribute, description in (
+                    ('reasoner_neo4j_query_errors_total', 'errors', 'Queries that failed.'),
+                    ('reasoner_neo4j_result_available_after_seconds_total', 'available_after',
+                     'Server time until the first record of the results was available.'),
+                    ('reasoner_neo4j_result_consumed_after_seconds_total', 'consumed_after',
+                     'Server time until the results were consumed.'),
+                    ('reasoner_neo4j_rows_total', 'rows', 'Records returned.'),
+                    ('reasoner_neo4j_profiled_queries_total', 'profiled', 'Queries run with PROFILE.'),
+                    ('reasoner_neo4j_db_hits_total', 'db_hits', 'Database hits of the queries run with PROFILE.')):
+                family(name, 'counter', description)
+                for key, labels, metrics in templates:
+                    lines.append('%s{%s} %r' % (name, labels, getattr(metrics, attribute)))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to a file, e.g. for the textfile collector of
+        the Prometheus node exporter."""
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.prometheus())
+        os.replace(path + '.tmp', path)
+
+
+query_metrics = QueryMetrics.from_environment()
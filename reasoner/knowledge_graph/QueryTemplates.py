@@ -0,0 +1,83 @@
+
+
+def path_projection(node_variables, edge_variables):
+    """
+    The RETURN items for the distinct nodes and relationships bound to the
+    given pattern variables, as `nodes` and `edges` lists.
+
+    Collecting each variable of a pattern keeps one row per match, while
+    unwinding nodes(path) and relationships(path) of every path makes
+    nodes x relationships rows per path before they are deduplicated.
+    """
+    nodes = ' + '.join('collect(distinct %s)' % v for v in node_variables)
+    edges = ' + '.join('collect(distinct %s)' % v for v in edge_variables)
+    return '%s as nodes, %s as edges' % (nodes or '[]', edges or '[]')
+
+
+def page_clause(variables, edge_variables):
+    """
+    A WITH clause that keeps the page of $limit matches after $skip of the
+    pattern variables, in the order of the relationship ids, so that pages
+    of the same query do not overlap.
+    """
+    return 'WITH %s ORDER BY %s SKIP $skip LIMIT $limit' % (
+        ', '.join(variables), ', '.join('id(%s)' % v for v in edge_variables))
+
+
+class PathTemplate:
+    """
+    A path query from a start node, given by its label and key property,
+    along a list of hops. Each hop is (relationship type, direction, end
+    label), where the direction is '>' (outgoing), '<' (incoming) or ''
+    (either), and the relationship type or end label may be None to match
+    any.
+
+    The generated queries return the distinct nodes and relationships of
+    all matching paths as two lists (see path_projection). Paged queries
+    only return the paths of the page given by the $skip and $limit
+    parameters, for each start node.
+    """
+
+    def __init__(self, start_label, key, hops):
+        self.start_label = start_label
+        self.key = key
+        self.hops = hops
+
+    def pattern(self, value):
+        pattern = '(n0:%s {%s: %s})' % (self.start_label, self.key, value)
+        for i, (relationship, direction, label) in enumerate(self.hops, 1):
+            relationship = 'r%d:%s' % (i, relationship) if relationship is not None else 'r%d' % i
+            label = ':' + label if label is not None else ''
+            pattern += '%s-[%s]-%s(n%d%s)' % ('<' if direction == '<' else '', relationship,
+                                               '>' if direction == '>' else '', i, label)
+        return pattern
+
+    def node_variables(self):
+        return ['n%d' % i for i in range(len(self.hops) + 1)]
+
+    def edge_variables(self):
+        return ['r%d' % i for i in range(1, len(self.hops) + 1)]
+
+    def projection(self):
+        return path_projection(self.node_variables(), self.edge_variables())
+
+    def query(self, paged=False):
+        """The query for the paths from the start node with key $id."""
+        cypher = 'MATCH %s\n' % self.pattern('$id')
+        if paged:
+            cypher += page_clause(self.node_variables() + self.edge_variables(), self.edge_variables()) + '\n'
+        return cypher + 'RETURN ' + self.projection()
+
+    def batch_query(self, paged=False):
+        """The query for the paths from each start node with a key in $ids,
+        with one record per key that has paths."""
+        cypher = 'UNWIND $ids as id\nMATCH %s\n' % self.pattern('id')
+        if paged:
+            # the page of each id is sliced from its matches in order
+            variables = self.node_variables() + self.edge_variables()
+            cypher += 'WITH id, %s ORDER BY %s\n' % (', '.join(variables),
+                                                     ', '.join('id(%s)' % v for v in self.edge_variables()))
+            cypher += 'WITH id, collect([%s])[$skip..$skip + $limit] as matches\n' % ', '.join(variables)
+            cypher += 'UNWIND matches as m\n'
+            cypher += 'WITH id, %s\n' % ', '.join('m[%d] as %s' % (i, v) for i, v in enumerate(variables))
+        return cypher + 'RETURN id, ' + self.projection()
@@ -1,5 +1,8 @@
 #!/usr/bin/python
 
+import queue
+import threading
+import time
 import requests
 import lxml.html as lh
 from lxml.html import fromstring
@@ -8,23 +11,173 @@ auth_uri="https://utslogin.nlm.nih.gov"
 auth_endpoint = "/cas/v1/api-key"
 
 class Authentication:
-    def __init__(self, apikey):
+    def __init__(self, apikey, auth_uri=auth_uri, session=None):
         self.apikey=apikey
         self.service="http://umlsks.nlm.nih.gov"
+        self.auth_uri = auth_uri
+        self.session = session if session is not None else requests.Session()
 
     def gettgt(self):
         params = {'apikey': self.apikey}
         h = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain", "User-Agent":"python" }
-        r = requests.post(auth_uri+auth_endpoint,data=params,headers=h)
+        r = self.session.post(self.auth_uri+auth_endpoint,data=params,headers=h)
+        r.raise_for_status()
         response = fromstring(r.text)
         ## extract the entire URL needed from the HTML form (action attribute) returned - looks similar to https://utslogin.nlm.nih.gov/cas/v1/tickets/TGT-36471-aYqNLN2rFIJPXKzxwdTNC5ZT7z3B3cTAKfSc5ndHQcUxeaDOLN-cas
         ## we make a POST call to this URL in the getst method
         tgt = response.xpath('//form/@action')[0]
         return tgt
-    
+
     def getst(self,tgt):
         params = {'service': self.service}
         h = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/plain", "User-Agent":"python" }
-        r = requests.post(tgt,data=params,headers=h)
+        r = self.session.post(tgt,data=params,headers=h)
+        r.raise_for_status()
         st = r.text
-        return st
\ No newline at end of file
+        return st
+
+
+class TicketManager:
+    """Hand out UMLS service tickets that were requested ahead of time.
+
+    Every UMLS REST call needs a fresh, single-use service ticket. From the
+    first call of get_ticket on, a background thread keeps a small pool of
+    tickets ready, so a REST call does not have to wait for the ticket request.
+    The ticket-granting ticket (TGT) is renewed before it expires, or right
+    away if UTS rejects a ticket request with a client error.
+
+    Failed ticket requests are retried with exponential backoff. If UTS
+    rejects a request with a client error (4xx), e.g. for an invalid API key,
+    the background thread stops and get_ticket raises that error.
+
+    Parameters
+    ----------
+
+    apikey : str
+       The UMLS API key.
+
+    pool_size : int, optional
+       The number of service tickets kept ready. [default: 2]
+
+    tgt_lifetime : float, optional
+       Seconds after which the TGT is renewed. UTS TGTs are valid for 8 hours.
+       [default: 7.5 hours]
+
+    ticket_lifetime : float, optional
+       Seconds after which an unused service ticket is discarded. UTS service
+       tickets are valid for 5 minutes. [default: 4 minutes]
+
+    auth_uri : str, optional
+       The base URI of the UTS authentication service. [default: https://utslogin.nlm.nih.gov]
+
+    session : requests.Session, optional
+       The HTTP session used for tickets requested by get_ticket. The
+       background thread uses a session of its own. [default: a new session]
+
+    retry_delay : float, optional
+       Seconds before the first retry of a failed ticket request; the delay
+       doubles with each further failure. [default: 1]
+
+    max_retry_delay : float, optional
+       The longest delay between retries. [default: 5 minutes]
+
+    """
+    def __init__(self, apikey, pool_size=2, tgt_lifetime=7.5*3600, ticket_lifetime=240,
+                 auth_uri=auth_uri, session=None, retry_delay=1, max_retry_delay=300):
+        self.auth = Authentication(apikey, auth_uri, session)
+        # requests.Session is not thread-safe
+        self.pool_auth = Authentication(apikey, auth_uri)
+        self.tgt_lifetime = tgt_lifetime
+        self.ticket_lifetime = ticket_lifetime
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.tgt = None
+        self.tgt_time = 0
+        self.tgt_lock = threading.Lock()
+        self.error = None
+        self.tickets = queue.Queue(maxsize=pool_size)
+        self.stopped = threading.Event()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    def start(self):
+        """Start the background thread, unless it is running."""
+        with self.thread_lock:
+            if self.thread is None and not self.stopped.is_set():
+                self.thread = threading.Thread(target=self.fill_pool, daemon=True)
+                self.thread.start()
+
+    def get_tgt(self, auth):
+        with self.tgt_lock:
+            if self.tgt is None or time.time() - self.tgt_time > self.tgt_lifetime:
+                self.tgt = auth.gettgt()
+                self.tgt_time = time.time()
+            return self.tgt
+
+    def invalidate_tgt(self):
+        with self.tgt_lock:
+            self.tgt = None
+
+    def request_ticket(self, auth=None):
+        auth = auth if auth is not None else self.auth
+        tgt = self.get_tgt(auth)
+        try:
+            return auth.getst(tgt)
+        except requests.HTTPError as e:
+            # a TGT that expired early is rejected with a client error; retry
+            # once with a new one. Server errors are left to the caller.
+            if e.response is None or not 400 <= e.response.status_code < 500:
+                raise
+            self.invalidate_tgt()
+            return auth.getst(self.get_tgt(auth))
+
+    def fill_pool(self):
+        delay = self.retry_delay
+        while not self.stopped.is_set():
+            try:
+                ticket = (self.request_ticket(self.pool_auth), time.time())
+            except requests.RequestException as e:
+                response = getattr(e, 'response', None)
+                if response is not None and 400 <= response.status_code < 500:
+                    # retrying will not help, e.g. for an invalid API key
+                    self.error = e
+                    return
+                self.stopped.wait(delay)
+                delay = min(2 * delay, self.max_retry_delay)
+                continue
+            delay = self.retry_delay
+            while not self.stopped.is_set():
+                try:
+                    self.tickets.put(ticket, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+    def get_ticket(self):
+        """Return an unused service ticket.
+
+        Returns
+        -------
+        str
+            A service ticket. If no fresh ticket is ready, one is requested directly.
+
+        Raises
+        ------
+        requests.HTTPError
+            If UTS rejected the ticket requests of the background thread
+            with a client error.
+
+        """
+        self.start()
+        while True:
+            try:
+                (ticket, ticket_time) = self.tickets.get_nowait()
+            except queue.Empty:
+                if self.error is not None:
+                    raise self.error
+                return self.request_ticket()
+            if time.time() - ticket_time < self.ticket_lifetime:
+                return ticket
+
+    def close(self):
+        self.stopped.set()
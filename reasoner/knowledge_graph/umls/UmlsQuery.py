@@ -9,12 +9,12 @@ from ..Dbtools import db_select
 
 
 class UmlsQuery:
-    def __init__(self):
+    def __init__(self, base_uri='https://uts-ws.nlm.nih.gov/rest/', auth_uri=auth_uri):
         config = Config().config
-        self.AuthClient = Authentication(Config().config['umls']['apikey'])
-        self.tgt = self.AuthClient.gettgt()
+        self.tickets = TicketManager(config['umls']['apikey'], auth_uri=auth_uri)
+        self.session = requests.Session()
         self.version = 'current'
-        self.base_uri = 'https://uts-ws.nlm.nih.gov/rest/'
+        self.base_uri = base_uri
 
         # Open database connection
         self.db = mysql.connector.connect(user=config['umls-db']['user'],
@@ -23,10 +23,10 @@ class UmlsQuery:
                                           database=config['umls-db']['database'])
 
     def get_ticket(self):
-        return(self.AuthClient.getst(self.tgt))
+        return(self.tickets.get_ticket())
 
     def send_query(self, endpoint, options={}):
-        if endpoint.startswith('https://'):
+        if endpoint.startswith('https://') or endpoint.startswith('http://'):
             url = endpoint
         else:
             url = self.base_uri + endpoint
@@ -37,7 +37,7 @@ class UmlsQuery:
             pageNumber += 1
             query = {'ticket': ticket, 'pageNumber': pageNumber}
             query.update(options)
-            r = requests.get(url, params=query)
+            r = self.session.get(url, params=query)
             r.encoding = 'utf-8'
 
             if not r.ok:
@@ -148,6 +148,91 @@ class UmlsQuery:
         return(db_select(self.db, sql))
 
 
+    def batch_select(self, sql, ids, prefix=None, chunk_size=1000):
+        """Run a set-based query for many ids and group the rows by id.
+        
+        ``sql`` must select the matched id as ``query_id`` and contain an
+        ``{ids}`` placeholder for the list of ids. The query is run once per
+        chunk of ``chunk_size`` ids. An optional ``prefix`` (e.g. 'UMLS:')
+        is removed from the ids before querying. The result maps every input
+        id to its list of rows, which have the same format as the rows
+        returned by the single-id methods.
+        """
+        ids = list(ids)
+        db_ids = dict()
+        for query_id in ids:
+            db_id = query_id.replace(prefix, '') if prefix is not None else query_id
+            db_ids.setdefault(db_id.lower(), (db_id, []))[1].append(query_id)
+
+        results = {query_id:[] for query_id in ids}
+        keys = [db_id for (db_id, query_ids) in db_ids.values()]
+        for i in range(0, len(keys), chunk_size):
+            chunk = keys[i:i + chunk_size]
+            for row in db_select(self.db, sql.format(ids=', '.join(['%s'] * len(chunk))), tuple(chunk)):
+                db_id = row.pop('query_id')
+                for query_id in db_ids.get(db_id.lower(), (None, []))[1]:
+                    results[query_id].append(dict(row))
+        return(results)
+
+    def source2cui_batch(self, source_ids, sab, tty=None, id_column='SDUI'):
+        sql = ("SELECT DISTINCT src.%s AS query_id, pref.cui AS cui, pref.str AS name "
+               "FROM MRCONSO src "
+               "INNER JOIN MRCONSO pref ON pref.cui = src.cui "
+               "WHERE src.%s IN ({ids}) "
+               "AND src.SAB = '%s' " % (id_column, id_column, sab))
+        if tty is not None:
+            sql = sql + "AND src.tty = '%s' " % tty
+        sql = sql + ("AND pref.ts = 'P' "
+                     "AND pref.stt = 'PF' "
+                     "AND pref.ispref = 'Y' "
+                     "AND pref.lat = 'ENG';")
+        return(self.batch_select(sql, source_ids))
+
+    def mesh2cui_batch(self, mesh_ids):
+        return(self.source2cui_batch(mesh_ids, 'MSH'))
+
+    def go2cui_batch(self, go_ids):
+        return(self.source2cui_batch(go_ids, 'GO', 'PT'))
+
+    def drugbank2cui_batch(self, drugbank_ids):
+        return(self.source2cui_batch(drugbank_ids, 'DRUGBANK', 'IN', 'SCUI'))
+
+    def hpo2cui_batch(self, hpo_ids):
+        return(self.source2cui_batch(hpo_ids, 'HPO', 'PT'))
+
+    def cui2hpo_batch(self, cuis):
+        sql = ("SELECT DISTINCT CUI AS query_id, SDUI as hpo_id "
+               "FROM MRCONSO "
+               "WHERE SAB = 'HPO' "
+               "AND CUI IN ({ids}) "
+               "AND TTY = 'PT' "
+               "ORDER BY SDUI;")
+        return(self.batch_select(sql, cuis, 'UMLS:'))
+
+    def meshterm2cui_batch(self, terms):
+        sql = ("SELECT DISTINCT STR AS query_id, CUI as cui, SDUI as mesh_id "
+               "FROM MRCONSO "
+               "WHERE SAB = 'MSH' "
+               "AND STR IN ({ids});")
+        return(self.batch_select(sql, terms))
+
+    def cui2bestname_batch(self, cuis):
+        sql = ("SELECT DISTINCT cui AS query_id, cui, str as name "
+               "FROM MRCONSO "
+               "WHERE cui IN ({ids}) "
+               "AND ts = 'P' "
+               "AND stt = 'PF' "
+               "AND ispref = 'Y' "
+               "AND lat = 'ENG';")
+        return(self.batch_select(sql, cuis, 'UMLS:'))
+
+    def get_semtype_batch(self, cuis):
+        sql = ("SELECT cui AS query_id, tui type_id, abr type_name "
+               "FROM MRSTY "
+               "LEFT JOIN SRDEF on SRDEF.ui=MRSTY.tui "
+               "WHERE cui IN ({ids});")
+        return(self.batch_select(sql, cuis))
+
     def search(self, query_string, options={}):
         endpoint = "search/" + self.version
         query = {'string': query_string}
@@ -187,4 +272,5 @@ class UmlsQuery:
         return({'cui': result['results'][0]['ui'], 'name': result['results'][0]['name']})
 
     def __del__(self):
+        self.tickets.close()
         self.db.close()
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+
+import pickle
+import sqlite3
+
+
+class UmlsStore:
+    """A local key/value store for UMLS id mappings.
+
+    ``UmlsStore`` keeps the results of ``UmlsQuery`` lookups in an SQLite file,
+    so loaders can resolve the ids they need without a round trip to the UMLS
+    MySQL database for every ontology class. It offers the same lookup methods
+    as ``UmlsQuery`` (single and ``_batch`` variants) and can be used in its place.
+
+    Ids that are not in the store are looked up with the batched methods of
+    ``umls_query`` (if given) and added to the store, including ids without a
+    match, so a store can be prebuilt for a set of ids with ``prefetch``.
+
+    Parameters
+    ----------
+
+    db : str
+       Path to the SQLite file of the store.
+
+    umls_query : UmlsQuery, optional
+       Used to look up ids that are not in the store yet. If None, such ids
+       map to an empty result. [default: None]
+
+    chunk_size : int, optional
+       The number of ids per SQLite query. [default: 900]
+
+    """
+    def __init__(self, db, umls_query=None, chunk_size=900):
+        self.umls_query = umls_query
+        self.chunk_size = chunk_size
+        self.db = sqlite3.connect(db)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS umls_lookup (
+                               method VARCHAR(32),
+                               key VARCHAR(255),
+                               value BLOB,
+                               PRIMARY KEY (method, key))
+                        """)
+        self.db.commit()
+
+    def lookup(self, method, keys):
+        keys = list(keys)
+        results = dict()
+        unique_keys = list(set(keys))
+        for i in range(0, len(unique_keys), self.chunk_size):
+            chunk = unique_keys[i:i + self.chunk_size]
+            sql = ('SELECT key, value FROM umls_lookup WHERE method = ? AND key IN (%s)'
+                   % ','.join('?' * len(chunk)))
+            for (key, value) in self.db.execute(sql, [method] + chunk):
+                results[key] = pickle.loads(value)
+
+        missing = [key for key in unique_keys if key not in results]
+        if len(missing) > 0 and self.umls_query is not None:
+            fetched = getattr(self.umls_query, method + '_batch')(missing)
+            self.db.executemany('INSERT OR REPLACE INTO umls_lookup (method, key, value) VALUES (?, ?, ?)',
+                                [(method, key, pickle.dumps(value)) for (key, value) in fetched.items()])
+            self.db.commit()
+            results.update(fetched)
+        return({key:results.get(key, []) for key in keys})
+
+    def prefetch(self, method, keys):
+        """Add the results of ``method`` for ``keys`` to the store.
+
+        Parameters
+        ----------
+        method : str
+            Name of a ``UmlsQuery`` lookup method, e.g. 'hpo2cui'.
+
+        keys : list
+            The ids to look up.
+
+        """
+        self.lookup(method, keys)
+
+    def mesh2cui(self, mesh_id):
+        return(self.lookup('mesh2cui', [mesh_id])[mesh_id])
+
+    def mesh2cui_batch(self, mesh_ids):
+        return(self.lookup('mesh2cui', mesh_ids))
+
+    def go2cui(self, go_id):
+        return(self.lookup('go2cui', [go_id])[go_id])
+
+    def go2cui_batch(self, go_ids):
+        return(self.lookup('go2cui', go_ids))
+
+    def drugbank2cui(self, drugbank_id):
+        return(self.lookup('drugbank2cui', [drugbank_id])[drugbank_id])
+
+    def drugbank2cui_batch(self, drugbank_ids):
+        return(self.lookup('drugbank2cui', drugbank_ids))
+
+    def hpo2cui(self, hpo_id):
+        return(self.lookup('hpo2cui', [hpo_id])[hpo_id])
+
+    def hpo2cui_batch(self, hpo_ids):
+        return(self.lookup('hpo2cui', hpo_ids))
+
+    def cui2hpo(self, cui):
+        return(self.lookup('cui2hpo', [cui])[cui])
+
+    def cui2hpo_batch(self, cuis):
+        return(self.lookup('cui2hpo', cuis))
+
+    def meshterm2cui(self, term):
+        return(self.lookup('meshterm2cui', [term])[term])
+
+    def meshterm2cui_batch(self, terms):
+        return(self.lookup('meshterm2cui', terms))
+
+    def cui2bestname(self, cui):
+        return(self.lookup('cui2bestname', [cui])[cui])
+
+    def cui2bestname_batch(self, cuis):
+        return(self.lookup('cui2bestname', cuis))
+
+    def get_semtype(self, cui):
+        return(self.lookup('get_semtype', [cui])[cui])
+
+    def get_semtype_batch(self, cuis):
+        return(self.lookup('get_semtype', cuis))
+
+    def __del__(self):
+        self.db.close()
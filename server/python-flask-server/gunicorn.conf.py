@@ -0,0 +1,23 @@
+# Production serving: gunicorn -c gunicorn.conf.py openapi_server.wsgi
+#
+# Every worker process serves several requests at once with threads, which
+# wait on Neo4j without holding the GIL. Worker processes run the
+# CPU-bound graph conversion in parallel.
+import multiprocessing
+import os
+
+bind = os.environ.get('REASONER_BIND', '0.0.0.0:8080')
+workers = int(os.environ.get('REASONER_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('REASONER_THREADS', 4))
+
+# Neo4j terminates the queries of a request after REASONER_QUERY_TIMEOUT
+# seconds, and the request is answered with 504; workers that stop
+# responding for REASONER_WORKER_TIMEOUT seconds are restarted
+os.environ.setdefault('REASONER_QUERY_TIMEOUT', '60')
+timeout = int(os.environ.get('REASONER_WORKER_TIMEOUT', 120))
+graceful_timeout = 30
+
+# the Neo4j driver must not be shared across fork, so every worker loads the app
+preload_app = False
+accesslog = '-'
@@ -0,0 +1,95 @@
+"""Load test for the reasoner server.
+
+Sends queries from concurrent clients to a running server (e.g. started with
+gunicorn against a local Neo4j) for a fixed time, and reports the throughput
+and latency percentiles. Queries are read from a JSON-lines file with one
+query body per line, or default to a mix of the supported query types.
+
+Usage: python loadtest.py [--url URL] [--clients N] [--duration SECONDS]
+                          [--queries FILE] [--bypass-cache]
+"""
+import argparse
+import collections
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_QUERIES = [
+    {"query_message": {"query_graph": {"edges": [{"edge_id": "e00", "source_id": "n00", "target_id": "n01", "type": "targets"}],
+                                       "nodes": [{"node_id": "n00", "curie": "CHEMBL:CHEMBL521", "type": "chemical_substance"},
+                                                 {"node_id": "n01", "type": "protein"}]}}},
+    {"query_message": {"query_type_id": "conditionToSymptoms", "terms": {"disease": "C0004096"}}},
+    {"query_message": {"query_type_id": "conditionSymptomSimilarity", "terms": {"disease": "C0004096"}}},
+    {"query_message": {"query_type_id": "compoundToIndication", "terms": {"chemical_substance": "CHEMBL:CHEMBL521"}}},
+    {"query_message": {"query_type_id": "compoundToPharmClass", "terms": {"chemical_substance": "CHEMBL:CHEMBL521"}}},
+]
+
+
+def percentile(values, q):
+    if len(values) == 0:
+        return float('nan')
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def client(url, queries, offset, deadline, latencies, statuses, lock):
+    i = offset
+    while time.time() < deadline:
+        data = json.dumps(queries[i % len(queries)]).encode('utf-8')
+        request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        start = time.time()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except urllib.error.URLError as e:
+            status = type(e.reason).__name__
+        with lock:
+            latencies.append(time.time() - start)
+            statuses[status] += 1
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the reasoner server.')
+    parser.add_argument('--url', default='http://localhost:8080/reasoner/api/v1/query')
+    parser.add_argument('--clients', type=int, default=16, help='number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to send queries')
+    parser.add_argument('--queries', help='JSON-lines file of query bodies')
+    parser.add_argument('--bypass-cache', action='store_true', help='ask the server not to answer from its cache')
+    args = parser.parse_args()
+
+    if args.queries is not None:
+        with open(args.queries) as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = DEFAULT_QUERIES
+    if args.bypass_cache:
+        queries = [dict(query, bypass_cache='true') for query in queries]
+
+    latencies = []
+    statuses = collections.Counter()
+    lock = threading.Lock()
+    start = time.time()
+    deadline = start + args.duration
+    threads = [threading.Thread(target=client, args=(args.url, queries, i, deadline, latencies, statuses, lock))
+               for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    latencies.sort()
+    print('%d requests in %.1f s from %d clients: %.1f QPS' % (len(latencies), elapsed, args.clients, len(latencies) / elapsed))
+    print('status codes: %s' % ', '.join('%s: %d' % item for item in sorted(statuses.items(), key=str)))
+    print('latency (ms): mean %.1f, p50 %.1f, p90 %.1f, p95 %.1f, p99 %.1f, max %.1f' % (
+        1000 * sum(latencies) / max(len(latencies), 1), 1000 * percentile(latencies, 50), 1000 * percentile(latencies, 90),
+        1000 * percentile(latencies, 95), 1000 * percentile(latencies, 99), 1000 * (latencies[-1] if latencies else float('nan'))))
+
+
+if __name__ == '__main__':
+    main()
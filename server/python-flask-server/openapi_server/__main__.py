@@ -1,15 +1,10 @@
 #!/usr/bin/env python3
 
-import connexion
-
-from openapi_server import encoder
-
-app = connexion.App(__name__, specification_dir='./openapi/')
-app.app.json_encoder = encoder.JSONEncoder
-app.add_api('openapi.yaml', arguments={'title': 'OpenAPI for indigo NCATS Biomedical Translator Reasoner'})
+from openapi_server.wsgi import app
 	
 def main():
-    app.run(port=8080)
+    # the development server; use gunicorn (see gunicorn.conf.py) in production
+    app.run(port=8080, threaded=True)
 
 
 if __name__ == '__main__':
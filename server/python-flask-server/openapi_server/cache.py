@@ -0,0 +1,172 @@
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def normalize_curie(curie):
+    if isinstance(curie, str):
+        return curie.strip()
+    if isinstance(curie, list):
+        return [normalize_curie(c) for c in curie]
+    return curie
+
+
+def normalize_query(body):
+    """
+        Strip whitespace from the curies of the query graph and from the
+        terms of a query body (a dict), so that requests that only differ
+        in whitespace are answered and cached alike.
+    """
+    message = body.get('query_message')
+    if not isinstance(message, dict):
+        return body
+    terms = message.get('terms')
+    if isinstance(terms, dict):
+        for key, value in terms.items():
+            terms[key] = normalize_curie(value)
+    query_graph = message.get('query_graph')
+    if isinstance(query_graph, dict):
+        for node in query_graph.get('nodes') or []:
+            if 'curie' in node:
+                node['curie'] = normalize_curie(node['curie'])
+    return body
+
+
+def canonical_query_graph(query_graph):
+    # node and edge ids are kept, in the order of the request: answers of
+    # planned queries bind their results to these ids, in this order
+    nodes = [[str(node.get('node_id')), node.get('type'), node.get('curie')]
+             for node in query_graph.get('nodes') or []]
+    edges = [[str(edge.get('edge_id')), edge.get('source_id'), edge.get('type'), edge.get('target_id')]
+             for edge in query_graph.get('edges') or []]
+    return {'nodes': nodes, 'edges': edges}
+
+
+def canonical_query(body):
+    """
+        Return the parts of a normalized query body that determine the
+        answer, in a canonical form: the query graph if there is one,
+        otherwise the query type and terms, and the page of results.
+    """
+    message = body.get('query_message') or {}
+    page = {key: body[key] for key in ('max_results', 'page_size', 'page_number') if body.get(key) is not None}
+    if message.get('query_graph') is not None:
+        return {'query_graph': canonical_query_graph(message['query_graph']), 'page': page}
+    terms = message.get('terms') or {}
+    return {'query_type_id': message.get('query_type_id'),
+            'terms': {key: value for key, value in terms.items() if value is not None},
+            'page': page}
+
+
+def query_key(body):
+    canonical = json.dumps(canonical_query(body), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+        A size-bounded LRU cache of query responses with a time to live.
+
+        Entries are indexed by query key and hold the status, mimetype and
+        body of a response. If db is given, entries are also written to an
+        SQLite file that several server processes can share. If version is
+        given, it is called at most every version_ttl seconds to get the
+        version of the knowledge graph, and all entries are dropped when the
+        version changes, e.g. after the Neo4j graph was reloaded.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, db=None, db_maxsize=4096, version=None, version_ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.db_maxsize = db_maxsize
+        self.version = version
+        self.version_ttl = version_ttl
+        self.current_version = None
+        self.version_checked = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.db_conn = None
+        if db is not None:
+            self.db_conn = sqlite3.connect(db, timeout=30, check_same_thread=False)
+            self.db_conn.execute("""CREATE TABLE IF NOT EXISTS response_cache (
+                                        key TEXT PRIMARY KEY,
+                                        version TEXT,
+                                        expires REAL,
+                                        status INTEGER,
+                                        mimetype TEXT,
+                                        body BLOB)
+                                 """)
+            self.db_conn.execute('CREATE INDEX IF NOT EXISTS response_cache_expires ON response_cache (expires)')
+            self.db_conn.commit()
+
+    def get_version(self):
+        if self.version is None:
+            return None
+        now = time.time()
+        if self.version_checked is None or now - self.version_checked >= self.version_ttl:
+            try:
+                version = self.version()
+                version = None if version is None else str(version)
+            except Exception:
+                # keep serving the cached entries if the graph cannot be reached
+                version = self.current_version
+            self.version_checked = now
+            if version != self.current_version:
+                self.current_version = version
+                self.entries.clear()
+                if self.db_conn is not None:
+                    self.db_conn.execute('DELETE FROM response_cache WHERE version IS NOT ?', (version,))
+                    self.db_conn.commit()
+        return self.current_version
+
+    def remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        """
+            Return the cached (status, mimetype, body) of a query key, or None
+            if the query is not cached or its entry expired.
+        """
+        with self.lock:
+            version = self.get_version()
+            now = time.time()
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    return entry[1:]
+                del self.entries[key]
+            if self.db_conn is not None:
+                row = self.db_conn.execute('SELECT expires, status, mimetype, body FROM response_cache WHERE key = ? AND version IS ?',
+                                           (key, version)).fetchone()
+                if row is not None and row[0] > now:
+                    entry = (row[0], row[1], row[2], bytes(row[3]))
+                    self.remember(key, entry)
+                    return entry[1:]
+        return None
+
+    def set(self, key, status, mimetype, body):
+        with self.lock:
+            version = self.get_version()
+            entry = (time.time() + self.ttl, status, mimetype, body)
+            self.remember(key, entry)
+            if self.db_conn is not None:
+                self.db_conn.execute('INSERT OR REPLACE INTO response_cache (key, version, expires, status, mimetype, body) VALUES (?, ?, ?, ?, ?, ?)',
+                                     (key, version) + entry)
+                self.db_conn.execute("""DELETE FROM response_cache WHERE expires <= ? OR key IN (
+                                            SELECT key FROM response_cache ORDER BY expires DESC LIMIT -1 OFFSET ?)
+                                     """, (time.time(), self.db_maxsize))
+                self.db_conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db_conn is not None:
+                self.db_conn.execute('DELETE FROM response_cache')
+                self.db_conn.commit()
@@ -1,12 +1,34 @@
+import os
+
 import connexion
+import flask
 import six
 
 from openapi_server.models.message import Message  # noqa: E501
 from openapi_server.models.query import Query
 from openapi_server import util
+from reasoner.knowledge_graph.KnowledgeGraph import QueryTimeout
 
+from openapi_server.cache import ResponseCache, normalize_query, query_key
 from openapi_server.ui import queryReasoner
 from openapi_server.ui import queryGraph2query
+from openapi_server.ui import graphVersion
+
+
+response_cache = ResponseCache(maxsize=int(os.environ.get('REASONER_CACHE_SIZE', 256)),
+                               ttl=float(os.environ.get('REASONER_CACHE_TTL', 3600)),
+                               db=os.environ.get('REASONER_CACHE_DB'),
+                               version=graphVersion)
+
+
+def answer(body):
+    if body.query_message.query_graph != None:
+        return queryGraph2query(body.query_message.query_graph, body.max_results, body.page_size, body.page_number)
+
+    if body.query_message.query_type_id != None:
+        return queryReasoner(body.query_message.query_type_id, body.query_message.terms, body.max_results, body.page_size, body.page_number)
+
+    return( { "status": 400, "title": "query_graph or query_type_id not defined", "detail": "query_graph or query_type_id not defined", "type": "about:blank" }, 400 )
 
 
 def query(request_body):  # noqa: E501
@@ -20,19 +42,24 @@ def query(request_body):  # noqa: E501
     :rtype: Message
     """
     if connexion.request.is_json:
-        body = Query.from_dict(connexion.request.get_json())  # noqa: E501
+        request_json = normalize_query(connexion.request.get_json())
+        body = Query.from_dict(request_json)  # noqa: E501
 
         if body.query_message != None:
-            query_type_id = body.query_message.query_type_id
-            terms = body.query_message.terms
-
-            if body.query_message.query_graph != None:
-                return queryGraph2query(body.query_message.query_graph)
+            key = query_key(request_json)
+            if str(body.bypass_cache).lower() != 'true':
+                cached = response_cache.get(key)
+                if cached is not None:
+                    status, mimetype, data = cached
+                    return flask.Response(data, status=status, mimetype=mimetype)
 
-            if query_type_id != None:
-                return queryReasoner(query_type_id, terms)
-
-            return( { "status": 400, "title": "query_graph or query_type_id not defined", "detail": "query_graph or query_type_id not defined", "type": "about:blank" }, 400 )
+            try:
+                response = answer(body)
+            except QueryTimeout:
+                return( { "status": 504, "title": "query timed out", "detail": "The knowledge graph did not answer the query in time", "type": "about:blank" }, 504 )
+            # only complete answers are cached, not errors, nor streamed answers
+            if isinstance(response, flask.Response) and response.status_code == 200 and not response.is_streamed:
+                response_cache.set(key, response.status_code, response.mimetype, response.get_data())
+            return response
         return( { "status": 400, "title": "query_message not defined", "detail": "query_message not defined", "type": "about:blank" }, 400 )
     return( { "status": 400, "title": "body content not JSON", "detail": "Required body content is not JSON", "type": "about:blank" }, 400 )
-
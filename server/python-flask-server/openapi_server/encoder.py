@@ -1,8 +1,16 @@
+import json
+
 from connexion.apps.flask_app import FlaskJSONEncoder
+import flask
 import six
 
 from openapi_server.models.base_model_ import Model
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class JSONEncoder(FlaskJSONEncoder):
     include_nulls = False
@@ -18,3 +26,89 @@ class JSONEncoder(FlaskJSONEncoder):
                 dikt[attr] = value
             return dikt
         return FlaskJSONEncoder.default(self, o)
+
+
+def dumps(data):
+    """Serialize plain JSON data exactly as connexion serializes responses.
+
+    connexion writes responses with ``flask.json.dumps(data, indent=2)`` and a
+    trailing newline, and flask sorts keys and escapes non-ASCII characters.
+    orjson produces the same bytes for ASCII output much faster, so it is used
+    when available and the result is ASCII.
+    """
+    if orjson is not None:
+        try:
+            body = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+            if body.isascii():
+                return body + b'\n'
+        except TypeError:
+            pass
+    return (json.dumps(data, indent=2, sort_keys=True) + '\n').encode('utf-8')
+
+
+def json_response(data, status=200):
+    """Return plain JSON data as a response that connexion passes through."""
+    return flask.Response(dumps(data), status=status, mimetype='application/json')
+
+
+class Stream:
+    """A list in JSON data whose items iter_dumps serializes one at a time,
+    as an iterable generates them."""
+
+    def __init__(self, items):
+        self.items = items
+
+
+def is_streamed(data):
+    if isinstance(data, Stream):
+        return True
+    if isinstance(data, dict):
+        return any(is_streamed(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(is_streamed(value) for value in data)
+    return False
+
+
+def iter_parts(data, indent):
+    if not is_streamed(data):
+        # newlines in strings are escaped, so all newlines are indentation
+        yield dumps(data).decode('utf-8').rstrip('\n').replace('\n', '\n' + indent)
+        return
+    if isinstance(data, dict):
+        (start, end) = ('{', '}')
+        items = ((dumps(key).decode('utf-8').rstrip('\n') + ': ', data[key]) for key in sorted(data))
+    else:
+        (start, end) = ('[', ']')
+        items = (('', item) for item in (data.items if isinstance(data, Stream) else data))
+    yield start
+    separator = '\n'
+    for prefix, item in items:
+        yield separator + indent + '  ' + prefix
+        yield from iter_parts(item, indent + '  ')
+        separator = ',\n'
+    if separator != '\n':
+        yield '\n' + indent
+    yield end
+
+
+def iter_dumps(data, chunk_size=65536):
+    """Serialize plain JSON data like dumps, in chunks of about chunk_size
+    bytes: the items of each Stream in data are serialized one at a time,
+    so that they may be generated lazily and the whole document is never
+    held in memory."""
+    chunk = []
+    size = 0
+    for part in iter_parts(data, ''):
+        chunk.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
+            size = 0
+    chunk.append('\n')
+    yield ''.join(chunk).encode('utf-8')
+
+
+def json_stream_response(data, status=200):
+    """Return plain JSON data as a streamed response, see iter_dumps."""
+    return flask.Response(iter_dumps(data), status=status, mimetype='application/json')
@@ -21,13 +21,13 @@ class QNode(Model):
         :param node_id: The node_id of this QNode.  # noqa: E501
         :type node_id: str
         :param curie: The curie of this QNode.  # noqa: E501
-        :type curie: str
+        :type curie: str | List[str]
         :param type: The type of this QNode.  # noqa: E501
         :type type: str
         """
         self.openapi_types = {
             'node_id': str,
-            'curie': str,
+            'curie': object,
             'type': str
         }
 
@@ -82,7 +82,7 @@ class QNode(Model):
         CURIE identifier for this node  # noqa: E501
 
         :return: The curie of this QNode.
-        :rtype: str
+        :rtype: str | List[str]
         """
         return self._curie
 
@@ -93,7 +93,7 @@ class QNode(Model):
         CURIE identifier for this node  # noqa: E501
 
         :param curie: The curie of this QNode.
-        :type curie: str
+        :type curie: str | List[str]
         """
 
         self._curie = curie
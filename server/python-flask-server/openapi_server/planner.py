@@ -0,0 +1,242 @@
+"""
+    Compile TRAPI query graphs into a single parameterized Cypher query.
+
+    Node types, predicates and curie prefixes are translated with the tables
+    below, so that only known labels, relationship types and properties are
+    written into the query; curies are passed as parameters.
+"""
+
+# Neo4j label of each node type
+TYPE_LABELS = {
+    'chemical_substance': 'Drug',
+    'drug': 'Drug',
+    'protein': 'Protein',
+    'gene': 'Gene',
+    'disease': 'Disease',
+    'phenotypic_feature': 'Symptom',
+    'symptom': 'Symptom',
+    'pathway': 'Pathway',
+    'biological_process': 'GoTerm',
+    'cellular_component': 'GoTerm',
+    'molecular_activity': 'GoTerm',
+    'cell': 'Cell',
+    'anatomical_entity': 'Tissue',
+    'pharmacological_class': 'ChebiTerm'
+}
+
+# Neo4j relationship type of each predicate
+PREDICATE_TYPES = {
+    'targets': 'TARGETS',
+    'associated_with': 'ASSOCIATED_WITH',
+    'has_indication': 'HAS_INDICATION',
+    'has_role': 'HAS_ROLE',
+    'treats': 'TREATS',
+    'part_of': 'PART_OF',
+    'product_of': 'PRODUCT_OF',
+    'isa': 'ISA',
+    'similar_to': 'SIMILAR_TO'
+}
+
+# node property that holds the curies of each prefix
+CURIE_PROPERTIES = {
+    'CHEMBL': 'chembl_id',
+    'CHEBI': 'chebi_id',
+    'DRUGBANK': 'drugbank_id',
+    'UNIPROT': 'uniprot_id',
+    'HGNC': 'hgnc_id',
+    'GO': 'go_id',
+    'HP': 'hpo_id',
+    'MESH': 'mesh_id',
+    'UMLS': 'cui',
+    'UBERON': 'uberon_id',
+    'CL': 'cl_id',
+    'SYMP': 'symp_id'
+}
+
+# indexed properties of each label, from load_neo4j/create_indexes.cypher;
+# unique ones match at most one node per curie
+UNIQUE_PROPERTIES = {
+    'UmlsTerm': {'cui'},
+    'Drug': {'drugbank_id', 'chembl_id', 'cui', 'chebi_id'},
+    'ChebiTerm': {'chebi_id'},
+    'Gene': {'hgnc_id'},
+    'Protein': {'uniprot_id'},
+    'Target': {'drugbank_id'},
+    'Pathway': {'go_id', 'cui'},
+    'GoTerm': {'cui'},
+    'Cell': {'cui'},
+    'Tissue': {'cui'},
+    'Symptom': {'cui'},
+    'Disease': {'cui', 'hpo_id', 'mesh_id'},
+    'SympTerm': {'symp_id'},
+    'ClTerm': {'cl_id'},
+    'HpoTerm': {'hpo_id', 'cui'},
+    'UberonTerm': {'uberon_id', 'cui'}
+}
+INDEXED_PROPERTIES = {
+    'GoTerm': {'go_id'}
+}
+
+class QueryGraphError(ValueError):
+    """Raised for query graphs that cannot be compiled."""
+    pass
+
+
+def get_attr(item, name):
+    if isinstance(item, dict):
+        return item.get(name)
+    return getattr(item, name)
+
+
+def curie_property(curie):
+    prefix = curie.split(':', 1)[0].upper() if ':' in curie else None
+    if prefix not in CURIE_PROPERTIES:
+        raise QueryGraphError("unknown curie prefix in '%s'" % curie)
+    return CURIE_PROPERTIES[prefix]
+
+
+def page_bounds(max_results=None, page_size=None, page_number=None):
+    """
+        Translate the max_results, page_size and page_number (counted from 1)
+        of a query into the (limit, skip) of its Cypher query. The limit is
+        None, for all results, if neither max_results nor page_size is given.
+    """
+    if any(value is not None and value < 0 for value in (max_results, page_size, page_number)):
+        raise QueryGraphError('max_results, page_size and page_number must not be negative')
+    skip = 0
+    limit = max_results
+    if page_size is not None:
+        skip = (max(page_number or 1, 1) - 1) * page_size
+        limit = page_size
+        if max_results is not None:
+            # pages end at max_results
+            limit = max(min(limit, max_results - skip), 0)
+    return (limit, skip)
+
+
+def compile_query_graph(query_graph, limit=None, skip=None):
+    """
+        Compile a query graph into one Cypher query.
+
+        Every pinned node (with curies) is matched by the property for its
+        curie prefix. The query starts from the most selective pinned node,
+        the one with the fewest curies on a unique property, with an index
+        hint, and matches the edges in breadth-first order from there, so
+        that each pattern extends the bound part of the match. Edges match
+        in either direction. Each result row holds the nodes and edges of
+        one match, ordered by node ids, in pages of limit rows after skip
+        rows if limit is given.
+
+        :param query_graph: a QueryGraph or its dict
+        :param limit: the maximum number of rows [default: all rows]
+        :param skip: the number of rows to skip [default: 0]
+        :return: (cypher, parameters, query node ids, query edge ids)
+    """
+    nodes = get_attr(query_graph, 'nodes') or []
+    edges = get_attr(query_graph, 'edges') or []
+    if len(nodes) == 0:
+        raise QueryGraphError('query graph without nodes')
+
+    node_ids = [get_attr(node, 'node_id') for node in nodes]
+    if len(set(node_ids)) != len(node_ids):
+        raise QueryGraphError('query graph node ids are not unique')
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    labels = []
+    pinned = {}
+    for i, node in enumerate(nodes):
+        node_type = get_attr(node, 'type')
+        if node_type is not None and node_type not in TYPE_LABELS:
+            raise QueryGraphError("unknown node type '%s'" % node_type)
+        labels.append(TYPE_LABELS.get(node_type))
+        curie = get_attr(node, 'curie')
+        if curie is not None:
+            curies = [str(c) for c in curie] if isinstance(curie, list) else [str(curie)]
+            properties = {curie_property(c) for c in curies}
+            if len(properties) != 1:
+                raise QueryGraphError("curies of node '%s' have different prefixes" % node_ids[i])
+            pinned[i] = (properties.pop(), curies)
+
+    adjacency = {i: [] for i in range(len(nodes))}
+    for j, edge in enumerate(edges):
+        source = index.get(get_attr(edge, 'source_id'))
+        target = index.get(get_attr(edge, 'target_id'))
+        if source is None or target is None:
+            raise QueryGraphError("edge '%s' connects unknown nodes" % get_attr(edge, 'edge_id'))
+        predicate = get_attr(edge, 'type')
+        if predicate is not None and predicate not in PREDICATE_TYPES:
+            raise QueryGraphError("unknown edge type '%s'" % predicate)
+        adjacency[source].append((j, target))
+        adjacency[target].append((j, source))
+
+    def selectivity(i):
+        (key, curies) = pinned[i]
+        return (len(curies), key not in UNIQUE_PROPERTIES.get(labels[i], set()), i)
+    start = min(pinned, key=selectivity) if len(pinned) > 0 else 0
+
+    parameters = {}
+    def node_pattern(i):
+        label = ':' + labels[i] if labels[i] is not None else ''
+        return '(n%d%s)' % (i, label)
+    def node_condition(i):
+        (key, curies) = pinned[i]
+        parameters['n%d' % i] = curies if len(curies) > 1 else curies[0]
+        if len(curies) > 1:
+            return 'n%d.%s IN $n%d' % (i, key, i)
+        return 'n%d.%s = $n%d' % (i, key, i)
+
+    clauses = ['MATCH ' + node_pattern(start)]
+    key = pinned[start][0] if start in pinned else None
+    if key is not None and labels[start] is not None and \
+       (key in UNIQUE_PROPERTIES.get(labels[start], set()) or key in INDEXED_PROPERTIES.get(labels[start], set())):
+        clauses.append('USING INDEX n%d:%s(%s)' % (start, labels[start], key))
+    if start in pinned:
+        clauses.append('WHERE ' + node_condition(start))
+
+    # breadth-first expansion from the start node, in one MATCH so that
+    # each relationship is bound to at most one query edge
+    patterns = []
+    conditions = []
+    visited = {start}
+    matched_edges = set()
+    queue = [start]
+    while len(queue) > 0:
+        i = queue.pop(0)
+        for (j, k) in adjacency[i]:
+            if j in matched_edges:
+                continue
+            matched_edges.add(j)
+            predicate = get_attr(edges[j], 'type')
+            relationship = ':' + PREDICATE_TYPES[predicate] if predicate is not None else ''
+            target = node_pattern(k) if k not in visited else '(n%d)' % k
+            patterns.append('(n%d)-[e%d%s]-%s' % (i, j, relationship, target))
+            if k not in visited:
+                visited.add(k)
+                queue.append(k)
+                if k in pinned:
+                    conditions.append(node_condition(k))
+    if len(visited) != len(nodes):
+        raise QueryGraphError('query graph is not connected')
+
+    if len(patterns) > 0:
+        clauses.append('MATCH ' + ', '.join(patterns))
+    if len(conditions) > 0:
+        clauses.append('WHERE ' + ' AND '.join(conditions))
+
+    node_order = sorted(visited)
+    edge_order = sorted(matched_edges)
+    clauses.append('RETURN [%s] as nodes, [%s] as edges' % (', '.join('n%d' % i for i in node_order),
+                                                             ', '.join('e%d' % j for j in edge_order)))
+    clauses.append('ORDER BY ' + ', '.join('id(n%d)' % i for i in node_order))
+    page = []
+    if skip:
+        parameters['skip'] = int(skip)
+        page.append('SKIP $skip')
+    if limit is not None:
+        parameters['limit'] = int(limit)
+        page.append('LIMIT $limit')
+    if len(page) > 0:
+        clauses.append(' '.join(page))
+
+    edge_ids = [get_attr(edges[j], 'edge_id') for j in edge_order]
+    return ('\n'.join(clauses), parameters, [node_ids[i] for i in node_order], edge_ids)
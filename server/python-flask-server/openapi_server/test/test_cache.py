@@ -0,0 +1,130 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+
+import os
+import tempfile
+import time
+import unittest
+
+from openapi_server.cache import ResponseCache, normalize_query, query_key
+
+
+def graph_query(nodes, edges):
+    return {'query_message': {'query_graph': {
+        'nodes': [{'node_id': node_id, 'type': node_type, 'curie': curie} for node_id, node_type, curie in nodes],
+        'edges': [{'edge_id': edge_id, 'source_id': source_id, 'type': 'TARGETS', 'target_id': target_id}
+                  for edge_id, source_id, target_id in edges]}}}
+
+
+class TestQueryKey(unittest.TestCase):
+    """Cache keys of query bodies"""
+
+    def test_query_graph_ids(self):
+        """Answers are bound to the node and edge ids of the query graph"""
+        query = graph_query([('n0', 'Drug', 'CHEMBL:CHEMBL25'), ('n1', 'Target', None)], [('e0', 'n0', 'n1')])
+        self.assertEqual(query_key(query), query_key(graph_query([('n0', 'Drug', 'CHEMBL:CHEMBL25'), ('n1', 'Target', None)],
+                                                                 [('e0', 'n0', 'n1')])))
+        renamed_nodes = graph_query([('a', 'Drug', 'CHEMBL:CHEMBL25'), ('b', 'Target', None)], [('e0', 'a', 'b')])
+        renamed_edge = graph_query([('n0', 'Drug', 'CHEMBL:CHEMBL25'), ('n1', 'Target', None)], [('x', 'n0', 'n1')])
+        reordered = graph_query([('n1', 'Target', None), ('n0', 'Drug', 'CHEMBL:CHEMBL25')], [('e0', 'n0', 'n1')])
+        keys = {query_key(q) for q in (query, renamed_nodes, renamed_edge, reordered)}
+        self.assertEqual(len(keys), 4)
+
+    def test_terms(self):
+        """Whitespace, key order and None terms do not change the key"""
+        query = {'query_message': {'query_type_id': 'Q2', 'terms': {'drug': 'CHEMBL:CHEMBL25', 'disease': 'DOID:9352'}}}
+        same = {'query_message': {'terms': {'disease': ' DOID:9352\n', 'drug': 'CHEMBL:CHEMBL25 ', 'rel_type': None},
+                                  'query_type_id': 'Q2'}}
+        self.assertEqual(query_key(normalize_query(query)), query_key(normalize_query(same)))
+        other = {'query_message': {'query_type_id': 'Q2', 'terms': {'drug': 'CHEMBL:CHEMBL25', 'disease': 'DOID:1612'}}}
+        self.assertNotEqual(query_key(query), query_key(other))
+        other_type = {'query_message': {'query_type_id': 'Q0', 'terms': {'drug': 'CHEMBL:CHEMBL25', 'disease': 'DOID:9352'}}}
+        self.assertNotEqual(query_key(query), query_key(other_type))
+
+    def test_curies(self):
+        query = graph_query([('n0', 'Drug', ['CHEMBL:CHEMBL25', 'CHEMBL:CHEMBL112'])], [])
+        same = graph_query([('n0', 'Drug', [' CHEMBL:CHEMBL25', 'CHEMBL:CHEMBL112\t'])], [])
+        self.assertEqual(query_key(normalize_query(query)), query_key(normalize_query(same)))
+
+    def test_page(self):
+        """Each page of results has its own key"""
+        query = {'query_message': {'query_type_id': 'Q2', 'terms': {'drug': 'CHEMBL:CHEMBL25'}}}
+        keys = {query_key(dict(query, **page)) for page in ({}, {'max_results': 10}, {'page_size': 10, 'page_number': 1},
+                                                             {'page_size': 10, 'page_number': 2})}
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(query_key(dict(query, max_results=None)), query_key(query))
+
+
+class TestResponseCache(unittest.TestCase):
+    """Response cache in memory and in an SQLite file"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = os.path.join(self.directory.name, 'cache.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_set(self):
+        cache = ResponseCache(maxsize=2)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 200, 'application/json', b'{"a":1}')
+        cache.set('b', 200, 'application/json', b'{"b":1}')
+        self.assertEqual(cache.get('a'), (200, 'application/json', b'{"a":1}'))
+        # 'b' is the least recently used entry
+        cache.set('c', 200, 'application/json', b'{"c":1}')
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.05, db=self.db)
+        cache.set('a', 200, 'application/json', b'{}')
+        self.assertIsNotNone(cache.get('a'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_version(self):
+        versions = ['1']
+        cache = ResponseCache(db=self.db, version=lambda: versions[-1], version_ttl=0)
+        cache.set('a', 200, 'application/json', b'{}')
+        self.assertIsNotNone(cache.get('a'))
+        versions.append('2')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.db_conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0], 0)
+
+    def test_unreachable_version(self):
+        """Entries are kept if the version cannot be read"""
+        versions = ['1']
+
+        def version():
+            if versions[-1] is None:
+                raise IOError('graph unavailable')
+            return versions[-1]
+
+        cache = ResponseCache(version=version, version_ttl=0)
+        cache.set('a', 200, 'application/json', b'{}')
+        versions.append(None)
+        self.assertIsNotNone(cache.get('a'))
+
+    def test_shared_db(self):
+        """Processes share entries through the SQLite file"""
+        first = ResponseCache(db=self.db, version=lambda: '1')
+        second = ResponseCache(db=self.db, version=lambda: '1')
+        first.set('a', 200, 'application/json', b'{"a":1}')
+        self.assertEqual(second.get('a'), (200, 'application/json', b'{"a":1}'))
+        self.assertIsNone(ResponseCache(db=self.db, version=lambda: '2').get('a'))
+
+    def test_db_maxsize(self):
+        cache = ResponseCache(db=self.db, db_maxsize=3)
+        for key in 'abcde':
+            cache.set(key, 200, 'application/json', b'{}')
+        rows = cache.db_conn.execute('SELECT key FROM response_cache').fetchall()
+        self.assertEqual(sorted(row[0] for row in rows), ['c', 'd', 'e'])
+
+
+if __name__ == '__main__':
+    unittest.main()
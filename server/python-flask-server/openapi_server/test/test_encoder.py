@@ -0,0 +1,41 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+
+import unittest
+
+from openapi_server.encoder import Stream, dumps, iter_dumps
+
+
+def items(n):
+    for i in range(n):
+        yield {'id': str(i), 'attributes': [{'name': 'a', 'value': 'x\ny'}], 'empty': {}, 'name': u'café'}
+
+
+class TestIterDumps(unittest.TestCase):
+    """Streamed serialization of JSON data"""
+
+    def test_same_bytes(self):
+        """Streams are serialized like lists, in chunks"""
+        for n in (0, 1, 3):
+            for chunk_size in (1, 100, 65536):
+                with self.subTest(n=n, chunk_size=chunk_size):
+                    data = {'results': Stream(items(n)), 'context': 'c', 'empty': []}
+                    expected = dumps({'results': list(items(n)), 'context': 'c', 'empty': []})
+                    chunks = list(iter_dumps(data, chunk_size=chunk_size))
+                    self.assertEqual(b''.join(chunks), expected)
+                    if chunk_size == 65536:
+                        self.assertEqual(len(chunks), 1)
+
+    def test_nested(self):
+        """Streams nested in lists and dicts"""
+        data = {'results': Stream({'result_graph': {'nodes': Stream(items(n)), 'edges': Stream(items(0))}, 'essence': str(n)}
+                                  for n in range(3)),
+                'other': [Stream(items(2)), 1]}
+        expected = {'results': [{'result_graph': {'nodes': list(items(n)), 'edges': []}, 'essence': str(n)} for n in range(3)],
+                    'other': [list(items(2)), 1]}
+        self.assertEqual(b''.join(iter_dumps(data, chunk_size=10)), dumps(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+
+import re
+import unittest
+
+from openapi_server.planner import compile_query_graph, page_bounds
+
+
+class TestCompileQueryGraph(unittest.TestCase):
+    """Compilation of query graphs to Cypher"""
+
+    def test_parameters(self):
+        """Curies and pages are passed as $parameters"""
+        query_graph = {'nodes': [{'node_id': 'a', 'type': 'chemical_substance', 'curie': ['CHEMBL:CHEMBL25', 'CHEMBL:CHEMBL2']},
+                                 {'node_id': 'b', 'type': 'disease', 'curie': 'UMLS:C0004096'}],
+                       'edges': [{'edge_id': 'e', 'source_id': 'a', 'target_id': 'b'}]}
+        (cypher, parameters, node_ids, edge_ids) = compile_query_graph(query_graph, limit=10, skip=20)
+        self.assertNotRegex(cypher, r'\{\w+\}')
+        self.assertIn('n1.cui = $n1', cypher)
+        self.assertIn('n0.chembl_id IN $n0', cypher)
+        self.assertTrue(cypher.endswith('SKIP $skip LIMIT $limit'))
+        self.assertEqual(set(re.findall(r'\$(\w+)', cypher)), set(parameters))
+        self.assertEqual(parameters, {'n0': ['CHEMBL:CHEMBL25', 'CHEMBL:CHEMBL2'], 'n1': 'UMLS:C0004096',
+                                      'skip': 20, 'limit': 10})
+        self.assertEqual((node_ids, edge_ids), (['a', 'b'], ['e']))
+
+    def test_unpaged(self):
+        """Queries without paging return all matches"""
+        query_graph = {'nodes': [{'node_id': 'a', 'type': 'disease', 'curie': 'UMLS:C0004096'}, {'node_id': 'b', 'type': 'phenotypic_feature'}],
+                       'edges': [{'edge_id': 'e', 'source_id': 'a', 'target_id': 'b'}]}
+        (cypher, parameters, node_ids, edge_ids) = compile_query_graph(query_graph, *page_bounds())
+        self.assertNotIn('SKIP', cypher)
+        self.assertNotIn('LIMIT', cypher)
+        self.assertEqual(parameters, {'n0': 'UMLS:C0004096'})
+
+
+class TestPageBounds(unittest.TestCase):
+
+    def test_page_bounds(self):
+        self.assertEqual(page_bounds(), (None, 0))
+        self.assertEqual(page_bounds(max_results=10), (10, 0))
+        self.assertEqual(page_bounds(page_size=10, page_number=3), (10, 20))
+        self.assertEqual(page_bounds(page_size=10), (10, 0))
+        # pages end at max_results
+        self.assertEqual(page_bounds(max_results=25, page_size=10, page_number=3), (5, 20))
+        self.assertEqual(page_bounds(max_results=25, page_size=10, page_number=4), (0, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
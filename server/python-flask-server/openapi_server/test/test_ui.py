@@ -0,0 +1,254 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+
+import json
+import random
+import unittest
+from unittest import mock
+
+import networkx as nx
+import numpy as np
+
+from openapi_server import ui
+from openapi_server.models.message_terms import MessageTerms
+from openapi_server.ui import edgeDict, nodeDict, targetResults
+from reasoner.KGAgent import KGAgent
+from reasoner.knowledge_graph.KnowledgeGraph import GraphColumns, KnowledgeGraph
+
+
+class TestResultDicts(unittest.TestCase):
+    """Conversion of result nodes and edges to JSON data"""
+
+    def test_edge_cache(self):
+        """Edges are cached by relationship, not by their data dict"""
+        cache = {}
+        data = {'id': 1, 'type': 'TARGETS', 'source': 'ChEMBL', 'score': 0.5}
+        edge = edgeDict(10, 20, data, cache)
+        self.assertEqual(edge, {'source_id': '10', 'target_id': '20', 'provided_by': 'ChEMBL', 'id': '1',
+                                'type': 'TARGETS', 'edge_attributes': [{'name': 'score', 'value': '0.5'}]})
+        # the same relationship in another data dict
+        self.assertIs(edgeDict(10, 20, dict(data), cache), edge)
+        # another relationship in a dict at the same address
+        data.clear()
+        data.update({'id': 2, 'type': 'HAS_ROLE'})
+        other = edgeDict(10, 30, data, cache)
+        self.assertEqual((other['id'], other['type'], other['target_id'], other['provided_by']), ('2', 'HAS_ROLE', '30', 'NA'))
+
+    def test_node_cache(self):
+        cache = {}
+        node = nodeDict(10, {'labels': ['Drug'], 'name': 'ASPIRIN', 'chembl_id': 'CHEMBL:CHEMBL25'}, cache)
+        self.assertEqual(node, {'id': '10', 'type': ['Drug'], 'name': 'ASPIRIN',
+                                'node_attributes': [{'name': 'chembl_id', 'value': 'CHEMBL:CHEMBL25'}]})
+        self.assertIs(nodeDict(10, {}, cache), node)
+
+
+class TestTargetResults(unittest.TestCase):
+    """Results of Q3, one for each target of a drug"""
+
+    def test_targets(self):
+        graph = nx.MultiDiGraph()
+        graph.add_node(1, labels=['Drug'], name='ASPIRIN', chembl_id='CHEMBL25')
+        graph.add_node(2, labels=['Target'], name='PTGS1')
+        graph.add_node(3, labels=['Target'], name='PTGS2')
+        graph.add_edge(1, 2, key='TARGETS', id=10, type='TARGETS')
+        graph.add_edge(1, 3, key='TARGETS', id=11, type='TARGETS')
+        results = list(targetResults(graph, 'CHEMBL25', {}))
+        self.assertEqual([[node['id'] for node in result['result_graph']['nodes']] for result in results], [['1', '2'], ['1', '3']])
+        self.assertEqual([[edge['id'] for edge in result['result_graph']['edges']] for result in results], [['10'], ['11']])
+
+    def test_empty_page(self):
+        """Pages past the last target have no results"""
+        self.assertEqual(list(targetResults(nx.MultiDiGraph(), 'CHEMBL25', {})), [])
+        self.assertEqual(list(targetResults(None, 'CHEMBL25', {})), [])
+
+
+
+class ColumnsAgent:
+    def __init__(self, columns):
+        self.columns = columns
+
+    def get_columns(self):
+        return self.columns
+
+
+def hub_columns(symptoms):
+    """A disease with many symptoms, as one result."""
+    node_ids = np.arange(symptoms + 1)
+    node_data = [{'labels': ['Disease'], 'name': 'D', 'cui': 'C0'}] + \
+                [{'labels': ['Symptom'], 'name': 'S%d' % i} for i in range(symptoms)]
+    edge_data = [{'id': 100 + i, 'type': 'ASSOCIATED_WITH', 'count': i} for i in range(symptoms)]
+    return GraphColumns(node_ids, node_data, np.arange(1, symptoms + 1), np.zeros(symptoms, dtype=int), edge_data)
+
+
+class TestMessageResponse(unittest.TestCase):
+    """Large responses are streamed"""
+
+    def setUp(self):
+        self.stream_elements = ui.STREAM_ELEMENTS
+        ui.STREAM_ELEMENTS = 50
+
+    def tearDown(self):
+        ui.STREAM_ELEMENTS = self.stream_elements
+
+    def test_hub_node(self):
+        """A single result graph with many nodes and edges is streamed"""
+        small = ui.getDefaultResponse(ColumnsAgent(hub_columns(10)))
+        self.assertFalse(small.is_streamed)
+        large = ui.getDefaultResponse(ColumnsAgent(hub_columns(30)))
+        self.assertTrue(large.is_streamed)
+        data = json.loads(b''.join(large.response))
+        ui.STREAM_ELEMENTS = 1000
+        expected = json.loads(ui.getDefaultResponse(ColumnsAgent(hub_columns(30))).get_data())
+        self.assertEqual(len(data['results'][0]['result_graph']['nodes']), 31)
+        self.assertEqual(data['results'], expected['results'])
+
+
+
+class FakeNode:
+    def __init__(self, id, labels, properties):
+        self.id = id
+        self.labels = labels
+        self.properties = properties
+
+    def items(self):
+        return self.properties.items()
+
+
+class FakeRelationship:
+    def __init__(self, id, start, end, type, properties):
+        self.id = id
+        self.start = start
+        self.end = end
+        self.type = type
+        self.properties = properties
+
+    def items(self):
+        return self.properties.items()
+
+
+class FakePath:
+    def __init__(self, nodes, relationships):
+        self.nodes = nodes
+        self.relationships = relationships
+
+
+def random_records(rng, num_records):
+    """Records of nodes and relationships, or of paths, that repeat
+    nodes and relationships, with parallel relationships of one type."""
+    nodes = [FakeNode(i, [rng.choice(['Drug', 'Target', 'Disease'])], {'name': 'n%d' % i, 'rank': rng.randrange(5)})
+             for i in rng.sample(range(1000), 12)]
+    relationships = []
+    for i in range(30):
+        (start, end) = rng.sample(nodes, 2)
+        relationships.append(FakeRelationship(2000 + i, start.id, end.id, rng.choice(['TARGETS', 'TREATS']),
+                                              {'source': rng.choice(['ChEMBL', 'DrugBank']), 'score': i}))
+    # a parallel relationship of the same type
+    parallel = relationships[0]
+    relationships.append(FakeRelationship(3000, parallel.start, parallel.end, parallel.type, {'count': 2}))
+    node_index = {node.id: node for node in nodes}
+
+    records = []
+    for _ in range(num_records):
+        record_relationships = rng.sample(relationships, rng.randint(0, 6))
+        record_nodes = [node_index[n] for r in record_relationships for n in (r.start, r.end)]
+        record_nodes += rng.sample(nodes, rng.randint(0, 2))
+        rng.shuffle(record_nodes)
+        if rng.random() < 0.3:
+            records.append({'path': FakePath(record_nodes, record_relationships)})
+        else:
+            records.append({'nodes': record_nodes, 'edges': record_relationships})
+    return records
+
+
+class TestColumns(unittest.TestCase):
+    """Results converted from GraphColumns match those of graphs"""
+
+    def test_same_results(self):
+        kg = KnowledgeGraph.__new__(KnowledgeGraph)
+        rng = random.Random(0)
+        for i in range(50):
+            records = random_records(rng, rng.randint(1, 8))
+            with self.subTest(i=i):
+                self.assertEqual(ui.resultColumnsDict(kg.get_columns(records)), ui.resultGraphDict(kg.get_graph(records)))
+
+    def test_parallel_edges(self):
+        """Relationships with the same start, end and type are merged"""
+        kg = KnowledgeGraph.__new__(KnowledgeGraph)
+        drug = FakeNode(1, ['Drug'], {'name': 'D'})
+        target = FakeNode(2, ['Target'], {'name': 'T'})
+        records = [{'nodes': [drug, target], 'edges': [FakeRelationship(10, 1, 2, 'TARGETS', {'source': 'ChEMBL'})]},
+                   {'path': FakePath([target, drug], [FakeRelationship(11, 1, 2, 'TARGETS', {'score': 3}),
+                                                      FakeRelationship(12, 2, 1, 'TARGETS', {})])}]
+        result = ui.resultColumnsDict(kg.get_columns(records))
+        self.assertEqual(result, ui.resultGraphDict(kg.get_graph(records)))
+        self.assertEqual([(edge['source_id'], edge['target_id'], edge['id']) for edge in result['edges']],
+                         [('1', '2', '11'), ('2', '1', '12')])
+
+
+
+class BatchKnowledgeGraph(KnowledgeGraph):
+    """Answers batch queries with the records of each id, in the order of
+    the graph, not of the ids."""
+
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append(kwargs)
+        return [record for record in self.records if record['id'] in kwargs['ids']]
+
+
+def disease_records():
+    symptoms = {'C1': [10, 11], 'C2': [11, 12], 'C3': [13]}
+    records = []
+    for i, (cui, symptom_ids) in enumerate(sorted(symptoms.items())):
+        disease = FakeNode(i, ['Disease'], {'name': cui, 'cui': cui})
+        nodes = [disease] + [FakeNode(s, ['Symptom'], {'name': 'S%d' % s}) for s in symptom_ids]
+        edges = [FakeRelationship(100 * s + i, s, i, 'ASSOCIATED_WITH', {}) for s in symptom_ids]
+        records.append({'id': cui, 'nodes': nodes, 'edges': edges})
+    return records
+
+
+class TestBatchQuery(unittest.TestCase):
+    """Queries for lists of curies"""
+
+    def setUp(self):
+        self.kg = BatchKnowledgeGraph(disease_records())
+
+        def agent(timeout=None):
+            agent = KGAgent.__new__(KGAgent)
+            agent.kg = self.kg
+            agent.result = None
+            return agent
+        patcher = mock.patch('openapi_server.ui.KGAgent', agent)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_query(self):
+        """Results are grouped by curie, in the order of the curies"""
+        terms = MessageTerms(disease=['C3', 'C1', 'C9', 'C3'])
+        response = ui.queryReasoner('conditionToSymptoms', terms)
+        results = json.loads(response.get_data())['results']
+        self.assertEqual([result['essence'] for result in results], ['C3', 'C1'])
+        self.assertEqual([sorted(node['name'] for node in result['result_graph']['nodes']) for result in results],
+                         [['C3', 'S13'], ['C1', 'S10', 'S11']])
+        # each curie is queried once, in one batch
+        self.assertEqual(self.kg.queries, [{'ids': ['C3', 'C1', 'C9']}])
+
+    def test_batches(self):
+        agent = ui.KGAgent()
+        agent.batch_query('diseaseToSymptom', ['C1', 'C2', 'C1', 'C3'], batch_size=2, skip=1, limit=5)
+        self.assertEqual(self.kg.queries, [{'ids': ['C1', 'C2'], 'skip': 1, 'limit': 5}, {'ids': ['C3'], 'skip': 1, 'limit': 5}])
+        self.assertEqual(list(agent.get_graphs()), ['C1', 'C2', 'C3'])
+
+    def test_unsupported_lists(self):
+        """Lists of curies are only answered for batched query types"""
+        response = ui.queryReasoner('conditionSimilarity', MessageTerms(disease=['C1', 'C2']))
+        self.assertEqual(response[1], 501)
+        self.assertEqual(self.kg.queries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,142 +1,297 @@
 import datetime
+import os
 
 from reasoner.KGAgent import KGAgent
 ##from openapi_server.models.response import Response  # noqa: E501
-from openapi_server.models.message import Message
-from openapi_server.models.node import Node
-from openapi_server.models.edge import Edge
-from openapi_server.models.node_attribute import NodeAttribute
-from openapi_server.models.edge_attribute import EdgeAttribute
-from openapi_server.models.knowledge_graph import KnowledgeGraph
-from openapi_server.models.result import Result
+from openapi_server.encoder import Stream, json_response, json_stream_response
+from openapi_server.planner import QueryGraphError, compile_query_graph, page_bounds
 from openapi_server.models.message_terms import MessageTerms
 
+# seconds after which Neo4j terminates the queries of a request
+QUERY_TIMEOUT = float(os.environ['REASONER_QUERY_TIMEOUT']) if os.environ.get('REASONER_QUERY_TIMEOUT') else None
+# responses with more nodes and edges in their results are streamed
+STREAM_ELEMENTS = int(os.environ.get('REASONER_STREAM_ELEMENTS', 10000))
+
+
+def nodeDict(node_id, data, cache=None):
+    cache_key = ('node', node_id)
+    if cache is None or cache_key not in cache:
+        node = {
+            'id': str(node_id),
+            'type': [str(label) for label in data['labels']],
+            'name': str(data['name']),
+            'node_attributes': [{'name': key, 'value': str(value)}
+                                for key, value in data.items()
+                                if key not in ['labels', 'name']]
+        }
+        if cache is None:
+            return node
+        cache[cache_key] = node
+    return cache[cache_key]
+
+def edgeDict(source_id, target_id, data, cache=None):
+    # keyed by the Neo4j relationship, since the data dicts of a response
+    # may be freed and their id() reused before the cache is
+    cache_key = ('edge', data['id'], data['type'], source_id, target_id)
+    if cache is None or cache_key not in cache:
+        edge = {
+            'source_id': str(source_id),
+            'target_id': str(target_id),
+            'provided_by': str(data.get('source', 'NA')),
+            'id': str(data['id']),
+            'edge_attributes': [{'name': key, 'value': str(value)}
+                                for key, value in data.items()
+                                if key not in ['type', 'source','id']]
+        }
+        # null fields are left out of responses
+        if data['type'] is not None:
+            edge['type'] = data['type']
+        if cache is None:
+            return edge
+        cache[cache_key] = edge
+    return cache[cache_key]
+
+def streamed(items, stream):
+    """
+        The items as a list, or if stream is True, as a Stream that is
+        serialized item by item as they are generated.
+    """
+    return Stream(items) if stream else list(items)
 
-def resultGraph(graph):
-    nodes = []
-    for node in graph.nodes(data=True):
-        node_attributes = [NodeAttribute(name=key,
-                                         value=str(value))
-                           for key, value in node[1].items()
-                           if key not in ['labels', 'name']]
-        nodes.append(Node(id=str(node[0]),
-                          type=[str(label) for label in node[1]['labels']],
-                          name=str(node[1]['name']),
-                          node_attributes=node_attributes))
-
-    edges = []
-    for edge in graph.edges(data=True):
-        edge_attributes = [EdgeAttribute(name=key,
-                                         value=str(value))
-                           for key, value in edge[2].items()
-                           if key not in ['type', 'source','id']]
-        if 'source' not in edge[2]:
-            edge[2]['source'] = "NA"
-        edges.append(Edge(type=edge[2]['type'],
-                          source_id=str(edge[0]),
-                          target_id=str(edge[1]),
-                          provided_by=str(edge[2]['source']),
-                          id=str(edge[2]['id']),
-                          edge_attributes=edge_attributes))
-
-    rg = KnowledgeGraph(nodes=nodes, edges=edges)
-    return(rg)
+def columnsSize(columns):
+    """
+        The number of nodes and edges of GraphColumns or a graph.
+    """
+    if columns is None:
+        return 0
+    if hasattr(columns, 'number_of_nodes'):
+        return columns.number_of_nodes() + columns.number_of_edges()
+    return len(columns.node_ids) + len(columns.edge_sources)
+
+def resultGraphDict(graph, cache=None):
+    """
+        Convert a result graph to the JSON data of a KnowledgeGraph: a
+        dict of 'nodes', with their id, type (the labels), name and the
+        other properties as node_attributes, and 'edges', with their id,
+        type (unless it is None), source_id, target_id, provided_by (the
+        source property, or NA) and the other properties as
+        edge_attributes; attribute values are strings. Converted nodes and edges are kept in cache, so that
+        results of the same response that share them convert them only
+        once.
+    """
+    if cache is None:
+        cache = {}
+    nodes = [nodeDict(node_id, data, cache) for node_id, data in graph.nodes(data=True)]
+    edges = [edgeDict(source_id, target_id, data, cache) for source_id, target_id, data in graph.edges(data=True)]
+    return {'nodes': nodes, 'edges': edges}
+
+def resultColumnsDict(columns, cache=None, stream=False):
+    """
+        Convert the GraphColumns of a result to the same JSON data as
+        resultGraphDict of its graph, without building a networkx graph.
+        If stream is True, the nodes and edges are converted as they are
+        serialized, and not cached.
+    """
+    if cache is None and not stream:
+        cache = {}
+    nodes = (nodeDict(node_id, data, cache) for node_id, data in zip(columns.node_ids.tolist(), columns.node_data))
+    edges = (edgeDict(source_id, target_id, data, cache)
+             for source_id, target_id, data in zip(columns.edge_sources.tolist(), columns.edge_targets.tolist(), columns.edge_data))
+    return {'nodes': streamed(nodes, stream), 'edges': streamed(edges, stream)}
+
+def messageResponse(results, stream=False):
+    """
+        A response with the results. If stream is True, the results may be
+        generated lazily, and the response is streamed, so that its JSON
+        is written to the client as the results are converted.
+    """
+    r = {'context': "translator_indigo_qa",
+         'datetime': str(datetime.datetime.now()),
+         'results': streamed(results, stream)}
+    if stream:
+        return json_stream_response(r)
+    return json_response(r)
 
 def getDefaultResponse(agent):
-    graph = agent.get_graph()
-    rg = resultGraph(graph)
-    r = Message(context="translator_indigo_qa",
-                 datetime=str(datetime.datetime.now()),
-                 results=[Result(result_graph=rg)])
-    return(r)
+    columns = agent.get_columns()
+    # single results of hub nodes can be large
+    stream = columnsSize(columns) > STREAM_ELEMENTS
+    return messageResponse([{'result_graph': resultColumnsDict(columns, stream=stream)}], stream)
+
+_version_agent = None
+
+def graphVersion():
+    """
+        The version stamp of the Neo4j graph, set when the graph is loaded.
+    """
+    global _version_agent
+    if _version_agent is None:
+        _version_agent = KGAgent(timeout=QUERY_TIMEOUT)
+    return _version_agent.kg.get_graph_version()
 
 def cop_query(drug, disease):
-    agent = KGAgent()
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
     agent.cop_query(drug, disease)
     return(getDefaultResponse(agent))
 
-def mvp_target_query(chemical_substance):
-    agent = KGAgent()
-    agent.mvp_target_query(chemical_substance)
+def mvp_target_query(chemical_substance, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.mvp_target_query(chemical_substance, skip, limit)
     graph = agent.get_graph()
+    stream = columnsSize(graph) > STREAM_ELEMENTS
+    return messageResponse(targetResults(graph, chemical_substance, None if stream else {}), stream)
 
-    chembl_id = chemical_substance
-    start_node = [n for n,d in graph.nodes(data=True) if 'chembl_id' in d and d['chembl_id'] == chembl_id][0]
-    neighbors = graph[start_node]
-
-    results = []
-    for neighbor in neighbors:
-        subgraph = graph.subgraph([start_node, neighbor])
-        rg = resultGraph(subgraph)
-        results.append(Result(result_graph=rg))
-
-    r = Message(context="translator_indigo_qa",
-                 datetime=str(datetime.datetime.now()),
-                 results=results)
-    return(r)
-
+def targetResults(graph, chembl_id, cache):
+    """
+        Generate one result for each target of the drug with the given
+        chembl_id, with the drug, the target and the edges between them, in
+        the order of a subgraph of the two nodes.
+    """
+    if graph is None:
+        return
+    # pages past the last target have no nodes
+    start_node = next((n for n,d in graph.nodes(data=True) if 'chembl_id' in d and d['chembl_id'] == chembl_id), None)
+    if start_node is None:
+        return
+    position = {n: i for i, n in enumerate(graph)}
+
+    for neighbor in graph[start_node]:
+        pair = sorted([start_node, neighbor], key=position.get)
+        nodes = [nodeDict(n, graph.nodes[n], cache) for n in pair]
+        edges = [edgeDict(u, v, data, cache)
+                 for u, v in (pair, pair[::-1])
+                 for data in graph.succ[u].get(v, {}).values()]
+        yield {'result_graph': {'nodes': nodes, 'edges': edges}}
+
+
+def conditionToSymptoms(disease, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.diseaseToSymptom(disease, skip, limit)
+    return(getDefaultResponse(agent))
 
-def conditionToSymptoms(disease):
-    agent = KGAgent()
-    agent.diseaseToSymptom(disease)
+def symptomToConditions(symptom, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.symptomToDisease(symptom, skip, limit)
     return(getDefaultResponse(agent))
 
-def symptomToConditions(symptom):
-    agent = KGAgent()
-    agent.symptomToDisease(symptom)
+def conditionSymptomSimilarity(disease, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.conditionSymptomSimilarity(disease, skip, limit)
     return(getDefaultResponse(agent))
 
-def conditionSymptomSimilarity(disease):
-    agent = KGAgent()
-    agent.conditionSymptomSimilarity(disease)
+def conditionSimilarity(disease, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.similarConditions(disease, skip, limit)
     return(getDefaultResponse(agent))
 
 def genesToPathways(genes):
     return(None)
 
-def pathwayToGenes(pathway):
-    agent = KGAgent()
-    agent.pathwayToGenes(pathway)
+def pathwayToGenes(pathway, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.pathwayToGenes(pathway, skip, limit)
     return(getDefaultResponse(agent))
 
-def geneToCompound(gene):
-    agent = KGAgent()
-    agent.geneToCompound(gene)
+def geneToCompound(gene, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.geneToCompound(gene, skip, limit)
     return(getDefaultResponse(agent))
 
-def compoundToIndication(chemical_substance):
-    agent = KGAgent()
-    agent.compoundToIndication(chemical_substance)
+def compoundToIndication(chemical_substance, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.compoundToIndication(chemical_substance, skip, limit)
     return(getDefaultResponse(agent))
 
-def compoundToPharmClass(chemical_substance):
-    agent = KGAgent()
-    agent.compoundToPharmClass(chemical_substance)
+def compoundToPharmClass(chemical_substance, limit=None, skip=0):
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.compoundToPharmClass(chemical_substance, skip, limit)
     return(getDefaultResponse(agent))
 
-def queryReasoner(query_type_id, terms):
+# query types that accept a list of curies: the KGAgent batch query and
+# the term that holds the curies
+batchQueries = {
+    'Q3': ('drug2target', 'chemical_substance'),
+    'conditionToSymptoms': ('diseaseToSymptom', 'disease'),
+    'symptomToConditions': ('symptomToDisease', 'symptom'),
+    'pathwayToGenes': ('pathwayToGenes', 'pathway'),
+    'geneToCompound': ('geneToCompound', 'gene'),
+    'compoundToIndication': ('compoundToIndication', 'chemical_substance'),
+    'compoundToPharmClass': ('compoundToPharmClass', 'chemical_substance')
+}
+
+def batchQuery(query_type_id, curies, limit=None, skip=0):
+    """
+        Answer a query for a list of curies with one Cypher query per batch
+        of curies. Results are grouped by curie, in the order of the curies,
+        and their essence is the curie they answer. limit and skip select
+        the paths of each curie.
+    """
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.batch_query(batchQueries[query_type_id][0], curies, skip=skip, limit=limit)
+    # only the targets of Q3 are looked up in a graph
+    graphs = agent.get_graphs(columns=query_type_id != 'Q3')
+
+    stream = sum(columnsSize(graph) for graph in graphs.values()) > STREAM_ELEMENTS
+    return messageResponse(batchResults(query_type_id, curies, graphs, None if stream else {}), stream)
+
+def batchResults(query_type_id, curies, graphs, cache):
+    """
+        Generate the results of a batch query for each curie.
+    """
+    for curie in dict.fromkeys(curies):
+        if curie not in graphs:
+            continue
+        if query_type_id == 'Q3':
+            curie_results = targetResults(graphs[curie], curie, cache)
+        else:
+            curie_results = [{'result_graph': resultColumnsDict(graphs[curie], cache)}]
+        for result in curie_results:
+            result['essence'] = str(curie)
+            yield result
+
+def queryReasoner(query_type_id, terms, max_results=None, page_size=None, page_number=None):
+    """
+        Answer a query type for its terms. max_results, page_size and
+        page_number select the page of paths that the query returns, by
+        default all of them.
+    """
+    try:
+        limit, skip = page_bounds(max_results, page_size, page_number)
+    except QueryGraphError as e:
+        msg = str(e)
+        return( { "status": 400, "title": msg, "detail": msg, "type": "about:blank" }, 400 )
+
+    if query_type_id in batchQueries:
+        curies = getattr(terms, batchQueries[query_type_id][1])
+        if isinstance(curies, list):
+            return batchQuery(query_type_id, curies, limit, skip)
+    elif terms is not None and any(isinstance(getattr(terms, attr), list) for attr in terms.openapi_types):
+        msg = "lists of curies are not supported for query_message.query_type_id '"+str(query_type_id)+"'"
+        return( { "status": 501, "title": msg, "detail": msg, "type": "about:blank" }, 501 )
 
     r = 'wrong query_message.query_type_id \''+str(query_type_id)+'\''
     if query_type_id == 'Q2':
         r = cop_query(terms.chemical_substance, terms.disease)
     elif query_type_id == 'Q3':
-        r = mvp_target_query(terms.chemical_substance)
+        r = mvp_target_query(terms.chemical_substance, limit, skip)
     elif query_type_id == 'conditionToSymptoms':
-        r = conditionToSymptoms(terms.disease)
+        r = conditionToSymptoms(terms.disease, limit, skip)
     elif query_type_id == 'symptomToConditions':
-        r = symptomToConditions(terms.symptom)
+        r = symptomToConditions(terms.symptom, limit, skip)
     elif query_type_id == 'conditionSymptomSimilarity':
-        r = conditionSymptomSimilarity(terms.disease)
+        r = conditionSymptomSimilarity(terms.disease, limit, skip)
+    elif query_type_id == 'conditionSimilarity':
+        r = conditionSimilarity(terms.disease, limit, skip)
     elif query_type_id == 'genesToPathways':
         r = genesToPathways(terms.gene)
     elif query_type_id == 'pathwayToGenes':
-        r = pathwayToGenes(terms.pathway)
+        r = pathwayToGenes(terms.pathway, limit, skip)
     elif query_type_id == 'geneToCompound':
-        r = geneToCompound(terms.gene)
+        r = geneToCompound(terms.gene, limit, skip)
     elif query_type_id == 'compoundToIndication':
-        r = compoundToIndication(terms.chemical_substance)
+        r = compoundToIndication(terms.chemical_substance, limit, skip)
     elif query_type_id == 'compoundToPharmClass':
-        r = compoundToPharmClass(terms.chemical_substance)
+        r = compoundToPharmClass(terms.chemical_substance, limit, skip)
     else:
         msg =  "query_message.query_type_id '"+str(query_type_id)+"' not implemented"
         return( { "status": 501, "title": msg, "detail": msg, "type": "about:blank" }, 501 )
@@ -161,7 +316,8 @@ def knowledgeMap():
         (("phenotypic_feature","?","symptom"),"associated_with",("disease","*"), "symptomToConditions"),
         (("chemical_substance","*"),"targets",("gene","?","gene"), "geneToCompound"),
         (("chemical_substance","?","chemical_substance"),"has_indication",("disease","*"), "compoundToIndication"),
-        (("chemical_substance","?","chemical_substance"),"has_role",("pharmacological_class","*"), "compoundToPharmClass")
+        (("chemical_substance","?","chemical_substance"),"has_role",("pharmacological_class","*"), "compoundToPharmClass"),
+        (("disease","?","disease"),"similar_to",("disease","*"), "conditionSimilarity")
     ]
     return km
 
@@ -182,6 +338,12 @@ def queryGraph2triples(query_graph):
     return triples
 
 
+def curieTerm(curie):
+    # a list of curies is kept as a list, to be answered by batchQuery
+    if isinstance(curie, list):
+        return [str(c) for c in curie]
+    return str(curie)
+
 def match_triple(query_triples, km_triple):
     terms = MessageTerms()
     if len(query_triples)!= 1:
@@ -200,31 +362,61 @@ def match_triple(query_triples, km_triple):
     if km_triple[0][1] == '*' and  query_triple[0][1] != None:
         return None
     if km_triple[0][1] == '?' and  query_triple[0][1] != None:
-        setattr(terms, '_'+km_triple[0][2], query_triple[0][1])
+        setattr(terms, '_'+km_triple[0][2], curieTerm(query_triple[0][1]))
 
     if km_triple[2][1] == '?' and  query_triple[2][1] == None:
         return None
     if km_triple[2][1] == '*' and  query_triple[2][1] != None:
         return None
     if km_triple[2][1] == '?' and  query_triple[2][1] != None:
-        setattr(terms, '_'+km_triple[2][2], str(query_triple[2][1]))
+        setattr(terms, '_'+km_triple[2][2], curieTerm(query_triple[2][1]))
 
 
     return (km_triple[3], terms)
 
-def queryGraph2query(query_graph):
+def plannedQuery(query_graph, max_results=None, page_size=None, page_number=None):
+    """
+        Answer a query graph with one Cypher query compiled by the planner,
+        with one result, and its node and edge bindings, for each match.
+    """
+    try:
+        limit, skip = page_bounds(max_results, page_size, page_number)
+        cypher, parameters, node_ids, edge_ids = compile_query_graph(query_graph, limit, skip)
+    except QueryGraphError as e:
+        msg = str(e)
+        return( { "status": 400, "title": msg, "detail": msg, "type": "about:blank" }, 400 )
+
+    agent = KGAgent(timeout=QUERY_TIMEOUT)
+    agent.match_query(cypher, **parameters)
+
+    records = agent.get_result()
+    stream = sum(len(record['nodes']) + len(record['edges']) for record in records) > STREAM_ELEMENTS
+    return messageResponse(plannedResults(agent, records, node_ids, edge_ids, None if stream else {}), stream)
+
+def plannedResults(agent, records, node_ids, edge_ids, cache):
+    """
+        Generate one result, with its node and edge bindings, for each
+        record of a compiled query graph.
+    """
+    for record in records:
+        columns = agent.kg.get_columns([record])
+        yield {'result_graph': resultColumnsDict(columns, cache),
+               'node_bindings': {node_id: str(node.id) for node_id, node in zip(node_ids, record['nodes'])},
+               'edge_bindings': {edge_id: str(edge.id) for edge_id, edge in zip(edge_ids, record['edges'])}}
+
+def queryGraph2query(query_graph, max_results=None, page_size=None, page_number=None):
     """
         translate query_graph to query_type_id and query_message.terms
-        and query reasoner
+        and query reasoner; query graphs that do not match the knowledge
+        map are compiled into a Cypher query by the planner
     """
     query_triples = queryGraph2triples(query_graph)
     for km_triple in knowledgeMap():
         match = match_triple(query_triples, km_triple)
         if match != None:
             query_type_id, terms = match
-            return queryReasoner(query_type_id, terms)
-    msg =  "graph query not implemented"
-    return( { "status": 501, "title": msg, "detail": msg, "type": "about:blank" }, 501 )
+            return queryReasoner(query_type_id, terms, max_results, page_size, page_number)
+    return plannedQuery(query_graph, max_results, page_size, page_number)
 
 def predicates():
     """
@@ -0,0 +1,20 @@
+import connexion
+import flask
+
+from openapi_server import encoder
+from reasoner.knowledge_graph.QueryMetrics import query_metrics
+
+app = connexion.App(__name__, specification_dir='./openapi/')
+app.app.json_encoder = encoder.JSONEncoder
+app.add_api('openapi.yaml', arguments={'title': 'OpenAPI for indigo NCATS Biomedical Translator Reasoner'})
+
+# the WSGI application for servers like gunicorn, see gunicorn.conf.py
+application = app.app
+
+
+@application.route('/metrics')
+def metrics():
+    """Neo4j query metrics of this process, if REASONER_QUERY_METRICS is set."""
+    if query_metrics is None:
+        flask.abort(404)
+    return flask.Response(query_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
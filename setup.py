@@ -8,4 +8,7 @@ setup(name='reasoner',
       author_email='mwawer@broadinstitute.org',
       license='MIT',
       packages=['reasoner'],
+      # QueryMetrics counts the records that 1.x results buffer, and
+      # statements with a timeout need 1.7
+      install_requires=['neo4j-driver>=1.7,<2.0'],
       zip_safe=False)
\ No newline at end of file
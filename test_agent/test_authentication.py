@@ -0,0 +1,139 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import requests
+
+from reasoner.knowledge_graph.umls.Authentication import TicketManager
+
+
+class UtsStub(BaseHTTPRequestHandler):
+    """The TGT and service ticket endpoints of UTS."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            status = server.status
+            if self.path != '/cas/v1/api-key' and server.ticket_status is not None:
+                status = server.ticket_status
+            server.tickets += 1
+            ticket = 'ST-%d' % server.tickets
+        if status != 200:
+            self.send_response(status)
+            self.end_headers()
+            return
+        if self.path == '/cas/v1/api-key':
+            server.tgts += 1
+            body = '<html><form action="http://localhost:%d/cas/v1/tickets/TGT-%d" method="POST"></form></html>' \
+                   % (server.server_port, server.tgts)
+        else:
+            body = ticket
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTicketManager(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('localhost', 0), UtsStub)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.status = 200
+        self.server.ticket_status = None
+        self.server.tgts = 0
+        self.server.tickets = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.auth_uri = 'http://localhost:%d' % self.server.server_port
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close()
+            if manager.thread is not None:
+                manager.thread.join()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def ticket_manager(self, **kwargs):
+        manager = TicketManager('key', auth_uri=self.auth_uri, **kwargs)
+        self.managers.append(manager)
+        return manager
+
+    def test_lazy_start(self):
+        """No tickets are requested before the first get_ticket"""
+        manager = self.ticket_manager()
+        time.sleep(0.2)
+        self.assertIsNone(manager.thread)
+        self.assertEqual(self.server.requests, [])
+        manager.get_ticket()
+        self.assertTrue(manager.thread.is_alive())
+
+    def test_tickets(self):
+        manager = self.ticket_manager()
+        tickets = [manager.get_ticket() for _ in range(20)]
+        self.assertEqual(len(set(tickets)), 20)
+        self.assertEqual(self.server.tgts, 1)
+        self.assertIsNot(manager.pool_auth.session, manager.auth.session)
+
+    def test_client_error(self):
+        self.server.status = 401
+        manager = self.ticket_manager()
+        # the direct request of the first call fails, as does the thread's
+        with self.assertRaises(requests.HTTPError):
+            manager.get_ticket()
+        manager.thread.join(5)
+        self.assertFalse(manager.thread.is_alive())
+        self.assertEqual(len(self.server.requests), 2)
+        with self.assertRaises(requests.HTTPError):
+            manager.get_ticket()
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_server_error_backoff(self):
+        self.server.status = 503
+        manager = self.ticket_manager(retry_delay=0.05, max_retry_delay=0.2)
+        manager.start()
+        time.sleep(1)
+        # 0.05 + 0.1 + 0.2 + 0.2 + 0.2 + 0.2 seconds between 7 requests
+        self.assertTrue(manager.thread.is_alive())
+        self.assertLessEqual(len(self.server.requests), 8)
+
+        self.server.status = 200
+        time.sleep(0.5)
+        self.assertEqual(manager.get_ticket()[:3], 'ST-')
+        self.assertEqual(self.server.tgts, 1)
+
+    def test_ticket_server_error(self):
+        """Server errors of ticket requests do not renew the TGT"""
+        self.server.ticket_status = 503
+        manager = self.ticket_manager(retry_delay=0.05, max_retry_delay=0.1)
+        with self.assertRaises(requests.HTTPError):
+            manager.get_ticket()
+        time.sleep(0.5)
+        self.assertGreater(len(self.server.requests), 3)
+        self.assertEqual(self.server.requests.count('/cas/v1/api-key'), 1)
+
+        self.server.ticket_status = None
+        time.sleep(0.3)
+        self.assertEqual(manager.get_ticket()[:3], 'ST-')
+        self.assertEqual(self.server.tgts, 1)
+
+    def test_ticket_client_error(self):
+        """A rejected ticket request is retried once with a new TGT"""
+        manager = self.ticket_manager()
+        manager.get_tgt(manager.auth)
+        self.server.ticket_status = 404
+        with self.assertRaises(requests.HTTPError):
+            manager.request_ticket()
+        self.assertEqual(self.server.tgts, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
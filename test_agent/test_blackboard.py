@@ -0,0 +1,388 @@
+import itertools
+import random
+import unittest
+
+import networkx
+
+from reasoner.Blackboard import Blackboard, QueryBuilder
+
+
+def random_blackboard(nodes = 200, edges = 260, seed = 0):
+    rng = random.Random(seed)
+    blackboard = Blackboard()
+    for i in range(nodes):
+        blackboard.add_node('n%d' % i, entity = rng.choice(['Drug', 'Protein', 'Disease']))
+    names = list(blackboard)
+    for _ in range(edges):
+        (u, v) = rng.sample(names, 2)
+        blackboard.add_edge(u, v, entities = (blackboard.nodes[u]['entity'], blackboard.nodes[v]['entity']), cost = rng.random())
+    return blackboard
+
+
+def trim_leaves_in_waves(graph, protected):
+    # all nodes with degree one at the start of a wave are removed together
+    removed = list()
+    leaves = [n for n,d in graph.degree() if d == 1 and n not in protected]
+    while len(leaves) > 0:
+        removed.extend(leaves)
+        graph.remove_nodes_from(leaves)
+        leaves = [n for n,d in graph.degree() if d == 1 and n not in protected]
+    return removed
+
+
+def unordered_edges(edge_dict):
+    # edges between two entities are listed under either order of the pair
+    edges = dict()
+    for pair, edge_list in edge_dict.items():
+        edges.setdefault(frozenset(pair), set()).update(frozenset(edge) for edge in edge_list)
+    return edges
+
+
+class TestPrune(unittest.TestCase):
+
+    def assertPrunedLikeWaves(self, blackboard, protected = ()):
+        graph = networkx.Graph(blackboard)
+        expected = trim_leaves_in_waves(graph, set(protected))
+        removed = blackboard.prune(remove_singletons = False, trim_leaves = True, protected = protected)
+        self.assertEqual(sorted(map(str, removed['leaves'])), sorted(map(str, expected)))
+        self.assertEqual(len(removed['leaves']), len(expected))
+        self.assertEqual(set(blackboard), set(graph))
+        self.assertEqual(set(blackboard.node_entities), set(graph))
+
+    def test_random_graphs(self):
+        for seed in range(20):
+            blackboard = random_blackboard(seed = seed)
+            self.assertPrunedLikeWaves(blackboard, protected = ['n0', 'n1'])
+
+    def test_chain(self):
+        blackboard = Blackboard()
+        networkx.add_path(blackboard, range(1000))
+        self.assertPrunedLikeWaves(blackboard)
+        self.assertEqual(len(blackboard), 0)
+
+        blackboard = Blackboard()
+        networkx.add_path(blackboard, range(1001))
+        self.assertPrunedLikeWaves(blackboard)
+        # the middle node loses both neighbors in the last wave
+        self.assertEqual(list(blackboard), [500])
+
+    def test_star(self):
+        blackboard = Blackboard()
+        blackboard.add_edges_from((0, i) for i in range(1, 100))
+        self.assertPrunedLikeWaves(blackboard)
+        self.assertEqual(list(blackboard), [0])
+
+        blackboard = Blackboard()
+        blackboard.add_edges_from((0, i) for i in range(1, 100))
+        self.assertPrunedLikeWaves(blackboard, protected = [1])
+        self.assertEqual(list(blackboard), [1])
+
+    def test_cycle_with_tails(self):
+        blackboard = Blackboard()
+        networkx.add_cycle(blackboard, range(10))
+        networkx.add_path(blackboard, [0, 'a', 'b', 'c'])
+        networkx.add_path(blackboard, [5, 'd'])
+        blackboard.add_edge(3, 3)
+        self.assertPrunedLikeWaves(blackboard, protected = ['c'])
+        self.assertEqual(set(blackboard), set(range(10)) | {'a', 'b', 'c'})
+
+    def test_singletons_and_placeholders(self):
+        blackboard = Blackboard()
+        networkx.add_path(blackboard, ['a', 'b', 'c'])
+        blackboard.add_node('s')
+        blackboard.add_node('t')
+        placeholder = blackboard.add_placeholder('Drug')
+        blackboard.add_edge(placeholder, 'a')
+        removed = blackboard.prune(trim_leaves = True, remove_placeholders = True, protected = ['t'])
+        self.assertEqual(removed, {'placeholders':[placeholder], 'paths':[], 'leaves':['a', 'c'], 'singletons':['b', 's']})
+        self.assertEqual(list(blackboard), ['t'])
+
+
+class TestEntityIndex(unittest.TestCase):
+
+    def assertIndexed(self, blackboard):
+        # the indexes match the ones of a blackboard built from scratch
+        expected = Blackboard()
+        expected.add_nodes_from(blackboard.nodes(data = True))
+        expected.add_edges_from(blackboard.edges(data = True))
+        entities = {d.get('entity') for _, d in blackboard.nodes(data = True)}
+        pairs = [(a, b) for a in entities for b in entities]
+        for include_unbound in (False, True):
+            self.assertEqual(blackboard.get_entity_nodes(entities, include_unbound),
+                             expected.get_entity_nodes(entities, include_unbound))
+            self.assertEqual(unordered_edges(blackboard.get_entity_edges(pairs, include_unbound)),
+                             unordered_edges(expected.get_entity_edges(pairs, include_unbound)))
+
+    def test_add(self):
+        blackboard = Blackboard()
+        blackboard.add_node('aspirin', entity = 'Drug')
+        blackboard.add_nodes_from([('PTGS1', {'entity':'Protein'}), ('PTGS2', {'entity':'Protein'})])
+        blackboard.add_edge('aspirin', 'PTGS1')
+        blackboard.add_edges_from([('PTGS2', 'aspirin')])
+        placeholder = blackboard.add_placeholder('Disease')
+        blackboard.add_edge('aspirin', placeholder)
+
+        self.assertEqual(blackboard.get_entity_nodes(['Drug', 'Protein', 'Disease']),
+                         {'Drug':['aspirin'], 'Protein':['PTGS1', 'PTGS2'], 'Disease':[]})
+        self.assertEqual(blackboard.get_entity_nodes(['Disease'], include_unbound = True), {'Disease':[placeholder]})
+        self.assertEqual(blackboard.get_entity_edges([('Drug', 'Protein')]),
+                         {('Drug', 'Protein'):[('aspirin', 'PTGS1'), ('aspirin', 'PTGS2')]})
+        self.assertEqual(blackboard.get_entity_edges([('Protein', 'Drug')]),
+                         {('Protein', 'Drug'):[('PTGS1', 'aspirin'), ('PTGS2', 'aspirin')]})
+        self.assertEqual(blackboard.get_entity_edges([('Drug', 'Disease')]), {('Drug', 'Disease'):[]})
+        self.assertEqual(blackboard.get_entity_edges([('Drug', 'Disease')], include_unbound = True),
+                         {('Drug', 'Disease'):[('aspirin', placeholder)]})
+
+        # binding a placeholder and changing an entity update the index
+        blackboard.add_node(placeholder, entity = 'Disease', unbound = False)
+        blackboard.add_node('PTGS2', entity = 'Gene')
+        self.assertEqual(blackboard.get_entity_nodes(['Disease', 'Protein', 'Gene']),
+                         {'Disease':[placeholder], 'Protein':['PTGS1'], 'Gene':['PTGS2']})
+        self.assertEqual(blackboard.get_entity_edges([('Drug', 'Protein'), ('Gene', 'Drug')]),
+                         {('Drug', 'Protein'):[('aspirin', 'PTGS1')], ('Gene', 'Drug'):[('PTGS2', 'aspirin')]})
+        self.assertIndexed(blackboard)
+
+    def test_remove(self):
+        blackboard = random_blackboard()
+        blackboard.remove_node('n0')
+        blackboard.remove_nodes_from(['n%d' % i for i in range(1, 50)])
+        blackboard.remove_edge(*next(iter(blackboard.edges())))
+        blackboard.remove_edges_from(list(blackboard.edges())[:20])
+        self.assertIndexed(blackboard)
+        self.assertNotIn('n0', blackboard.node_entities)
+        self.assertFalse(any(node in ('n0', 'n1') for edges in blackboard.entity_edges.values() for edge in edges for node in edge))
+
+        blackboard.clear_edges()
+        self.assertEqual(blackboard.get_entity_edges([('Drug', 'Protein')]), {('Drug', 'Protein'):[]})
+        self.assertIndexed(blackboard)
+        blackboard.clear()
+        self.assertEqual(blackboard.get_entity_nodes(['Drug']), {'Drug':[]})
+
+    def test_subgraph_view(self):
+        blackboard = random_blackboard()
+        blackboard.add_edge('n1', blackboard.add_placeholder('Drug'))
+        nodes = ['n%d' % i for i in range(0, 200, 2)] + blackboard.placeholders
+        view = blackboard.subgraph(nodes)
+        self.assertTrue(networkx.is_frozen(view))
+        copy = Blackboard()
+        copy.add_nodes_from(view.nodes(data = True))
+        copy.add_edges_from(view.edges(data = True))
+        for include_unbound in (False, True):
+            self.assertEqual({k:set(v) for k, v in view.get_entity_nodes(['Drug', 'Protein'], include_unbound).items()},
+                             {k:set(v) for k, v in copy.get_entity_nodes(['Drug', 'Protein'], include_unbound).items()})
+            self.assertEqual(unordered_edges(view.get_entity_edges([('Drug', 'Protein')], include_unbound)),
+                             unordered_edges(copy.get_entity_edges([('Drug', 'Protein')], include_unbound)))
+        # the view has no index of its own and does not change the one of its graph
+        self.assertIndexed(blackboard)
+
+
+class FakeAction():
+    def __init__(self, effect_entities, effect_connections = ()):
+        self.effect_entities = effect_entities
+        self.effect_connections = effect_connections
+
+
+def knowledge_results(seed = 0):
+    rng = random.Random(seed)
+    proteins = ['protein_%d' % i for i in range(30)]
+    pairs = [{'Protein':[{'node':{'name':rng.choice(proteins), 'score':rng.random()}, 'edge':{'article_count':rng.randint(0, 9)}}
+                         for _ in range(rng.randint(1, 4))]}
+             for _ in range(20)]
+    paths = [{'Protein':[{'node':{'name':rng.choice(proteins)}, 'edge':{}}],
+              'Pathway':[{'node':{'name':'pathway_%d' % rng.randint(0, 9)}, 'edge':{'year_first_article':rng.randint(1990, 2019)}}]}
+             for _ in range(20)]
+    return (pairs, paths)
+
+
+class TestAddKnowledge(unittest.TestCase):
+
+    def add_knowledge(self, bulk):
+        blackboard = Blackboard()
+        blackboard.add_node('aspirin', entity = 'Drug')
+        (pairs, paths) = knowledge_results()
+        blackboard.add_knowledge({'Drug':'aspirin'}, pairs, FakeAction(['Drug', 'Protein']), bulk = bulk)
+        blackboard.add_knowledge({'Disease':'pain'}, paths, FakeAction(['Protein', 'Pathway', 'Disease', 'Gene'],
+                                 [('Protein', 'Pathway'), ('Pathway', 'Disease'), ('Gene', 'Pathway')]), bulk = bulk)
+        return blackboard
+
+    def test_bulk(self):
+        one_by_one = self.add_knowledge(False)
+        bulk = self.add_knowledge(True)
+        self.assertEqual(dict(bulk.nodes(data = True)), dict(one_by_one.nodes(data = True)))
+        self.assertEqual({frozenset((u, v)):d for u, v, d in bulk.edges(data = True)},
+                         {frozenset((u, v)):d for u, v, d in one_by_one.edges(data = True)})
+        self.assertEqual(bulk.placeholders, one_by_one.placeholders)
+        self.assertEqual(len(bulk.placeholders), 20)
+        self.assertEqual(set(map(frozenset, bulk.pop_dirty_edges())), set(map(frozenset, one_by_one.pop_dirty_edges())))
+
+    def test_dirty_edges(self):
+        blackboard = self.add_knowledge(True)
+        dirty = blackboard.pop_dirty_edges()
+        self.assertEqual(set(map(frozenset, dirty)), set(map(frozenset, blackboard.edges())))
+        self.assertEqual(len(dirty), blackboard.number_of_edges())
+        self.assertEqual(blackboard.pop_dirty_edges(), [])
+
+        (u, v) = dirty[0]
+        (w, x) = dirty[1]
+        blackboard.set_edge_attributes({(v, u):{'article_count':100}, ('aspirin', 'nothing'):{'article_count':1}})
+        blackboard.add_edge(w, x, article_count = 5)
+        blackboard.add_edge('aspirin', 'ibuprofen', entities = ('Drug', 'Drug'))
+        blackboard.remove_edge('aspirin', 'ibuprofen')
+        # direct changes of attributes do not mark edges
+        networkx.set_edge_attributes(blackboard, {dirty[2]:{'cost':2}})
+        self.assertEqual(set(map(frozenset, blackboard.pop_dirty_edges())), {frozenset((u, v)), frozenset((w, x))})
+        self.assertEqual(blackboard.edges[u, v]['article_count'], 100)
+        self.assertNotIn('nothing', blackboard)
+
+        blackboard.add_edge(w, x)
+        blackboard.remove_node(w)
+        self.assertEqual(blackboard.pop_dirty_edges(), [])
+
+
+class FakeQueryAction():
+    def __init__(self, precondition_bindings, precondition_connections = ()):
+        self.precondition_bindings = precondition_bindings
+        self.precondition_connections = precondition_connections
+
+
+class TestQueryBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.blackboard = Blackboard()
+        for i in range(5):
+            self.blackboard.add_node('drug_%d' % i, entity = 'Drug')
+            self.blackboard.add_node('disease_%d' % i, entity = 'Disease')
+        self.blackboard.add_edge('drug_0', 'disease_0', entities = ('Drug', 'Disease'))
+        self.blackboard.add_placeholder('Drug')
+        self.action = FakeQueryAction(['Drug', 'Disease'])
+
+    def test_all_queries(self):
+        builder = QueryBuilder(self.blackboard)
+        queries = builder.get_queries(self.action)
+        self.assertEqual(len(queries), 25)
+        self.assertEqual({frozenset(q.items()) for q in queries},
+                         {frozenset({('Drug', 'drug_%d' % i), ('Disease', 'disease_%d' % j)}) for i in range(5) for j in range(5)})
+        # bindings are handed out once
+        self.assertEqual(builder.get_queries(self.action), [])
+
+        self.blackboard.add_node('drug_5', entity = 'Drug')
+        self.assertEqual(len(builder.get_queries(self.action)), 5)
+
+    def test_connections(self):
+        builder = QueryBuilder(self.blackboard)
+        action = FakeQueryAction(['Drug', 'Disease'], [('Drug', 'Disease')])
+        self.assertEqual(builder.get_queries(action), [{'Drug':'drug_0', 'Disease':'disease_0'}])
+
+    def test_budget_per_step(self):
+        builder = QueryBuilder(self.blackboard, budget = 10)
+        steps = [builder.get_queries(self.action) for _ in range(4)]
+        self.assertEqual([len(queries) for queries in steps], [10, 10, 5, 0])
+        self.assertEqual(len({frozenset(q.items()) for queries in steps for q in queries}), 25)
+
+        builder = QueryBuilder(self.blackboard, budget = {'FakeQueryAction':3, 'Other':1})
+        self.assertEqual(len(builder.get_queries(self.action)), 3)
+        # stopping early does not use up the budget of the next step
+        self.assertEqual(len(list(itertools.islice(builder.iter_queries(self.action), 1))), 1)
+        self.assertEqual(len(builder.get_queries(self.action)), 3)
+
+    def test_priority(self):
+        rank = {'drug_3':10, 'disease_1':5, 'drug_1':4}
+        builder = QueryBuilder(self.blackboard, priority = lambda n: rank.get(n, 0))
+        queries = builder.get_queries(self.action)
+        self.assertEqual(len(queries), 25)
+        self.assertEqual(queries[0], {'Drug':'drug_3', 'Disease':'disease_1'})
+        scores = [rank.get(q['Drug'], 0) + rank.get(q['Disease'], 0) for q in queries]
+        self.assertEqual(scores, sorted(scores, reverse = True))
+
+
+class TestPaths(unittest.TestCase):
+
+    def test_path_nodes(self):
+        for seed in range(10):
+            blackboard = random_blackboard(nodes = 100, edges = 150, seed = seed)
+            rng = random.Random(seed)
+            sources = rng.sample(list(blackboard), 3)
+            targets = rng.sample(list(blackboard), 3) + ['missing']
+            graph = networkx.Graph(blackboard)
+            betweenness = networkx.betweenness_centrality_subset(graph, sources, [t for t in targets if t in graph])
+            expected = {n for n, b in betweenness.items() if b > 0} | set(sources) | set(targets[:-1])
+            self.assertEqual(blackboard.get_path_nodes(sources, targets), expected)
+
+    def test_path_nodes_max_length(self):
+        for seed in range(10):
+            blackboard = random_blackboard(nodes = 100, edges = 150, seed = seed)
+            rng = random.Random(seed)
+            sources = rng.sample(list(blackboard), 3)
+            targets = rng.sample(list(blackboard), 3)
+            for max_length in (1, 2, 4):
+                # the nodes on shortest paths of at most max_length edges
+                expected = set(sources) | set(targets)
+                for s in sources:
+                    source_distance = networkx.single_source_shortest_path_length(blackboard, s)
+                    for t in targets:
+                        if t == s or source_distance.get(t, max_length + 1) > max_length:
+                            continue
+                        target_distance = networkx.single_source_shortest_path_length(blackboard, t)
+                        expected.update(n for n, d in source_distance.items()
+                                        if d + target_distance.get(n, max_length + 1) == source_distance[t])
+                self.assertEqual(blackboard.get_path_nodes(sources, targets, max_length), expected)
+
+    def test_path_subgraph(self):
+        blackboard = Blackboard()
+        networkx.add_path(blackboard, ['s', 'a', 'b', 't'])
+        networkx.add_path(blackboard, ['s', 'c', 't'])
+        networkx.add_path(blackboard, ['c', 'd'])
+        self.assertEqual(set(blackboard.get_path_subgraph(['s'], ['t'])), {'s', 'c', 't'})
+        self.assertEqual(set(blackboard.get_path_subgraph(['s'], ['t'], max_length = 1)), {'s', 't'})
+        self.assertEqual(set(blackboard.get_path_subgraph(['s'], ['b', 't'])), {'s', 'a', 'b', 'c', 't'})
+
+
+def path_cost(graph, path):
+    return sum(graph.edges[u, v].get('cost', 1) for u, v in zip(path[:-1], path[1:]))
+
+
+class TestTopPaths(unittest.TestCase):
+
+    def setUp(self):
+        self.blackboard = random_blackboard(nodes = 60, edges = 150, seed = 1)
+        self.source = 'n0'
+        self.target = 'n1'
+
+    def test_top_paths(self):
+        expected = list(itertools.islice(networkx.shortest_simple_paths(self.blackboard, self.source, self.target, 'cost'), 5))
+        paths = self.blackboard.get_top_paths(self.source, self.target, k = 5)
+        self.assertEqual(paths, expected)
+        costs = [path_cost(self.blackboard, path) for path in paths]
+        self.assertEqual(costs, sorted(costs))
+        self.assertEqual(self.blackboard.get_top_paths(self.source, self.target, k = 1),
+                         [networkx.shortest_path(self.blackboard, self.source, self.target, 'cost')])
+
+    def test_max_length(self):
+        for max_length in (2, 3, 4):
+            paths = networkx.all_simple_paths(self.blackboard, self.source, self.target, cutoff = max_length)
+            expected = sorted(paths, key = lambda path: path_cost(self.blackboard, path))[:5]
+            self.assertEqual(self.blackboard.get_top_paths(self.source, self.target, k = 5, max_length = max_length), expected)
+
+    def test_entity_pairs(self):
+        entity_pairs = [('Drug', 'Protein'), ('Protein', 'Protein'), ('Protein', 'Disease')]
+        allowed = {frozenset(pair) for pair in entity_pairs}
+        graph = networkx.Graph()
+        graph.add_nodes_from(self.blackboard)
+        graph.add_edges_from((u, v, d) for u, v, d in self.blackboard.edges(data = True) if frozenset(d['entities']) in allowed)
+        expected = list(itertools.islice(networkx.shortest_simple_paths(graph, self.source, self.target, 'cost'), 5))
+        paths = self.blackboard.get_top_paths(self.source, self.target, k = 5, entity_pairs = entity_pairs)
+        self.assertEqual(paths, expected)
+        for path in paths:
+            for u, v in zip(path[:-1], path[1:]):
+                self.assertIn(frozenset((self.blackboard.nodes[u]['entity'], self.blackboard.nodes[v]['entity'])), allowed)
+
+    def test_no_path(self):
+        self.blackboard.add_node('lonely', entity = 'Drug')
+        self.assertEqual(self.blackboard.get_top_paths(self.source, 'lonely'), [])
+        self.assertEqual(self.blackboard.get_top_paths(self.source, 'missing'), [])
+        self.assertEqual(self.blackboard.get_top_paths(self.source, self.target, entity_pairs = [('Gene', 'Gene')]), [])
+        self.assertEqual(self.blackboard.get_top_paths(self.source, self.target, max_length = 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
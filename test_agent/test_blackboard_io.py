@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+import networkx
+import numpy
+
+from reasoner import BlackboardIO
+from reasoner.Blackboard import Blackboard
+from reasoner.BlackboardIO import read_blackboard, write_blackboard
+from reasoner.CompactBlackboard import CompactBlackboard
+
+FILES = ['blackboard.graphml', 'blackboard.graphml.gz', 'blackboard.jsonl', 'blackboard.jsonl.gz', 'blackboard.parquet']
+
+
+def make_blackboard(blackboard_class):
+    blackboard = blackboard_class()
+    for i in range(30):
+        blackboard.add_node('Drug_%d' % i, entity = 'Drug', name = 'Drug_%d' % i, score = numpy.float64(i / 3),
+                            approved = i % 2 == 0, count = numpy.int64(i))
+        blackboard.add_node('Target "%d" & <co>' % i, entity = 'Target', name = 'Target %d' % i)
+    for i in range(30):
+        blackboard.add_edge('Drug_%d' % i, 'Target "%d" & <co>' % ((3 * i) % 30), entities = ('Drug', 'Target'),
+                            cost = 1 + i / 7, article_count = i, source = 'ChEMBL')
+        blackboard.add_edge('Target "%d" & <co>' % ((5 * i) % 30), 'Drug_%d' % i, entities = ('Target', 'Drug'), cost = 2.0)
+    placeholder = blackboard.add_placeholder('Disease')
+    blackboard.add_edge('Drug_0', placeholder, entities = ('Drug', 'Disease'))
+    return blackboard
+
+
+def graph_data(blackboard):
+    nodes = {n:dict(d) for n, d in blackboard.nodes(data = True)}
+    edges = {frozenset((u, v)):dict(d) for u, v, d in blackboard.edges(data = True)}
+    return (nodes, edges)
+
+
+class TestBlackboardIO(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # several chunks per file
+        self.chunk_size = BlackboardIO.CHUNK_SIZE
+        BlackboardIO.CHUNK_SIZE = 16
+
+    def tearDown(self):
+        BlackboardIO.CHUNK_SIZE = self.chunk_size
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        for blackboard_class in (Blackboard, CompactBlackboard):
+            blackboard = make_blackboard(blackboard_class)
+            (nodes, edges) = graph_data(blackboard)
+            for name in FILES:
+                for read_class in (Blackboard, CompactBlackboard):
+                    with self.subTest(blackboard = blackboard_class.__name__, file = name, read = read_class.__name__):
+                        path = os.path.join(self.directory.name, name)
+                        write_blackboard(blackboard, path)
+                        loaded = read_blackboard(path, blackboard_class = read_class)
+                        self.assertIsInstance(loaded, read_class)
+                        self.assertEqual(graph_data(loaded), (nodes, edges))
+                        self.assertEqual(loaded.placeholders, blackboard.placeholders)
+                        self.assertEqual(loaded.get_entity_nodes(['Disease'], include_unbound = True), {'Disease':blackboard.placeholders})
+                        for n, d in loaded.nodes(data = True):
+                            for value in d.values():
+                                self.assertNotIsInstance(value, numpy.generic)
+
+    def test_write_safe(self):
+        blackboard = make_blackboard(Blackboard)
+        path = os.path.join(self.directory.name, 'blackboard.graphml')
+        write_blackboard(blackboard, path)
+        graph = networkx.read_graphml(path)
+        expected = blackboard.write_safe()
+        self.assertEqual(set(graph), set(expected))
+        self.assertEqual({frozenset((u, v)):d for u, v, d in graph.edges(data = True)},
+                         {frozenset((u, v)):d for u, v, d in expected.edges(data = True)})
+
+    def test_format(self):
+        blackboard = make_blackboard(Blackboard)
+        path = os.path.join(self.directory.name, 'blackboard.txt')
+        with self.assertRaises(ValueError):
+            write_blackboard(blackboard, path)
+        write_blackboard(blackboard, path, format = 'jsonl')
+        self.assertEqual(graph_data(read_blackboard(path, format = 'jsonl')), graph_data(blackboard))
+
+
+if __name__ == '__main__':
+    unittest.main()
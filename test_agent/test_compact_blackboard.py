@@ -0,0 +1,77 @@
+import random
+import unittest
+
+import networkx
+
+from reasoner.Blackboard import Blackboard
+from reasoner.CompactBlackboard import CompactBlackboard, MISSING
+
+
+def random_blackboard(nodes = 200, edges = 260, seed = 0):
+    rng = random.Random(seed)
+    blackboard = Blackboard()
+    for i in range(nodes):
+        blackboard.add_node('n%d' % i, entity = rng.choice(['Drug', 'Protein', 'Disease']), name = 'n%d' % i, score = i)
+    names = list(blackboard)
+    for _ in range(edges):
+        (u, v) = rng.sample(names, 2)
+        blackboard.add_edge(u, v, entities = (blackboard.nodes[u]['entity'], blackboard.nodes[v]['entity']), cost = rng.random())
+    blackboard.add_placeholder('Disease')
+    return blackboard
+
+
+class TestCompactBlackboard(unittest.TestCase):
+
+    def assertSameGraph(self, compact, blackboard):
+        self.assertEqual(dict(compact.nodes(data = True)), dict(blackboard.nodes(data = True)))
+        self.assertEqual({frozenset((u, v)):dict(d) for u, v, d in compact.edges(data = True)},
+                         {frozenset((u, v)):d for u, v, d in blackboard.edges(data = True)})
+
+    def test_prune(self):
+        blackboard = random_blackboard()
+        compact = CompactBlackboard.from_networkx(blackboard)
+        protected = ['n0', 'n1']
+        expected = blackboard.prune(trim_leaves = True, remove_placeholders = True, protected = protected)
+        removed = compact.prune(trim_leaves = True, remove_placeholders = True, protected = protected)
+        self.assertEqual({k:set(v) for k, v in removed.items()}, {k:set(v) for k, v in expected.items()})
+        self.assertGreater(len(removed['leaves']), 0)
+        self.assertSameGraph(compact, blackboard)
+
+        # removed nodes are gone from the name index and attribute columns
+        removed_nodes = {n for nodes in removed.values() for n in nodes}
+        self.assertEqual(set(compact.node_names) - {None}, set(blackboard))
+        self.assertTrue(removed_nodes.isdisjoint(compact.node_names))
+        self.assertEqual(len(compact.free_node_ids), len(removed_nodes))
+        for i in compact.free_node_ids:
+            self.assertEqual(compact.node_entity.data[i], -1)
+            for column in compact.node_columns.values():
+                self.assertTrue(i >= len(column) or column[i] is MISSING)
+        self.assertEqual(compact.get_entity_nodes(['Drug', 'Protein', 'Disease']),
+                         blackboard.get_entity_nodes(['Drug', 'Protein', 'Disease']))
+
+    def test_reuse_removed_ids(self):
+        blackboard = random_blackboard()
+        compact = CompactBlackboard.from_networkx(blackboard)
+        size = len(compact.node_names)
+        compact.remove_nodes_from(['n3', 'n4'])
+        blackboard.remove_nodes_from(['n3', 'n4'])
+        compact.add_node('m0', entity = 'Gene')
+        compact.add_edge('m0', 'n5', entities = ('Gene', compact.nodes['n5']['entity']))
+        blackboard.add_node('m0', entity = 'Gene')
+        blackboard.add_edge('m0', 'n5', entities = ('Gene', blackboard.nodes['n5']['entity']))
+        self.assertEqual(len(compact.node_names), size)
+        self.assertEqual(dict(compact.nodes['m0']), {'entity':'Gene'})
+        self.assertSameGraph(compact, blackboard)
+        self.assertEqual(set(compact['m0']), {'n5'})
+        self.assertSameGraph(compact.subgraph(['n5', 'm0', 'n6']), blackboard.subgraph(['n5', 'm0', 'n6']))
+
+    def test_path_queries(self):
+        blackboard = random_blackboard()
+        compact = CompactBlackboard.from_networkx(blackboard)
+        self.assertEqual(compact.get_path_nodes(['n0'], ['n1', 'n2'], 4), blackboard.get_path_nodes(['n0'], ['n1', 'n2'], 4))
+        self.assertEqual(compact.get_top_paths('n0', 'n1', k = 3), blackboard.get_top_paths('n0', 'n1', k = 3))
+        self.assertTrue(networkx.is_isomorphic(compact.to_networkx(), blackboard))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import random
+import unittest
+
+from load_neo4j.load_disease_similarity import top_jaccard
+
+
+def brute_force_top_jaccard(diseases, symptoms, k):
+    """The k most similar diseases of each disease that share a symptom with
+    it, as (source, target, jaccard, shared, rank) tuples."""
+    symptom_sets = dict()
+    for disease, symptom in zip(diseases, symptoms):
+        symptom_sets.setdefault(disease, set()).add(symptom)
+    result = []
+    for source in sorted(symptom_sets):
+        neighbors = []
+        for target in symptom_sets:
+            shared = len(symptom_sets[source] & symptom_sets[target])
+            if target != source and shared > 0:
+                jaccard = shared / len(symptom_sets[source] | symptom_sets[target])
+                neighbors.append((-jaccard, target, shared))
+        for rank, (jaccard, target, shared) in enumerate(sorted(neighbors)[:k], 1):
+            result.append((source, target, -jaccard, shared, rank))
+    return result
+
+
+def as_tuples(arrays):
+    (source, target, jaccard, shared, rank) = arrays
+    return [(int(s), int(t), float(j), int(c), int(r)) for s, t, j, c, r in zip(source, target, jaccard, shared, rank)]
+
+
+class TestTopJaccard(unittest.TestCase):
+
+    def assertSameRanking(self, result, expected):
+        self.assertEqual(len(result), len(expected))
+        for (r, e) in zip(result, expected):
+            self.assertEqual(r[:2] + r[3:], e[:2] + e[3:])
+            self.assertAlmostEqual(r[2], e[2])
+
+    def test_ties(self):
+        """Ties are broken by the target, whatever the order of the pairs"""
+        # diseases 1, 2 and 3 share one of the two symptoms of disease 5;
+        # disease 4 shares no symptom with it
+        pairs = [(5, 'a'), (5, 'b'), (3, 'a'), (1, 'b'), (2, 'a'), (4, 'c'), (5, 'a')]
+        for order in (pairs, pairs[::-1]):
+            diseases, symptoms = zip(*order)
+            result = as_tuples(top_jaccard(diseases, symptoms, k=2))
+            self.assertSameRanking(result, brute_force_top_jaccard(diseases, symptoms, k=2))
+            self.assertEqual([r[:2] + r[3:] for r in result if r[0] == 5], [(5, 1, 1, 1), (5, 2, 1, 2)])
+
+    def test_random(self):
+        """Chunks smaller than the number of diseases, and k larger than the
+        number of neighbors of some diseases"""
+        rng = random.Random(0)
+        pairs = [(rng.randrange(40), rng.randrange(30)) for _ in range(150)]
+        diseases, symptoms = zip(*pairs)
+        for k in (1, 3, 50):
+            for chunk_size in (1, 7, 1000):
+                with self.subTest(k=k, chunk_size=chunk_size):
+                    result = as_tuples(top_jaccard(diseases, symptoms, k, chunk_size=chunk_size))
+                    self.assertSameRanking(result, brute_force_top_jaccard(diseases, symptoms, k))
+
+    def test_empty(self):
+        result = top_jaccard((), (), k=5)
+        self.assertEqual([len(array) for array in result], [0] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
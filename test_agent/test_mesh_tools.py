@@ -0,0 +1,146 @@
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+
+import pandas as pd
+
+from reasoner.MeshTools import MeshTools
+
+DESCRIPTORS = """<?xml version="1.0"?>
+<DescriptorRecordSet>
+  <DescriptorRecord>
+    <DescriptorUI>D003920</DescriptorUI>
+    <DescriptorName><String>Diabetes Mellitus</String></DescriptorName>
+    <TreeNumberList><TreeNumber>C18.452.394.750</TreeNumber><TreeNumber>C19.246</TreeNumber></TreeNumberList>
+    <ConceptList><Concept><TermList>
+      <Term><String>Diabetes Mellitus</String></Term>
+    </TermList></Concept></ConceptList>
+  </DescriptorRecord>
+  <DescriptorRecord>
+    <DescriptorUI>D006528</DescriptorUI>
+    <DescriptorName><String>Carcinoma, Hepatocellular</String></DescriptorName>
+    <TreeNumberList><TreeNumber>C04.557.470.200.400.388</TreeNumber></TreeNumberList>
+    <ConceptList><Concept><TermList>
+      <Term><String>Carcinoma, Hepatocellular</String></Term>
+      <Term><String>Hepatoma</String></Term>
+    </TermList></Concept></ConceptList>
+  </DescriptorRecord>
+  <DescriptorRecord>
+    <DescriptorUI>D001241</DescriptorUI>
+    <DescriptorName><String>Aspirin</String></DescriptorName>
+    <TreeNumberList><TreeNumber>D02.455.426.559.389.657.109</TreeNumber></TreeNumberList>
+    <ConceptList><Concept><TermList>
+      <Term><String>Aspirin</String></Term>
+      <Term><String>Acetylsalicylic Acid</String></Term>
+    </TermList></Concept></ConceptList>
+  </DescriptorRecord>
+</DescriptorRecordSet>
+"""
+
+SUPPLEMENTARY = """<?xml version="1.0"?>
+<SupplementalRecordSet>
+  <SupplementalRecord>
+    <SupplementalRecordUI>C000001</SupplementalRecordUI>
+    <SupplementalRecordName><String>Hepatoma Antigen</String></SupplementalRecordName>
+    <HeadingMappedToList><HeadingMappedTo>
+      <DescriptorReferredTo><DescriptorUI>*D006528</DescriptorUI></DescriptorReferredTo>
+    </HeadingMappedTo></HeadingMappedToList>
+    <ConceptList><Concept><TermList>
+      <Term><String>Hepatoma Antigen</String></Term>
+      <Term><String>Hepatoma</String></Term>
+    </TermList></Concept></ConceptList>
+  </SupplementalRecord>
+</SupplementalRecordSet>
+"""
+
+TREENUMS = ['D02', 'D02.455', 'D12.776.157', 'D08.811', 'G03.493', 'G04.835.1', 'A11', 'A11.118', 'A11.251',
+            'A11.284.430', 'C23', 'C23.550.288.500', 'C23.888', 'C16.320', 'C16.320.180', 'C', 'C04.557', 'B01', '']
+
+
+def mesh_tools():
+    """MeshTools with an empty in-memory database"""
+    mesh = MeshTools.__new__(MeshTools)
+    mesh.db_conn = sqlite3.connect(':memory:')
+    mesh.has_term_index = False
+    return mesh
+
+
+class TestLookupTerm(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        descriptor_file = os.path.join(directory.name, 'desc.xml')
+        supplementary_file = os.path.join(directory.name, 'supp.xml')
+        with open(descriptor_file, 'w') as f:
+            f.write(DESCRIPTORS)
+        with open(supplementary_file, 'w') as f:
+            f.write(SUPPLEMENTARY)
+        self.mesh = mesh_tools()
+        self.assertIsNone(self.mesh.lookup_term('Aspirin'))
+        self.mesh.create_term_index(descriptor_file, supplementary_file)
+
+    def test_exact(self):
+        self.assertEqual(self.mesh.lookup_term('Acetylsalicylic Acid'),
+                         {'term':'Aspirin', 'treenums':['D02.455.426.559.389.657.109'], 'mesh_id':'D001241',
+                          'entity':'Drug', 'bound':1})
+        # supplementary concepts inherit the tree numbers of their descriptors
+        self.assertEqual(self.mesh.lookup_term('Hepatoma Antigen'),
+                         {'term':'Hepatoma Antigen', 'treenums':['C04.557.470.200.400.388'], 'mesh_id':'C000001',
+                          'entity':'Disease', 'bound':1})
+
+    def test_case_insensitive(self):
+        """Queries match in any case and punctuation, and inverted terms match in both orders"""
+        self.assertEqual(self.mesh.lookup_term('DIABETES mellitus')['mesh_id'], 'D003920')
+        self.assertEqual(self.mesh.lookup_term('diabetes-mellitus')['mesh_id'], 'D003920')
+        self.assertEqual(self.mesh.lookup_term('Hepatocellular carcinoma')['mesh_id'], 'D006528')
+        self.assertEqual(self.mesh.lookup_term('carcinoma, hepatocellular')['mesh_id'], 'D006528')
+
+    def test_fuzzy(self):
+        self.assertEqual(self.mesh.lookup_term('Diabetes Melitus')['mesh_id'], 'D003920')
+        self.assertEqual(self.mesh.lookup_term('acetylsalicylic acids')['mesh_id'], 'D001241')
+        self.assertIsNone(self.mesh.lookup_term('Diabetes Melitus', fuzzy=False))
+        self.assertIsNone(self.mesh.lookup_term('Diabetes Insipidus'))
+        self.assertEqual(self.mesh.lookup_term('Diabetes Insipidus', min_similarity=0.3)['mesh_id'], 'D003920')
+
+    def test_descriptor_first(self):
+        """Entry terms of a descriptor and a supplementary concept resolve to the descriptor"""
+        self.assertEqual(self.mesh.lookup_term('hepatoma')['mesh_id'], 'D006528')
+        self.assertEqual(self.mesh.lookup_term('hepatomas')['mesh_id'], 'D006528')
+
+
+class TestClassifyTreenums(unittest.TestCase):
+
+    def test_rules(self):
+        mesh = mesh_tools()
+        rows = [('D1', 'D02.455'), ('D1', 'C04'),
+                ('D2', 'D02'),
+                ('D3', 'A11.284.430'), ('D3', 'A11.118'),
+                ('D4', 'C23'), ('D4', 'C04.557'),
+                ('D5', 'B01'),
+                ('D6', '')]
+        ids, treenums = (pd.Series(column) for column in zip(*rows))
+        result = mesh.classify_treenums(ids, treenums)
+        self.assertEqual([(mesh_id, entity, bool(bound)) for (mesh_id, entity, bound) in result.itertuples()],
+                         [('D1', 'Drug', True), ('D2', 'Drug', False), ('D3', None, False),
+                          ('D4', 'Symptom', False), ('D5', None, False), ('D6', None, False)])
+
+    def test_treenums2entity(self):
+        """The vectorized classification agrees with treenums2entity"""
+        mesh = mesh_tools()
+        rng = random.Random(0)
+        treenums = {'D%06d' % i: rng.sample(TREENUMS, rng.randint(1, 4)) for i in range(500)}
+        rows = [(mesh_id, treenum) for (mesh_id, mesh_treenums) in treenums.items() for treenum in mesh_treenums]
+        rng.shuffle(rows)
+        ids, treenum_series = (pd.Series(column) for column in zip(*rows))
+        result = mesh.classify_treenums(ids, treenum_series)
+        self.assertEqual(sorted(result.index), sorted(treenums))
+        for (mesh_id, entity, bound) in result.itertuples():
+            with self.subTest(treenums=treenums[mesh_id]):
+                self.assertEqual((entity, bool(bound)), mesh.treenums2entity(treenums[mesh_id]))
+
+
+if __name__ == '__main__':
+    unittest.main()
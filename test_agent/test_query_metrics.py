@@ -0,0 +1,72 @@
+import threading
+import unittest
+
+from reasoner.knowledge_graph.QueryMetrics import QueryMetrics, query_hash, query_name
+
+
+class Summary:
+    result_available_after = 2
+    result_consumed_after = 5
+    profile = None
+
+
+class Result:
+    """A result whose records were buffered when its session closed."""
+
+    def __init__(self, rows):
+        self._records = [{}] * rows
+
+    def summary(self):
+        return Summary()
+
+
+class TestQueryMetrics(unittest.TestCase):
+
+    def test_record(self):
+        metrics = QueryMetrics()
+        query = 'MATCH (n:Drug {chembl_id: $id})\nRETURN n'
+        with query_name('drug'):
+            metrics.record(query, {'id': 'CHEMBL25'}, 0.02, Result(3))
+        metrics.record(query, {'id': 'CHEMBL2'}, 3, Result(1))
+        template = metrics.templates[query_hash(query)]
+        self.assertEqual((template.name, template.count, template.rows), ('drug', 2, 4))
+        self.assertEqual(template.available_after, 0.004)
+        self.assertEqual(sum(template.buckets), 2)
+
+        text = metrics.prometheus()
+        labels = 'template="%s",name="drug"' % query_hash(query)
+        self.assertIn('reasoner_neo4j_query_seconds_bucket{%s,le="0.025"} 1' % labels, text)
+        self.assertIn('reasoner_neo4j_query_seconds_bucket{%s,le="+Inf"} 2' % labels, text)
+        self.assertIn('reasoner_neo4j_query_seconds_count{%s} 2' % labels, text)
+        self.assertIn('reasoner_neo4j_rows_total{%s} 4' % labels, text)
+
+    def test_unbuffered_result(self):
+        """Rows of results without buffered records are not counted"""
+        metrics = QueryMetrics()
+        result = Result(2)
+        del result._records
+        with self.assertLogs('reasoner.knowledge_graph.QueryMetrics', 'WARNING') as logs:
+            metrics.record('RETURN 1', {}, 0.1, result)
+            metrics.record('RETURN 1', {}, 0.1, result)
+        self.assertEqual(len(logs.output), 1)
+        metrics.record('RETURN 1', {}, 0.1, Result(2))
+        template = metrics.templates[query_hash('RETURN 1')]
+        self.assertEqual((template.count, template.rows), (3, 2))
+
+    def test_query_name(self):
+        """Names belong to the thread and block they are set in"""
+        metrics = QueryMetrics()
+        thread = threading.Thread(target=metrics.record, args=('RETURN 2', {}, 0.1, Result(1)))
+        with query_name('outer'):
+            with query_name('inner'):
+                metrics.record('RETURN 1', {}, 0.1, Result(1))
+                thread.start()
+                thread.join()
+            metrics.record('RETURN 3', {}, 0.1, Result(1))
+        metrics.record('RETURN 4', {}, 0.1, Result(1))
+        names = {metrics.text: metrics.name for metrics in metrics.templates.values()}
+        self.assertEqual(names, {'RETURN 1': 'inner', 'RETURN 2': None, 'RETURN 3': 'outer', 'RETURN 4': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
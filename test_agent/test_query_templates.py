@@ -0,0 +1,56 @@
+import unittest
+
+from reasoner.KGAgent import KGAgent
+from reasoner.knowledge_graph.QueryTemplates import PathTemplate
+
+
+class TestPathTemplate(unittest.TestCase):
+
+    def test_drug2target(self):
+        template = KGAgent.templates['drug2target']
+        self.assertEqual(template.query(),
+                         'MATCH (n0:Drug {chembl_id: $id})-[r1]-(n1:Target)\n'
+                         'RETURN collect(distinct n0) + collect(distinct n1) as nodes, collect(distinct r1) as edges')
+        self.assertEqual(template.query(paged=True),
+                         'MATCH (n0:Drug {chembl_id: $id})-[r1]-(n1:Target)\n'
+                         'WITH n0, n1, r1 ORDER BY id(r1) SKIP $skip LIMIT $limit\n'
+                         'RETURN collect(distinct n0) + collect(distinct n1) as nodes, collect(distinct r1) as edges')
+        self.assertEqual(template.batch_query(),
+                         'UNWIND $ids as id\n'
+                         'MATCH (n0:Drug {chembl_id: id})-[r1]-(n1:Target)\n'
+                         'RETURN id, collect(distinct n0) + collect(distinct n1) as nodes, collect(distinct r1) as edges')
+
+    def test_gene_to_compound(self):
+        """Two hops, against the direction of the relationships"""
+        template = KGAgent.templates['geneToCompound']
+        self.assertEqual(template.query(),
+                         'MATCH (n0:Gene {hgnc_id: $id})<-[r1:PRODUCT_OF]-(n1:Protein)<-[r2:TARGETS]-(n2:Drug)\n'
+                         'RETURN collect(distinct n0) + collect(distinct n1) + collect(distinct n2) as nodes, '
+                         'collect(distinct r1) + collect(distinct r2) as edges')
+        self.assertEqual(template.query(paged=True),
+                         'MATCH (n0:Gene {hgnc_id: $id})<-[r1:PRODUCT_OF]-(n1:Protein)<-[r2:TARGETS]-(n2:Drug)\n'
+                         'WITH n0, n1, n2, r1, r2 ORDER BY id(r1), id(r2) SKIP $skip LIMIT $limit\n'
+                         'RETURN collect(distinct n0) + collect(distinct n1) + collect(distinct n2) as nodes, '
+                         'collect(distinct r1) + collect(distinct r2) as edges')
+
+    def test_paged_batch_query(self):
+        """Each id has its own page of matches"""
+        template = KGAgent.templates['geneToCompound']
+        self.assertEqual(template.batch_query(paged=True),
+                         'UNWIND $ids as id\n'
+                         'MATCH (n0:Gene {hgnc_id: id})<-[r1:PRODUCT_OF]-(n1:Protein)<-[r2:TARGETS]-(n2:Drug)\n'
+                         'WITH id, n0, n1, n2, r1, r2 ORDER BY id(r1), id(r2)\n'
+                         'WITH id, collect([n0, n1, n2, r1, r2])[$skip..$skip + $limit] as matches\n'
+                         'UNWIND matches as m\n'
+                         'WITH id, m[0] as n0, m[1] as n1, m[2] as n2, m[3] as r1, m[4] as r2\n'
+                         'RETURN id, collect(distinct n0) + collect(distinct n1) + collect(distinct n2) as nodes, '
+                         'collect(distinct r1) + collect(distinct r2) as edges')
+
+    def test_pattern(self):
+        """Hops in either direction, of any type, to any label"""
+        template = PathTemplate('Pathway', 'go_id', [('PART_OF', '>', None), (None, '', 'Target')])
+        self.assertEqual(template.pattern('$id'), '(n0:Pathway {go_id: $id})-[r1:PART_OF]->(n1)-[r2]-(n2:Target)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+from reasoner.knowledge_graph.umls.UmlsQuery import UmlsQuery
+from reasoner.knowledge_graph.umls.UmlsStore import UmlsStore
+
+# MRCONSO rows of the fake database: (CUI, SDUI, SAB, preferred name)
+MRCONSO = [('C0011849', 'D003920', 'MSH', 'Diabetes Mellitus'),
+           ('C0011849', 'HP:0000819', 'HPO', 'Diabetes mellitus'),
+           ('C0020538', 'D006973', 'MSH', 'Hypertensive disease'),
+           ('C0020538', 'HP:0000822', 'HPO', 'Hypertension'),
+           ('C0020538', 'HP:0000822b', 'HPO', 'Hypertension')]
+
+
+class FakeDatabase:
+    """Answers the queries of batch_select like MySQL with a case-insensitive
+    collation: ids match in any case, and rows hold the ids as stored."""
+
+    def __init__(self):
+        self.queries = []
+
+    def select(self, db, sql, data=None):
+        self.queries.append((sql, data))
+        assert sql.count('%s') == len(data)
+        keys = {key.lower() for key in data}
+        if 'SELECT DISTINCT CUI AS query_id, SDUI as hpo_id' in sql:
+            return [{'query_id': cui, 'hpo_id': sdui} for (cui, sdui, sab, name) in MRCONSO
+                    if sab == 'HPO' and cui.lower() in keys]
+        match = re.search(r"src\.(\w+) IN \(.*\) AND src\.SAB = '(\w+)'", sql)
+        return [{'query_id': sdui, 'cui': cui, 'name': name} for (cui, sdui, sab, name) in MRCONSO
+                if sab == match.group(2) and sdui.lower() in keys]
+
+
+def umls_query():
+    query = UmlsQuery.__new__(UmlsQuery)
+    query.tickets = mock.Mock()
+    query.db = mock.Mock()
+    return query
+
+
+class TestBatchSelect(unittest.TestCase):
+
+    def setUp(self):
+        self.database = FakeDatabase()
+        patcher = mock.patch('reasoner.knowledge_graph.umls.UmlsQuery.db_select', self.database.select)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.query = umls_query()
+
+    def test_grouping(self):
+        """Rows are grouped by the input id, in the case it was given in"""
+        ids = ['d003920', 'D006973', 'D003920', 'D000000']
+        results = self.query.mesh2cui_batch(ids)
+        self.assertEqual(results, {'d003920': [{'cui': 'C0011849', 'name': 'Diabetes Mellitus'}],
+                                   'D003920': [{'cui': 'C0011849', 'name': 'Diabetes Mellitus'}],
+                                   'D006973': [{'cui': 'C0020538', 'name': 'Hypertensive disease'}],
+                                   'D000000': []})
+        # ids that only differ in case are queried once
+        self.assertEqual(len(self.database.queries), 1)
+        self.assertEqual(len(self.database.queries[0][1]), 3)
+        # the rows of ids in both cases are separate copies
+        self.assertIsNot(results['d003920'][0], results['D003920'][0])
+
+    def test_prefix(self):
+        results = self.query.cui2hpo_batch(['UMLS:C0020538', 'C0011849', 'UMLS:C0000000'])
+        self.assertEqual(results, {'UMLS:C0020538': [{'hpo_id': 'HP:0000822'}, {'hpo_id': 'HP:0000822b'}],
+                                   'C0011849': [{'hpo_id': 'HP:0000819'}],
+                                   'UMLS:C0000000': []})
+        self.assertEqual(sorted(self.database.queries[0][1]), ['C0000000', 'C0011849', 'C0020538'])
+
+    def test_chunks(self):
+        ids = ['HP:0000819', 'HP:0000822', 'HP:0000822b', 'HP:0000001', 'HP:0000002']
+        results = self.query.batch_select(self.query_sql('HPO'), ids, chunk_size=2)
+        self.assertEqual(len(self.database.queries), 3)
+        self.assertEqual([len(rows) for rows in results.values()], [1, 1, 1, 0, 0])
+
+    def test_generator(self):
+        """ids may be any iterable"""
+        results = self.query.hpo2cui_batch(hpo_id for hpo_id in ['HP:0000819', 'HP:0000001'])
+        self.assertEqual(results, {'HP:0000819': [{'cui': 'C0011849', 'name': 'Diabetes mellitus'}],
+                                   'HP:0000001': []})
+
+    def query_sql(self, sab):
+        return ("SELECT DISTINCT src.SDUI AS query_id, pref.cui AS cui, pref.str AS name "
+                "FROM MRCONSO src INNER JOIN MRCONSO pref ON pref.cui = src.cui "
+                "WHERE src.SDUI IN ({ids}) AND src.SAB = '%s';" % sab)
+
+
+class TestUmlsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'umls.sqlite')
+        self.umls_query = mock.Mock()
+        self.umls_query.hpo2cui_batch.side_effect = \
+            lambda ids: {hpo_id: [{'cui': 'C0011849', 'name': 'Diabetes mellitus'}] if hpo_id == 'HP:0000819' else []
+                         for hpo_id in ids}
+
+    def test_lookup(self):
+        """Missing ids are looked up once, including ids without a match"""
+        store = UmlsStore(self.path, self.umls_query, chunk_size=2)
+        ids = ['HP:0000819', 'HP:0000001', 'HP:0000819', 'HP:0000002', 'HP:0000003']
+        expected = {'HP:0000819': [{'cui': 'C0011849', 'name': 'Diabetes mellitus'}],
+                    'HP:0000001': [], 'HP:0000002': [], 'HP:0000003': []}
+        self.assertEqual(store.hpo2cui_batch(ids), expected)
+        self.assertEqual(sorted(self.umls_query.hpo2cui_batch.call_args[0][0]), ['HP:0000001', 'HP:0000002', 'HP:0000003', 'HP:0000819'])
+
+        self.assertEqual(store.hpo2cui_batch(ids), expected)
+        self.assertEqual(store.hpo2cui('HP:0000819'), expected['HP:0000819'])
+        self.assertEqual(self.umls_query.hpo2cui_batch.call_count, 1)
+
+        store.prefetch('hpo2cui', ['HP:0000001', 'HP:0000004'])
+        self.assertEqual(self.umls_query.hpo2cui_batch.call_args[0][0], ['HP:0000004'])
+
+    def test_persistent(self):
+        """Stored results are read by later stores of the same file"""
+        UmlsStore(self.path, self.umls_query).prefetch('hpo2cui', ['HP:0000819', 'HP:0000001'])
+        store = UmlsStore(self.path)
+        self.assertEqual(store.hpo2cui('HP:0000819'), [{'cui': 'C0011849', 'name': 'Diabetes mellitus'}])
+        self.assertEqual(store.hpo2cui_batch(['HP:0000001', 'HP:0000002']), {'HP:0000001': [], 'HP:0000002': []})
+        # methods are stored separately
+        self.assertEqual(store.go2cui('HP:0000819'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()